@@ -1,49 +1,88 @@
-import cv2
+import argparse
 import os
 import sys
 
+import cv2
+
+from core.crop_store import CropStore
+from core.detector import detector_model
+from core.enrollment import (EnrollmentFilter, SampleWriter, next_sample_index, REJECT_REASONS,
+                             ENROLL_MIN_CONFIDENCE, BLUR_THRESHOLD, DUPLICATE_HAMMING, MIN_FACE_SIZE)
+from utils.drawing import draw_stats_overlay
+
 # รับชื่อจาก argument เช่น: python add_face_cv.py Thinnakorn
-if len(sys.argv) < 2:
-    print("Usage: python add_face_cv.py <name>")
-    sys.exit(1)
+parser = argparse.ArgumentParser(description="เก็บภาพใบหน้าจากกล้องสำหรับเทรน (คัดภาพเบลอ/ไม่มั่นใจ/ซ้ำออก)")
+parser.add_argument("name")
+parser.add_argument("--store", nargs="?", const="dataset_store", default=None, metavar="PATH",
+                    help="ต่อท้าย crop ลงใน crop store แบบ packed แทนการเขียน PNG ทีละไฟล์ (ค่าเริ่มต้น dataset_store/)")
+parser.add_argument("--samples", type=int, default=20, help="จำนวนภาพที่ต้องการเก็บ")
+parser.add_argument("--camera", type=int, default=0)
+parser.add_argument("--min-confidence", type=float, default=ENROLL_MIN_CONFIDENCE)
+parser.add_argument("--min-face-size", type=int, default=MIN_FACE_SIZE)
+parser.add_argument("--blur-threshold", type=float, default=BLUR_THRESHOLD,
+                    help="variance ของ Laplacian ขั้นต่ำ (0 = ไม่ตรวจความเบลอ)")
+parser.add_argument("--max-hamming", type=int, default=DUPLICATE_HAMMING,
+                    help="dHash ต่างกันไม่เกินกี่บิตถือว่าซ้ำ (-1 = ไม่ตัดภาพซ้ำ)")
+args = parser.parse_args()
 
-name = sys.argv[1]
-dataset_dir = os.path.join("dataset", name)
+name = args.name
+store = CropStore(args.store) if args.store else None
+dataset_dir = args.store if store is not None else os.path.join("dataset", name)
 
-if not os.path.exists(dataset_dir):
-    os.makedirs(dataset_dir)
+# ภาพเดิมของคนนี้ ใช้ตัดภาพซ้ำกับการเก็บรอบก่อน
+if store is not None:
+    known_faces = store.crops()[store.labels() == store.names.index(name)] if name in store.names else []
+    next_index = len(known_faces) + 1
+else:
+    os.makedirs(dataset_dir, exist_ok=True)
+    known_faces = [face for face in (cv2.imread(os.path.join(dataset_dir, f), cv2.IMREAD_GRAYSCALE)
+                                     for f in sorted(os.listdir(dataset_dir)) if f.endswith(".png"))
+                   if face is not None]
+    next_index = next_sample_index(dataset_dir)
 
-cap = cv2.VideoCapture(0)
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+if detector_model.get() is None:
+    print("[ERROR] ไม่สามารถโหลดโมเดล DNN/SSD สำหรับตรวจจับใบหน้าได้", file=sys.stderr)
+    sys.exit(1)
+
+gate = EnrollmentFilter(min_confidence=args.min_confidence, min_face_size=args.min_face_size,
+                        blur_threshold=args.blur_threshold, max_hamming=args.max_hamming,
+                        known_faces=known_faces)
+writer = SampleWriter(name, dataset_dir=None if store is not None else dataset_dir, store=store)
 
+cap = cv2.VideoCapture(args.camera)
 count = 0
-print(f"[INFO] เริ่มจับภาพสำหรับ {name}... กด 'q' เพื่อออก")
+print(f"[INFO] เริ่มจับภาพสำหรับ {name} (มีอยู่แล้ว {len(known_faces)} ภาพ)... กด 'q' เพื่อออก")
 
-while True:
+while count < args.samples:
     ret, frame = cap.read()
     if not ret:
         break
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-    for (x, y, w, h) in faces:
-        face_roi = gray[y:y+h, x:x+w]
-        face_roi = cv2.resize(face_roi, (200, 200))
+    face, box, reason = gate.check(frame)
+    if face is not None:
+        # เขียนไฟล์ใน thread ของ writer ลูปกล้องไม่ต้องรอ disk
+        writer.put(face, f"{next_index + count}.png")
         count += 1
-        file_path = os.path.join(dataset_dir, f"{count}.png")
-        cv2.imwrite(file_path, face_roi)
-        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-        cv2.putText(frame, f"{count}", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
-        print(f"[INFO] Saved {file_path}")
+        print(f"[INFO] เก็บภาพ {count}/{args.samples}")
 
+    if box is not None:
+        x, y, w, h = box
+        color = (0, 255, 0) if reason is None else (0, 0, 255)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+    draw_stats_overlay(frame, [f"{name}: {count}/{args.samples}", reason or "saved"], origin=(10, 10))
     cv2.imshow("Collecting Faces", frame)
 
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
-    elif count >= 20:  # เก็บ 20 ภาพ
-        break
 
 cap.release()
 cv2.destroyAllWindows()
-print(f"[INFO] เก็บภาพ {count} ภาพในโฟลเดอร์ {dataset_dir}")
+writer.close()
+
+stats = gate.stats()
+print(f"[INFO] เก็บภาพ {writer.written} ภาพใน {dataset_dir} จาก {stats['frames']} เฟรม")
+for reason in REJECT_REASONS:
+    if stats["rejected"][reason]:
+        print(f"    ไม่เก็บ ({reason}): {stats['rejected'][reason]}")
+if writer.errors:
+    print(f"[Warning] เขียนไฟล์ไม่สำเร็จ {writer.errors} ภาพ", file=sys.stderr)
@@ -0,0 +1,211 @@
+"""
+วัดความเร็วของ detector ทุกแบบที่ใช้ได้บนเครื่องนี้ (SSD / Haar / YuNet x ขนาด input x จำนวน thread x DNN backend)
+กับเฟรมตัวอย่าง แล้วบันทึกค่าที่เร็วที่สุดที่ยังมี recall ไม่ต่ำกว่าเกณฑ์ลง models/detector_config.json
+
+    python autotune_detector.py                               # ใช้รูปใน dataset/
+    python autotune_detector.py --frames videos/lobby.mp4 --min-recall 0.9
+    python autotune_detector.py --frames dataset/ --dry-run   # แสดงผลโดยไม่บันทึก
+
+recall วัดเทียบกับ SSD 300x300 (ค่าเริ่มต้นเดิม): สัดส่วนใบหน้าที่ SSD พบแล้ว config นั้นพบด้วย (IoU >= 0.5)
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core.detector_backends import (BACKENDS, DEFAULT_CONFIG, DNN_BACKENDS, DNN_TARGETS, DETECTOR_CONFIG_PATH,
+                                    available_backends, create_detector, dnn_constant, save_detector_config)
+from core.tracker import match_boxes
+from train_model import IMAGE_EXTENSIONS, list_dataset_images
+
+DEFAULT_FRAMES = "dataset"
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+RECALL_IOU = 0.5
+WARMUP_FRAMES = 3
+
+# ขนาด input ที่ลองต่อ backend (w, h)
+INPUT_SIZES = {
+    "ssd": [(300, 300), (240, 240), (200, 200), (160, 160)],
+    "haar": [(640, 480), (480, 360), (320, 240)],
+    "yunet": [(320, 320), (256, 256), (192, 192), (160, 160)],
+}
+# คู่ DNN backend/target ที่ลอง (เฉพาะที่ build นี้รองรับ)
+DNN_SETTINGS = [("default", "cpu"), ("opencv", "cpu_fp16"), ("openvino", "cpu")]
+
+
+def load_frames(paths, max_frames, video_step):
+    """อ่านเฟรมตัวอย่างจากโฟลเดอร์รูป, ไฟล์รูป หรือไฟล์วิดีโอ (ทุก video_step เฟรม)"""
+    frames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for image_path in list_dataset_images(path):
+                frame = cv2.imread(image_path)
+                if frame is not None:
+                    frames.append(frame)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            cap = cv2.VideoCapture(path)
+            index = 0
+            while len(frames) < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if index % video_step == 0:
+                    frames.append(frame)
+                index += 1
+            cap.release()
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+        else:
+            print(f"[Warning] ข้าม {path} (ไม่ใช่โฟลเดอร์/รูป/วิดีโอ)", file=sys.stderr)
+    if len(frames) > max_frames:
+        # เลือกกระจายทั่วทั้งชุด แทนการเอาแค่ช่วงแรก
+        frames = [frames[i] for i in np.linspace(0, len(frames) - 1, max_frames).astype(int)]
+    return frames
+
+
+def dnn_settings():
+    settings = []
+    for backend, target in DNN_SETTINGS:
+        try:
+            backend_id = dnn_constant(DNN_BACKENDS, backend)
+            target_id = dnn_constant(DNN_TARGETS, target)
+        except ValueError:
+            continue
+        if backend == "default" or target_id in cv2.dnn.getAvailableTargets(backend_id):
+            settings.append((backend, target))
+    return settings
+
+
+def candidate_configs(backends, thread_counts):
+    configs = []
+    for backend in backends:
+        # Haar ไม่ใช้ DNN: ลองแค่ค่าเริ่มต้น
+        settings = [("default", "cpu")] if backend == "haar" else dnn_settings()
+        for size in INPUT_SIZES[backend]:
+            for dnn_backend, dnn_target in settings:
+                for threads in thread_counts:
+                    configs.append(dict(DEFAULT_CONFIG, backend=backend, input_size=list(size), threads=threads,
+                                        dnn_backend=dnn_backend, dnn_target=dnn_target))
+    return configs
+
+
+def run_detector(config, frames):
+    """คืน (ผลตรวจจับต่อเฟรม, ms ต่อเฟรมแต่ละเฟรม) หรือ None ถ้าสร้าง/รัน config นี้ไม่ได้"""
+    detector = create_detector(config)
+    if detector is None:
+        return None
+    detector.warm_up()
+    for frame in frames[:WARMUP_FRAMES]:
+        detector.detect(frame)
+
+    results, times = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        results.append(detector.detect(frame))
+        times.append((time.perf_counter() - start) * 1000.0)
+    return results, np.array(times)
+
+
+def recall(reference, results):
+    """สัดส่วนกล่องของ reference ที่จับคู่ได้ (IoU >= RECALL_IOU) และจำนวนกล่องที่เกินมา"""
+    expected = matched = extra = 0
+    for ref_faces, faces in zip(reference, results):
+        ref_boxes = [box for box, _ in ref_faces]
+        boxes = [box for box, _ in faces]
+        pairs = match_boxes(ref_boxes, boxes, RECALL_IOU) if ref_boxes and boxes else []
+        expected += len(ref_boxes)
+        matched += len(pairs)
+        extra += len(boxes) - len(pairs)
+    return (matched / expected if expected else 1.0), extra
+
+
+def describe(config):
+    size = "x".join(str(v) for v in config["input_size"])
+    dnn = "" if config["backend"] == "haar" else f" {config['dnn_backend']}/{config['dnn_target']}"
+    return f"{config['backend']:<6}{size:>8} threads={config['threads']:<3}{dnn}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="เลือก detector ที่เร็วที่สุดที่ยังมี recall ตามเกณฑ์ แล้วบันทึก config")
+    parser.add_argument("--frames", nargs="+", default=[DEFAULT_FRAMES],
+                        help="โฟลเดอร์รูป, ไฟล์รูป หรือไฟล์วิดีโอ สำหรับวัดผล")
+    parser.add_argument("--max-frames", type=int, default=60)
+    parser.add_argument("--video-step", type=int, default=15, help="ใช้ทุก N เฟรมของวิดีโอ")
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="recall ขั้นต่ำเทียบกับ SSD 300x300")
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=None,
+                        help="จำกัด backend ที่ลอง (ค่าเริ่มต้น: ทุกตัวที่มีไฟล์โมเดล)")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="จำนวน thread ที่ลอง (ค่าเริ่มต้น: 1, 2, 4, ... จนถึงจำนวน core)")
+    parser.add_argument("-o", "--output", default=DETECTOR_CONFIG_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="แสดงผลโดยไม่บันทึก config")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    frames = load_frames(args.frames, args.max_frames, args.video_step)
+    if not frames:
+        print("[ERROR] ไม่พบเฟรมตัวอย่าง (ระบุด้วย --frames)", file=sys.stderr)
+        sys.exit(1)
+
+    backends = [b for b in (args.backends or BACKENDS) if b in available_backends()]
+    if "ssd" not in available_backends():
+        print("[ERROR] ต้องมีโมเดล SSD เป็นตัวอ้างอิงสำหรับวัด recall", file=sys.stderr)
+        sys.exit(1)
+
+    cores = os.cpu_count() or 1
+    thread_counts = args.threads or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    configs = candidate_configs(backends, thread_counts)
+    print(f"[INFO] {len(frames)} เฟรม, backend ที่ใช้ได้: {', '.join(backends)}, {len(configs)} configs")
+
+    reference, _ = run_detector(dict(DEFAULT_CONFIG, threads=cores), frames)
+    num_faces = sum(len(faces) for faces in reference)
+    if num_faces == 0:
+        print("[ERROR] SSD ไม่พบใบหน้าในเฟรมตัวอย่างเลย วัด recall ไม่ได้", file=sys.stderr)
+        sys.exit(1)
+    print(f"[INFO] SSD 300x300 (ตัวอ้างอิง) พบ {num_faces} ใบหน้า")
+
+    rows = []
+    print(f"    {'config':<44}{'mean ms':>9}{'p95 ms':>9}{'recall':>8}{'extra':>7}")
+    for config in configs:
+        try:
+            outcome = run_detector(config, frames)
+        except cv2.error as e:
+            print(f"    {describe(config):<44}  ใช้ไม่ได้: {str(e).strip().splitlines()[-1]}")
+            continue
+        if outcome is None:
+            continue
+        results, times = outcome
+        config_recall, extra = recall(reference, results)
+        rows.append((config, float(times.mean()), float(np.percentile(times, 95)), config_recall, extra))
+        print(f"    {describe(config):<44}{times.mean():>9.2f}{np.percentile(times, 95):>9.2f}"
+              f"{config_recall:>8.3f}{extra:>7}")
+
+    passing = [row for row in rows if row[3] >= args.min_recall]
+    if not passing:
+        print(f"[ERROR] ไม่มี config ใดมี recall >= {args.min_recall} ไม่บันทึก config", file=sys.stderr)
+        sys.exit(1)
+
+    best, mean_ms, p95_ms, best_recall, _ = min(passing, key=lambda row: row[1])
+    print(f"[INFO] เร็วที่สุดที่ recall >= {args.min_recall}: {describe(best)} "
+          f"({mean_ms:.2f} ms/เฟรม, recall {best_recall:.3f})")
+    if args.dry_run:
+        return
+
+    best = dict(best, autotune={
+        "mean_ms": round(mean_ms, 3), "p95_ms": round(p95_ms, 3), "recall": round(best_recall, 4),
+        "min_recall": args.min_recall, "frames": len(frames), "cpu_count": cores,
+        "opencv": cv2.__version__, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    save_detector_config(best, args.output)
+    print(f"[INFO] บันทึก config ไปที่ {args.output} (แอปที่เปิดอยู่จะโหลด detector ใหม่อัตโนมัติ)")
+
+
+if __name__ == "__main__":
+    main()
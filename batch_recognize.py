@@ -0,0 +1,344 @@
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+from core.detector import detect_faces_batch, detector_model, set_thread_budget
+from core.inference_pool import InferencePool
+from core.motion import MotionGatedDetector
+from core.recognizer import recognize_faces_lbph, lbph_model
+from core.registry import preload_models
+from core.shm_ring import SharedMemoryPipeline, load_recognition_models
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+# แบ่งวิดีโอเป็นช่วงละกี่เฟรมเพื่อกระจายให้หลาย worker
+VIDEO_CHUNK_FRAMES = 300
+# จำนวนภาพต่อกลุ่มงานของโฟลเดอร์รูป
+IMAGE_CHUNK_SIZE = 32
+
+CSV_FIELDS = ["source", "frame", "x", "y", "w", "h", "det_confidence", "name", "distance"]
+# inference = ตรวจจับ + จดจำใน InferencePool (--pool-workers) ซึ่งแยกเวลาสองขั้นไม่ได้
+STAGES = ("decode", "detect", "recognize", "inference")
+
+
+def collect_units(inputs, every=1):
+    """
+    แปลง input (โฟลเดอร์รูป, ไฟล์รูป, ไฟล์วิดีโอ) เป็นหน่วยงานสำหรับ worker
+    - ("images", [paths])
+    - ("video", path, start_frame, end_frame หรือ None, every)
+    """
+    images = []
+    units = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    full = os.path.join(root, file)
+                    if file.lower().endswith(IMAGE_EXTENSIONS):
+                        images.append(full)
+                    elif file.lower().endswith(VIDEO_EXTENSIONS):
+                        units.extend(_video_units(full, every))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            images.append(path)
+        else:
+            units.extend(_video_units(path, every))
+
+    image_units = [("images", images[i:i + IMAGE_CHUNK_SIZE])
+                   for i in range(0, len(images), IMAGE_CHUNK_SIZE)]
+    return image_units + units
+
+
+def _video_units(path, every):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"[Warning] เปิดวิดีโอไม่ได้: {path}", file=sys.stderr)
+        return []
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total <= 0:
+        # ไม่รู้จำนวนเฟรม (เช่น stream): ประมวลผลทั้งไฟล์ใน worker เดียว
+        return [("video", path, 0, None, every)]
+    return [("video", path, start, min(start + VIDEO_CHUNK_FRAMES, total), every)
+            for start in range(0, total, VIDEO_CHUNK_FRAMES)]
+
+
+def _iter_unit_frames(unit):
+    """คืน (source, frame_index, image) ของหน่วยงานหนึ่ง"""
+    if unit[0] == "images":
+        for path in unit[1]:
+            yield path, 0, cv2.imread(path)
+        return
+
+    _, path, start, end, every = unit
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = start
+    try:
+        while end is None or index < end:
+            # นับจากต้นวิดีโอ ไม่ใช่ต้นช่วง ระยะห่างจึงเท่ากันทุกเฟรมไม่ว่าแบ่งช่วงอย่างไร
+            if index % every:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield path, index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def process_unit(unit, batch_size=8, nprobe=None, motion_gate=False, pool=None):
+    """
+    ตรวจจับและจดจำใบหน้าในหน่วยงานหนึ่ง คืน (records, จำนวนเฟรม, เวลาต่อขั้นตอน, สถิติ motion gate หรือ None)
+    motion_gate=True: วิดีโอจะข้าม SSD ในเฟรมที่ฉากไม่เปลี่ยน (ไม่มีผลกับโฟลเดอร์รูป)
+    pool (InferencePool): ประมวลผลเฟรมใน batch พร้อมกันหลาย worker แทนการเรียก detector/recognizer ตรง ๆ
+    """
+    records = []
+    timings = dict.fromkeys(STAGES, 0.0)
+    frames = 0
+    gate = MotionGatedDetector() if motion_gate and unit[0] == "video" else None
+
+    # print ของ core ไปที่ stderr เพื่อไม่ให้ปนกับผลลัพธ์ที่เขียนออก stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        batch = []
+        it = _iter_unit_frames(unit)
+        while True:
+            start = time.perf_counter()
+            item = next(it, None)
+            timings["decode"] += time.perf_counter() - start
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= batch_size):
+                frames += len(batch)
+                _process_batch(batch, records, timings, nprobe, gate, pool)
+                batch = []
+            if item is None:
+                break
+
+    return records, frames, timings, gate.stats() if gate is not None else None
+
+
+def _face_record(source, frame_index, box, det_conf, name, distance):
+    (x, y, w, h) = box
+    return {
+        "source": source, "frame": frame_index,
+        "x": int(x), "y": int(y), "w": int(w), "h": int(h),
+        "det_confidence": round(float(det_conf), 4),
+        "name": name, "distance": round(float(distance), 4),
+    }
+
+
+def _process_batch(batch, records, timings, nprobe, gate=None, pool=None):
+    start = time.perf_counter()
+    if pool is not None and gate is None:
+        futures = [pool.submit(image, nprobe=nprobe) if image is not None else None for (_, _, image) in batch]
+        for (source, frame_index, _), future in zip(batch, futures):
+            if future is None:
+                print(f"[Warning] อ่านไฟล์ไม่ได้: {source}", file=sys.stderr)
+                continue
+            records.extend(_face_record(source, frame_index, *face) for face in future.result())
+        timings["inference"] += time.perf_counter() - start
+        return
+
+    if gate is not None:
+        # motion gate ต้องเห็นเฟรมตามลำดับ จึงตรวจจับทีละเฟรม
+        detections = [gate.detect(image) if image is not None else [] for (_, _, image) in batch]
+    else:
+        detections = detect_faces_batch([image for (_, _, image) in batch])
+    timings["detect"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for (source, frame_index, image), faces in zip(batch, detections):
+        if image is None:
+            print(f"[Warning] อ่านไฟล์ไม่ได้: {source}", file=sys.stderr)
+            continue
+        if not faces:
+            continue
+        boxes = [box for (box, conf) in faces]
+        names, distances = recognize_faces_lbph(image, boxes, nprobe=nprobe)
+        for (box, det_conf), name, distance in zip(faces, names, distances):
+            records.append(_face_record(source, frame_index, box, det_conf, name, distance))
+    timings["recognize"] += time.perf_counter() - start
+
+
+_worker_options = {}
+
+
+def _init_worker(options):
+    _worker_options.update(options)
+    # แบ่ง core ให้ worker แต่ละตัว ไม่ให้ OpenCV เปิด thread ซ้อนกันเกินจำนวน core
+    set_thread_budget(options.get("threads_per_worker", 1))
+    if options.get("pool_workers"):
+        # แต่ละ worker ของ pool โหลด Net/LBPH ของตัวเอง และรับงานไม่เกินส่วนของตัวเองใน batch ที่ส่งไปพร้อมกัน
+        pool_workers = options["pool_workers"]
+        max_batch = -(-options.get("batch_size", 8) // pool_workers)
+        _worker_options["pool"] = InferencePool(pool_workers, options.get("threads_per_worker", 1),
+                                                max_batch=max_batch).start()
+    else:
+        preload_models(detector_model, lbph_model, background=False)
+
+
+def _process_unit_worker(unit):
+    return process_unit(unit, _worker_options.get("batch_size", 8), _worker_options.get("nprobe"),
+                        _worker_options.get("motion_gate", False), _worker_options.get("pool"))
+
+
+def _init_shm_worker():
+    # print ของ core ใน worker ไปที่ stderr เพื่อไม่ให้ปนกับผลลัพธ์ที่เขียนออก stdout
+    sys.stdout = sys.stderr
+    load_recognition_models()
+
+
+def run_shm_ring(inputs, workers, every, writer):
+    """
+    ประมวลผลกล้อง/วิดีโอทีละ source ด้วย SharedMemoryPipeline (decoder 1 process + worker N process)
+    เหมาะกับกล้องสดหรือวิดีโอเดียวที่แบ่งช่วงไม่ได้ คืน (จำนวนเฟรม, จำนวนใบหน้า, จำนวนเฟรมที่ทิ้ง)
+    """
+    frames = faces = dropped = 0
+    for source in inputs:
+        # ตัวเลขล้วน = index ของกล้อง
+        source = int(source) if source.isdigit() else source
+        pipeline = SharedMemoryPipeline(source, num_workers=workers, initializer=_init_shm_worker, every=every)
+        try:
+            pipeline.start()
+        except RuntimeError as e:
+            print(f"[Warning] {e}", file=sys.stderr)
+            continue
+        try:
+            for item in pipeline.results():
+                frames += 1
+                records = [_face_record(str(source), item.index, *face) for face in item.result or []]
+                writer.write(records)
+                faces += len(records)
+        except KeyboardInterrupt:
+            print("[INFO] หยุดตามคำสั่งผู้ใช้", file=sys.stderr)
+        finally:
+            dropped += pipeline.stats()["dropped"]
+            pipeline.stop()
+    return frames, faces, dropped
+
+
+class ResultWriter:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self._csv is not None:
+                self._csv.writerow(record)
+            else:
+                self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="จดจำใบหน้าแบบ headless จากโฟลเดอร์รูปภาพหรือไฟล์วิดีโอ")
+    parser.add_argument("inputs", nargs="+", help="โฟลเดอร์รูปภาพ, ไฟล์รูป หรือไฟล์วิดีโอ")
+    parser.add_argument("-o", "--output", default="-", help="ไฟล์ผลลัพธ์ (ค่าเริ่มต้น: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--workers", type=int, default=0, help="จำนวน worker process (0 = ใช้ทุก core)")
+    parser.add_argument("--batch-size", type=int, default=8, help="จำนวนเฟรมต่อ SSD forward pass")
+    parser.add_argument("--every", type=int, default=1, help="ประมวลผลวิดีโอทุก N เฟรม")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="วิดีโอ: ข้าม SSD เมื่อฉากนิ่ง และตรวจเฉพาะบริเวณที่เปลี่ยน (กล้องติดตั้งอยู่กับที่)")
+    parser.add_argument("--nprobe", type=int, default=None, help="ค้นหาผ่านดัชนี IVF (ถ้ามี) ด้วย nprobe กลุ่ม")
+    parser.add_argument("--pool-workers", type=int, default=0,
+                        help="จำนวน inference thread ต่อ process ที่มี Net/LBPH ของตัวเอง (ใช้คู่กับ --workers 1)")
+    parser.add_argument("--shm-ring", action="store_true",
+                        help="กล้อง (index) หรือวิดีโอ: decode ใน process เดียวแล้วส่งเฟรมให้ worker ผ่าน shared memory")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    writer = ResultWriter(out, args.format)
+    if args.shm_ring:
+        start = time.perf_counter()
+        try:
+            frames, faces, dropped = run_shm_ring(args.inputs, workers, max(1, args.every), writer)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        elapsed = time.perf_counter() - start
+        print(f"[INFO] {frames} เฟรม, {faces} ใบหน้า ใน {elapsed:.2f} s "
+              f"({frames / elapsed if elapsed > 0 else 0:.1f} เฟรม/วินาที), ทิ้ง {dropped} เฟรม", file=sys.stderr)
+        return
+
+    units = collect_units(args.inputs, max(1, args.every))
+    options = {"batch_size": args.batch_size, "nprobe": args.nprobe, "motion_gate": args.motion_gate,
+               "pool_workers": args.pool_workers,
+               "threads_per_worker": max(1, (os.cpu_count() or 1) // (workers * max(1, args.pool_workers)))}
+    totals = dict.fromkeys(STAGES, 0.0)
+    frames = faces = 0
+    motion = dict.fromkeys(("frames", "skipped_frames", "skipped_pixels"), 0.0)
+
+    print(f"[INFO] {len(units)} หน่วยงาน, workers={workers}", file=sys.stderr)
+    start = time.perf_counter()
+    pool = None
+    try:
+        if workers <= 1:
+            _init_worker(options)
+            results = map(_process_unit_worker, units)
+        else:
+            pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(options,))
+            results = pool.imap(_process_unit_worker, units)
+
+        for records, unit_frames, timings, gate_stats in results:
+            writer.write(records)
+            if gate_stats is not None:
+                # รวมสัดส่วนจากหลายช่วงวิดีโอ (ถ่วงน้ำหนักตามจำนวนเฟรม; ขนาดเฟรมเท่ากันในวิดีโอเดียว)
+                motion["frames"] += gate_stats["frames"]
+                motion["skipped_frames"] += gate_stats["skipped_frames"]
+                motion["skipped_pixels"] += gate_stats["skipped_pixel_fraction"] * gate_stats["frames"]
+            frames += unit_frames
+            faces += len(records)
+            for stage in STAGES:
+                totals[stage] += timings[stage]
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None:
+            # exception หรือ Ctrl+C ระหว่างทาง: หยุด worker ทันที ไม่ปล่อยให้ค้างอยู่
+            pool.terminate()
+            pool.join()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print("-" * 50, file=sys.stderr)
+    print(f"[INFO] {frames} เฟรม, {faces} ใบหน้า ใน {elapsed:.2f} s "
+          f"({frames / elapsed if elapsed > 0 else 0:.1f} เฟรม/วินาที)", file=sys.stderr)
+    for stage in STAGES:
+        if totals[stage] == 0.0 and stage == "inference":
+            continue
+        per_frame = totals[stage] / frames * 1000.0 if frames else 0.0
+        print(f"    {stage:<10} รวม {totals[stage]:8.2f} s (CPU ทุก worker)  เฉลี่ย {per_frame:7.2f} ms/เฟรม",
+              file=sys.stderr)
+    if motion["frames"]:
+        print(f"[INFO] Motion gate: ข้าม SSD {motion['skipped_frames'] / motion['frames'] * 100:.1f}% ของเฟรม, "
+              f"{motion['skipped_pixels'] / motion['frames'] * 100:.1f}% ของพิกเซล", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Load test ของ recognition_service.py ด้วย client หลาย thread (ทำงาน offline ทั้งหมด)
+
+    python recognition_service.py --max-batch-size 8 --max-wait-ms 5 &
+    python benchmarks/load_test_service.py --concurrency 16 --requests 2000
+    python benchmarks/load_test_service.py --unix /tmp/face.sock --duration 30
+
+ส่งเฟรมสังเคราะห์ (JPEG) ซ้ำ ๆ แล้วรายงาน throughput, latency p50/p95/p99
+และขนาด batch เฉลี่ยจาก /metrics ของ service
+"""
+import argparse
+import http.client
+import json
+import socket
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from run_benchmarks import synthetic_frame
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30.0):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(args):
+    if args.unix:
+        return UnixHTTPConnection(args.unix)
+    return http.client.HTTPConnection(args.host, args.port, timeout=30.0)
+
+
+def request_json(conn, method, path, body=None):
+    headers = {"Content-Type": "application/octet-stream"} if body is not None else {}
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read() or b"{}")
+
+
+def make_payloads(args):
+    rng = np.random.default_rng(args.seed)
+    payloads = []
+    for _ in range(args.distinct_frames):
+        frame, _ = synthetic_frame(rng, tuple(args.resolution), args.faces)
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if ok:
+            payloads.append(encoded.tobytes())
+    return payloads
+
+
+def client_loop(args, payloads, counter, deadline, latencies, errors, lock):
+    conn = connect(args)
+    i = 0
+    while True:
+        with lock:
+            if counter[0] >= args.requests or time.perf_counter() >= deadline:
+                break
+            counter[0] += 1
+        body = payloads[i % len(payloads)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status, _ = request_json(conn, "POST", "/recognize", body)
+        except (OSError, http.client.HTTPException, ValueError):
+            status = None
+            conn.close()
+            conn = connect(args)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+    conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test ของ recognition_service.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="เชื่อมต่อผ่าน Unix socket นี้")
+    parser.add_argument("--concurrency", type=int, default=8, help="จำนวน client พร้อมกัน")
+    parser.add_argument("--requests", type=int, default=None, help="จำนวนคำขอทั้งหมด (ค่าเริ่มต้น 1000)")
+    parser.add_argument("--duration", type=float, default=None, help="หยุดเมื่อครบเวลา (วินาที)")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[640, 480], metavar=("W", "H"))
+    parser.add_argument("--faces", type=int, default=2, help="จำนวนใบหน้าต่อเฟรม")
+    parser.add_argument("--distinct-frames", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="บันทึกผลเป็น JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.requests is None:
+        # ถ้ากำหนดแค่ --duration ให้ยิงคำขอไปเรื่อย ๆ จนหมดเวลา
+        args.requests = sys.maxsize if args.duration else 1000
+    payloads = make_payloads(args)
+
+    try:
+        conn = connect(args)
+        _, before = request_json(conn, "GET", "/metrics")
+        conn.close()
+    except OSError as e:
+        print(f"[ERROR] ติดต่อ service ไม่ได้: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    counter = [0]
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration if args.duration else float("inf")
+    threads = [threading.Thread(target=client_loop,
+                                args=(args, payloads, counter, deadline, latencies, errors, lock))
+               for _ in range(args.concurrency)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    conn = connect(args)
+    _, after = request_json(conn, "GET", "/metrics")
+    conn.close()
+
+    batches = after["batching"]["batches"] - before["batching"]["batches"]
+    served = after["batching"]["requests"] - before["batching"]["requests"]
+    result = {
+        "concurrency": args.concurrency,
+        "resolution": args.resolution,
+        "faces": args.faces,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "mean_batch_size": served / batches if batches else 0.0,
+        "max_queue_depth": after["batching"]["max_queue_depth"],
+        "server": after["batching"],
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000.0, [50, 95, 99])
+        result.update({"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)})
+
+    print(f"[INFO] {result['ok']} คำขอสำเร็จ ใน {elapsed:.2f} s "
+          f"({result['throughput_rps']:.1f} req/s, concurrency={args.concurrency})")
+    if latencies:
+        print(f"    latency  p50 {result['p50_ms']:.2f}  p95 {result['p95_ms']:.2f}  p99 {result['p99_ms']:.2f} ms")
+    print(f"    batch    เฉลี่ย {result['mean_batch_size']:.2f} คำขอ/batch, "
+          f"คิวลึกสุด {result['max_queue_depth']}")
+    if errors:
+        print(f"    errors   {errors}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Benchmark ของ detect_faces / recognize_faces_lbph ด้วยข้อมูลสังเคราะห์ (ไม่ต้องใช้กล้องหรือ dataset)
+
+    python benchmarks/run_benchmarks.py -o bench.json
+    python benchmarks/run_benchmarks.py --quick --compare bench.json
+
+แต่ละกรณีรันใน process แยก และรายงานหน่วยความจำที่ขั้นตอนนั้นใช้เพิ่ม (rss_delta_mb: peak ระหว่างวัด
+ลบ RSS หลังเตรียมข้อมูล/โมเดลสังเคราะห์เสร็จ) จึงไม่รวมหน่วยความจำของการสร้าง gallery
+stage recognize ปิด recognition cache ไว้ (ไม่งั้นรอบที่วัดเป็น cache hit ทั้งหมดเพราะใช้เฟรมเดิมซ้ำ)
+ใช้ --recognition-cache เพื่อวัดแบบเปิด cache
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+FACE_SIZE = 200
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+FACES_PER_FRAME = [1, 4, 10]
+GALLERY_SIZES = [100, 1000, 5000]
+IDENTITIES = 20
+
+QUICK_RESOLUTIONS = [(640, 480)]
+QUICK_FACES_PER_FRAME = [1, 10]
+QUICK_GALLERY_SIZES = [100, 1000]
+
+
+# --- ข้อมูลสังเคราะห์ ---
+
+def synthetic_face(rng, identity_seed=None, noise=8.0):
+    """ใบหน้าสังเคราะห์ 200x200: texture เฉพาะของ identity + noise"""
+    base_rng = np.random.default_rng(identity_seed) if identity_seed is not None else rng
+    base = cv2.GaussianBlur(base_rng.integers(0, 256, (FACE_SIZE, FACE_SIZE), dtype=np.uint8), (9, 9), 0)
+    cv2.ellipse(base, (100, 100), (70, 90), 0, 0, 360, 200, 3)
+    cv2.circle(base, (70, 80), 10, 30, -1)
+    cv2.circle(base, (130, 80), 10, 30, -1)
+    noisy = base.astype(np.float32) + rng.normal(0, noise, base.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def synthetic_frame(rng, resolution, num_faces):
+    """เฟรม BGR ที่มีใบหน้าสังเคราะห์วางเรียงกัน คืน (frame, boxes)"""
+    w, h = resolution
+    frame = cv2.GaussianBlur(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), (7, 7), 0)
+    size = max(24, min(w, h) // 4)
+    cols = max(1, w // size)
+    boxes = []
+    for i in range(num_faces):
+        x = (i % cols) * size
+        y = ((i // cols) * size) % max(1, h - size)
+        face = cv2.resize(synthetic_face(rng, identity_seed=i % IDENTITIES), (size, size))
+        frame[y:y + size, x:x + size] = cv2.cvtColor(face, cv2.COLOR_GRAY2BGR)
+        boxes.append((x, y, size, size))
+    return frame, boxes
+
+
+def synthetic_gallery(rng, gallery_size):
+    faces = [synthetic_face(rng, identity_seed=i % IDENTITIES) for i in range(gallery_size)]
+    labels = np.arange(gallery_size, dtype=np.int32) % IDENTITIES
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, labels)
+    names = {i: f"person_{i}" for i in range(IDENTITIES)}
+    return recognizer, names
+
+
+# --- การวัดผล ---
+
+def _proc_status_mb(field):
+    """ค่าจาก /proc/self/status (Linux) เป็น MB หรือ None"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb():
+    rss = _proc_status_mb("VmRSS")
+    if rss is not None:
+        return rss
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def reset_peak_rss():
+    """เริ่มนับ peak RSS ใหม่จากตอนนี้ (Linux: /proc/self/clear_refs) คืน False ถ้าระบบไม่รองรับ"""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux คืนค่าเป็น KB, macOS เป็น byte
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextlib.contextmanager
+def stage_memory(result):
+    """
+    วัดหน่วยความจำที่ใช้เพิ่มระหว่าง block ลงใน result["rss_delta_mb"]
+    ถ้า reset peak ไม่ได้ (เช่น macOS/Windows) ใช้ RSS หลังจบลบก่อนเริ่มแทน (ไม่เห็น peak ชั่วคราว)
+    """
+    before = current_rss_mb()
+    peak_reset = reset_peak_rss()
+    yield
+    after = peak_rss_mb() if peak_reset else current_rss_mb()
+    result["rss_delta_mb"] = max(0.0, after - before) if before is not None and after is not None else None
+
+
+def measure(fn, iterations, warmup, items_per_call=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    ms = np.array(samples) * 1000.0
+    return {
+        "iterations": iterations,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "throughput_per_s": iterations * items_per_call / total if total > 0 else 0.0,
+    }
+
+
+def run_case(case):
+    """รันกรณีเดียว (ถูกเรียกใน process แยก)"""
+    cv2.setNumThreads(case.get("threads", 0) or cv2.getNumThreads())
+    rng = np.random.default_rng(case.get("seed", 0))
+    stage = case["stage"]
+    iterations, warmup = case["iterations"], case["warmup"]
+
+    if stage in ("detect", "detect_batch"):
+        from core import detector
+        if detector.get_detector() is None:
+            return dict(case, skipped="ไม่พบไฟล์โมเดลของ detector")
+        frames = [synthetic_frame(rng, tuple(case["resolution"]), case["faces"])[0]
+                  for _ in range(case.get("batch", 1))]
+        memory = {}
+        with stage_memory(memory):
+            if stage == "detect":
+                result = measure(lambda: detector.detect_faces(frames[0]), iterations, warmup)
+            else:
+                result = measure(lambda: detector.detect_faces_batch(frames), iterations, warmup, len(frames))
+
+    elif stage in ("recognize", "recognize_batch"):
+        from core import recognizer
+        recognizer.USE_RECOGNITION_CACHE = case["recognition_cache"]
+        recognizer.lbph_model.set(synthetic_gallery(rng, case["gallery"]))
+        frame, boxes = synthetic_frame(rng, tuple(case["resolution"]), case["faces"])
+        fn = recognizer.recognize_faces_lbph if stage == "recognize" else recognizer.recognize_faces_lbph_batch
+        fn(frame, boxes)
+        memory = {}
+        with stage_memory(memory):
+            result = measure(lambda: fn(frame, boxes), iterations, warmup)
+
+    else:
+        raise ValueError(f"unknown stage: {stage}")
+
+    result.update(case)
+    result.update(memory)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _run_case_quiet(case):
+    # ไม่ให้ print ของ core (เช่น debug log ต่อใบหน้า) ปนกับผลและเพิ่มเวลาที่วัด
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return run_case(case)
+
+
+def _run_isolated(case):
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(_run_case_quiet, (case,))
+
+
+def build_cases(args):
+    resolutions = QUICK_RESOLUTIONS if args.quick else RESOLUTIONS
+    faces_list = QUICK_FACES_PER_FRAME if args.quick else FACES_PER_FRAME
+    galleries = QUICK_GALLERY_SIZES if args.quick else GALLERY_SIZES
+    common = {"iterations": args.iterations, "warmup": args.warmup, "seed": args.seed, "threads": args.threads}
+
+    cases = []
+    for resolution in resolutions:
+        for faces in faces_list:
+            cases.append(dict(common, stage="detect", resolution=list(resolution), faces=faces))
+            cases.append(dict(common, stage="detect_batch", resolution=list(resolution), faces=faces, batch=8))
+    for gallery in galleries:
+        for faces in faces_list:
+            for stage in ("recognize", "recognize_batch"):
+                cases.append(dict(common, stage=stage, resolution=list(resolutions[0]),
+                                  faces=faces, gallery=gallery, recognition_cache=args.recognition_cache))
+    return cases
+
+
+def case_key(result):
+    return json.dumps({k: result.get(k) for k in ("stage", "resolution", "faces", "gallery", "batch",
+                                                 "recognition_cache")},
+                      sort_keys=True)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_result(result, baseline=None):
+    label = (f"{result['stage']:<16} res={'x'.join(map(str, result['resolution']))} "
+             f"faces={result.get('faces', '-')} gallery={result.get('gallery', '-')}")
+    if result.get("recognition_cache"):
+        label += " cache"
+    if "skipped" in result:
+        print(f"{label:<60} SKIPPED ({result['skipped']})")
+        return
+    rss = result.get("rss_delta_mb")
+    line = (f"{label:<60} p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+            f"p99={result['p99_ms']:8.2f}ms {result['throughput_per_s']:8.1f}/s")
+    if rss is not None:
+        line += f" rss=+{rss:.1f}MB"
+    if baseline and "p50_ms" in baseline:
+        line += f"  ({result['p50_ms'] / baseline['p50_ms']:.2f}x p50 vs baseline)"
+    print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark detector/recognizer ด้วยข้อมูลสังเคราะห์")
+    parser.add_argument("-o", "--output", help="บันทึกผลเป็น JSON")
+    parser.add_argument("--compare", help="ไฟล์ JSON ผลเดิมสำหรับเปรียบเทียบ")
+    parser.add_argument("--quick", action="store_true", help="ชุดทดสอบขนาดเล็ก")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=0, help="cv2.setNumThreads (0 = ค่าเริ่มต้นของ OpenCV)")
+    parser.add_argument("--recognition-cache", action="store_true",
+                        help="เปิด recognition cache ใน stage recognize (ค่าเริ่มต้นปิด เพื่อวัดการ match จริง)")
+    parser.add_argument("--stage", action="append", help="รันเฉพาะ stage ที่ระบุ (ใช้ซ้ำได้)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {case_key(r): r for r in json.load(f)["results"]}
+
+    results = []
+    for case in build_cases(args):
+        if args.stage and case["stage"] not in args.stage:
+            continue
+        result = _run_isolated(case)
+        results.append(result)
+        print_result(result, baseline.get(case_key(result)))
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] บันทึกผลไปที่ {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+วัด throughput ของ SharedMemoryPipeline (core/shm_ring.py) เมื่อเพิ่ม inference worker จาก 1 ถึง N
+เทียบกับ multiprocessing.Pool ที่ส่งเฟรมแบบ pickle
+
+    python benchmarks/shm_ring_scaling.py                              # วิดีโอสังเคราะห์ 1280x720
+    python benchmarks/shm_ring_scaling.py --source videos/lobby.mp4 --max-workers 8
+    python benchmarks/shm_ring_scaling.py --resolution 1920x1080 --no-pickle
+
+ถ้ามีไฟล์โมเดล SSD จะรัน detect_faces + recognize_faces_lbph จริง
+ไม่งั้นใช้กล่องใบหน้าที่รู้ตำแหน่งแล้วของเฟรมสังเคราะห์ + LBPH ที่เทรนจาก gallery สังเคราะห์
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.shm_ring import SharedMemoryPipeline, detect_and_recognize, load_recognition_models  # noqa: E402
+from run_benchmarks import synthetic_frame, synthetic_gallery  # noqa: E402
+
+DEFAULT_RESOLUTION = "1280x720"
+DEFAULT_FRAMES = 300
+DEFAULT_FACES = 4
+SYNTHETIC_GALLERY = 500
+
+_boxes = []
+
+
+def write_synthetic_video(path, resolution, num_frames, num_faces, seed=0):
+    """วิดีโอ MJPG ที่มีใบหน้าสังเคราะห์ คืนกล่องใบหน้า (ตำแหน่งเดิมทุกเฟรม)"""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, resolution)
+    boxes = []
+    for _ in range(num_frames):
+        frame, boxes = synthetic_frame(rng, resolution, num_faces)
+        writer.write(frame)
+    writer.release()
+    return [tuple(int(v) for v in box) for box in boxes]
+
+
+def load_synthetic_models(boxes, seed=0):
+    """initializer แบบไม่มีไฟล์โมเดล: LBPH จาก gallery สังเคราะห์ และกล่องใบหน้าที่รู้ตำแหน่งแล้ว"""
+    from core.recognizer import lbph_model
+    lbph_model.set(synthetic_gallery(np.random.default_rng(seed), SYNTHETIC_GALLERY))
+    _boxes[:] = boxes
+
+
+def recognize_known_boxes(frame):
+    from core.recognizer import recognize_faces_lbph
+    names, distances = recognize_faces_lbph(frame, _boxes)
+    return list(zip(_boxes, names, distances))
+
+
+def run_shm(source, workers, process_fn, initializer, num_frames):
+    pipeline = SharedMemoryPipeline(source, num_workers=workers, process_fn=process_fn,
+                                    initializer=initializer, drop_when_full=False)
+    with pipeline:
+        delivered = sum(1 for _ in pipeline.results())
+        stats = pipeline.stats()
+    if delivered != num_frames:
+        print(f"[Warning] ได้ผล {delivered}/{num_frames} เฟรม", file=sys.stderr)
+    return stats["fps"]
+
+
+def _pickle_worker_init(initializer, threads):
+    from core.detector_backends import set_thread_budget
+    set_thread_budget(threads)
+    if initializer is not None:
+        initializer()
+
+
+def _iter_frames(source):
+    cap = cv2.VideoCapture(source)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def run_pickle(source, workers, process_fn, initializer):
+    """เฟรมถูก decode ใน process หลักแล้วส่งให้ Pool แบบ pickle (ลำดับผลเหมือนกันด้วย imap)"""
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with multiprocessing.Pool(workers, initializer=_pickle_worker_init, initargs=(initializer, threads)) as pool:
+        # ให้ทุก worker โหลดโมเดลเสร็จก่อนเริ่มจับเวลา (เหมือนที่ SharedMemoryPipeline.stats() ไม่นับ)
+        pool.map(time.sleep, [0.0] * workers)
+        first = last = None
+        count = 0
+        for _ in pool.imap(process_fn, _iter_frames(source)):
+            last = time.perf_counter()
+            first = first or last
+            count += 1
+    return (count - 1) / (last - first) if count > 1 and last > first else 0.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="วัด throughput ของ shared-memory ring เมื่อเพิ่มจำนวน worker")
+    parser.add_argument("--source", help="ไฟล์วิดีโอ (ค่าเริ่มต้น: สร้างวิดีโอสังเคราะห์)")
+    parser.add_argument("--resolution", default=DEFAULT_RESOLUTION, help="ขนาดวิดีโอสังเคราะห์ WxH")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="จำนวนเฟรมของวิดีโอสังเคราะห์")
+    parser.add_argument("--faces", type=int, default=DEFAULT_FACES, help="จำนวนใบหน้าต่อเฟรมสังเคราะห์")
+    parser.add_argument("--max-workers", type=int, default=0, help="จำนวน worker สูงสุด (0 = จำนวน core)")
+    parser.add_argument("--no-pickle", action="store_true", help="ไม่วัด multiprocessing.Pool แบบ pickle เฟรม")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    max_workers = args.max_workers or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source
+        boxes = []
+        if source is None:
+            w, h = (int(v) for v in args.resolution.lower().split("x"))
+            source = os.path.join(tmp, "synthetic.avi")
+            boxes = write_synthetic_video(source, (w, h), args.frames, args.faces)
+
+        cap = cv2.VideoCapture(source)
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        from core.detector import get_detector
+        if get_detector() is not None:
+            process_fn, initializer, mode = detect_and_recognize, load_recognition_models, "SSD + LBPH"
+        elif boxes:
+            process_fn, mode = recognize_known_boxes, f"LBPH {len(boxes)} ใบหน้า/เฟรม (ไม่มีไฟล์โมเดล SSD)"
+            initializer = functools.partial(load_synthetic_models, boxes)
+        else:
+            print("[ERROR] ไม่พบไฟล์โมเดล SSD (วิดีโอสังเคราะห์ใช้ได้โดยไม่ต้องมีโมเดล)", file=sys.stderr)
+            sys.exit(1)
+
+        print(f"[INFO] {source}: {num_frames} เฟรม, งานต่อเฟรม: {mode}, {os.cpu_count()} cores")
+        print(f"    {'workers':>7}{'shm fps':>10}{'speedup':>9}{'eff.':>7}" + ("" if args.no_pickle else f"{'pickle fps':>12}"))
+        base_fps = None
+        for workers in range(1, max_workers + 1):
+            fps = run_shm(source, workers, process_fn, initializer, num_frames)
+            base_fps = base_fps or fps
+            speedup = fps / base_fps if base_fps else 0.0
+            line = f"    {workers:>7}{fps:>10.1f}{speedup:>8.2f}x{speedup / workers * 100:>6.0f}%"
+            if not args.no_pickle:
+                line += f"{run_pickle(source, workers, process_fn, initializer):>12.1f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
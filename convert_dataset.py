@@ -0,0 +1,104 @@
+"""
+แปลง dataset ระหว่างโฟลเดอร์รูป (dataset/<name>/*.png) กับ crop store แบบ packed (core.crop_store)
+
+    python convert_dataset.py import dataset/ dataset_store/ --workers 0   # ตรวจจับใบหน้าด้วย SSD แล้ว pack
+    python convert_dataset.py import dataset/ dataset_store/ --no-detect   # รูปเป็น crop ใบหน้าอยู่แล้ว (จาก add_face_cv.py)
+    python convert_dataset.py export dataset_store/ dataset_export/
+    python convert_dataset.py info dataset_store/
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+from core.crop_store import CropStore
+from train_model import list_dataset_images, load_ssd_net, _iter_extracted_faces
+
+
+def import_folder(dataset_dir, store, workers=1, detect=True):
+    """เพิ่มรูปทั้งหมดใน dataset_dir เข้า store (ข้ามไฟล์ที่เคย import แล้ว) คืน (เพิ่ม, ข้าม, ล้มเหลว)"""
+    existing = {(store.names[label], source) for label, source in zip(store.labels(), store.sources())}
+    all_paths = list_dataset_images(dataset_dir)
+    image_paths = [p for p in all_paths
+                   if (os.path.basename(os.path.dirname(p)), os.path.basename(p)) not in existing]
+    skipped = len(all_paths) - len(image_paths)
+
+    if detect and image_paths:
+        net = load_ssd_net()
+        if net is None:
+            print("[ERROR] ไม่สามารถตรวจจับใบหน้าได้เนื่องจากโมเดล DNN/SSD มีปัญหา (ใช้ --no-detect ถ้ารูปเป็น crop อยู่แล้ว)",
+                  file=sys.stderr)
+            return 0, skipped, len(image_paths)
+        results = _iter_extracted_faces(image_paths, net, workers)
+    else:
+        results = ((cv2.imread(p, cv2.IMREAD_GRAYSCALE), f"[Warning] ข้ามไฟล์ (อ่านไม่ได้): {p}")
+                   for p in image_paths)
+
+    # รวมเป็นกลุ่มต่อบุคคล เพื่อเขียน store ครั้งละก้อนใหญ่
+    added = failed = 0
+    pending_name, pending_faces, pending_sources = None, [], []
+    for image_path, (face, warning) in zip(image_paths, results):
+        name = os.path.basename(os.path.dirname(image_path))
+        if name != pending_name:
+            added += store.append(pending_faces, pending_name, pending_sources)
+            pending_name, pending_faces, pending_sources = name, [], []
+        if face is None:
+            print(warning)
+            failed += 1
+            continue
+        pending_faces.append(face)
+        pending_sources.append(image_path)
+    added += store.append(pending_faces, pending_name, pending_sources)
+    return added, skipped, failed
+
+
+def print_info(store):
+    size = os.path.getsize(os.path.join(store.path, "crops.u8"))
+    print(f"[INFO] {store.path}: {len(store)} crops {store.crop_size[0]}x{store.crop_size[1]}, "
+          f"{len(store.names)} คน, {size / 1e6:.1f} MB")
+    for name, count in store.counts().items():
+        print(f"    {name:<20} {count}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="แปลง dataset ระหว่างโฟลเดอร์รูปกับ crop store แบบ packed")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="โฟลเดอร์รูป -> crop store")
+    p.add_argument("dataset_dir")
+    p.add_argument("store")
+    p.add_argument("--workers", type=int, default=1, help="จำนวน worker สำหรับตรวจจับใบหน้า (0 = ใช้ทุก core)")
+    p.add_argument("--no-detect", action="store_true", help="ไม่ตรวจจับใบหน้า (รูปเป็น crop ใบหน้าอยู่แล้ว)")
+
+    p = sub.add_parser("export", help="crop store -> โฟลเดอร์รูป PNG")
+    p.add_argument("store")
+    p.add_argument("dataset_dir")
+
+    p = sub.add_parser("info", help="แสดงจำนวน crop ต่อคน")
+    p.add_argument("store")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+
+    if args.command == "import":
+        store = CropStore(args.store)
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        added, skipped, failed = import_folder(args.dataset_dir, store, workers, detect=not args.no_detect)
+        print(f"[INFO] เพิ่ม {added} crops (ข้ามที่มีแล้ว {skipped}, ล้มเหลว {failed}) "
+              f"ใน {time.perf_counter() - start:.2f} s")
+        print_info(store)
+    elif args.command == "export":
+        store = CropStore(args.store, readonly=True)
+        count = store.export_folder(args.dataset_dir)
+        print(f"[INFO] เขียน {count} ไฟล์ไปที่ {args.dataset_dir} ใน {time.perf_counter() - start:.2f} s")
+    else:
+        print_info(CropStore(args.store, readonly=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+แปลงโมเดล LBPH จาก yml + names pickle เป็นไฟล์ binary (core.lbph_binary) พร้อมรายงานขนาดและเวลาโหลด
+
+    python convert_model.py                          # models/lbph_model.yml -> models/lbph_model.lbph
+    python convert_model.py --dtype float16          # ขนาดครึ่งหนึ่ง (ระยะคลาดเคลื่อนเล็กน้อย)
+    python convert_model.py --model a.yml --names a.pickle -o a.lbph
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core.lbph_binary import save_binary, load_binary
+from core.lbph_engine import LBPHMatrixEngine
+from core.recognizer import MODEL_PATH, NAMES_PATH, BINARY_MODEL_PATH
+
+# จำนวน query ที่ใช้ตรวจว่าผลจดจำของโมเดล binary ตรงกับ yml
+VERIFY_SAMPLES = 200
+# query สร้างจาก histogram ของ gallery ที่สุ่มคูณแต่ละ bin ด้วย 1 +- VERIFY_NOISE
+# (ถ้าใช้ histogram เดิมตรง ๆ ระยะจะเป็น 0 และผ่านเสมอ แม้ไฟล์จะเก็บค่าผิด)
+VERIFY_NOISE = 0.3
+
+
+def _timed(fn, repeat=3):
+    """คืน (ผลลัพธ์, เวลาที่ดีที่สุดเป็น ms)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def _read_yml(path):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(path)
+    return recognizer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="แปลงโมเดล LBPH (yml + pickle) เป็นไฟล์ binary แบบ mmap")
+    parser.add_argument("--model", default=MODEL_PATH, help="ไฟล์ yml ของ LBPH")
+    parser.add_argument("--names", default=NAMES_PATH, help="ไฟล์ pickle ของ id -> name")
+    parser.add_argument("-o", "--output", default=BINARY_MODEL_PATH)
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.model):
+        print(f"[ERROR] ไม่พบไฟล์โมเดล: {args.model}", file=sys.stderr)
+        sys.exit(1)
+
+    recognizer, yml_ms = _timed(lambda: _read_yml(args.model), repeat=1)
+    if os.path.exists(args.names):
+        with open(args.names, "rb") as f:
+            id_to_name_map = pickle.load(f)
+    else:
+        print(f"[Warning] ไม่พบ {args.names} จะบันทึกโดยไม่มีชื่อ", file=sys.stderr)
+        id_to_name_map = {}
+
+    engine = LBPHMatrixEngine.from_recognizer(recognizer)
+    size = save_binary(args.output, engine, id_to_name_map, dtype=np.dtype(args.dtype))
+
+    (binary_engine, names), verified_ms = _timed(lambda: load_binary(args.output))
+    _, mmap_ms = _timed(lambda: load_binary(args.output, verify=False, use_mmap=True))
+
+    yml_size = os.path.getsize(args.model)
+    names_size = os.path.getsize(args.names) if os.path.exists(args.names) else 0
+    print(f"[INFO] {len(engine)} samples x {engine.histograms_t.shape[0]} bins, {len(names)} ชื่อ -> {args.output}")
+    print(f"    yml + pickle  {(yml_size + names_size) / 1e6:8.2f} MB   read() {yml_ms:9.1f} ms")
+    print(f"    binary        {size / 1e6:8.2f} MB   load   {verified_ms:9.1f} ms (ตรวจ checksum), "
+          f"{mmap_ms:.2f} ms (mmap อย่างเดียว)")
+
+    # ตรวจว่าผลจดจำตรงกับ yml: query เป็น histogram ของ gallery ที่ถูกรบกวน ให้ระยะไม่เป็น 0 และต้องเลือกตัวที่ใกล้ที่สุดจริง
+    rng = np.random.default_rng(0)
+    step = max(1, len(engine) // VERIFY_SAMPLES)
+    queries = engine.histograms[::step].astype(np.float64)
+    queries *= rng.uniform(1.0 - VERIFY_NOISE, 1.0 + VERIFY_NOISE, queries.shape)
+    expected_labels, expected_dist = engine.predict_histograms(queries)
+    labels, dist = binary_engine.predict_histograms(queries)
+    agreement = float(np.mean(labels == expected_labels)) if len(queries) else 1.0
+    rel_diff = np.abs(dist - expected_dist) / np.maximum(expected_dist, 1e-12)
+    max_diff = float(np.max(rel_diff)) if len(queries) else 0.0
+    print(f"    ตรวจ {len(queries)} queries (histogram ที่ถูกรบกวน +-{VERIFY_NOISE:.0%}): "
+          f"label ตรงกัน {agreement * 100:.1f}%, ระยะต่างกันสูงสุด {max_diff:.2e} (สัมพัทธ์)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import json
+import os
+import sys
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+# เวอร์ชันของรูปแบบ store (เปลี่ยนเมื่อโครงสร้างไฟล์เปลี่ยน)
+STORE_VERSION = 1
+CROP_SIZE = (200, 200)
+
+META_FILE = "meta.json"
+CROPS_FILE = "crops.u8"
+RECORDS_FILE = "records.bin"
+# ชื่อไฟล์ต้นทางเต็ม (JSON หนึ่งบรรทัดต่อ crop) ชื่อยาว/ภาษาไทยเกิน 64 ไบต์ของ record จึงไม่ถูกตัด
+SOURCES_FILE = "sources.jsonl"
+
+# metadata ต่อ crop หนึ่งใบ (ขนาดคงที่ ต่อท้ายไฟล์ได้โดยไม่ต้องเขียนไฟล์ใหม่)
+RECORD_DTYPE = np.dtype([
+    ("label", "<i4"),       # index ใน names ของ store
+    ("added", "<f8"),       # เวลาที่เพิ่ม (unix time)
+    ("source", "S64"),      # ชื่อไฟล์ต้นทาง ตัดที่ 64 ไบต์ (ชื่อเต็มอยู่ใน SOURCES_FILE)
+])
+
+
+def _truncate_utf8(text, size):
+    """encode เป็น UTF-8 ไม่เกิน size ไบต์ โดยไม่ตัดกลางตัวอักษร"""
+    return text.encode("utf-8")[:size].decode("utf-8", "ignore").encode("utf-8")
+
+
+class CropStore:
+    """
+    dataset แบบ packed: crop ใบหน้า grayscale ขนาดเท่ากันทั้งหมดใน array uint8 เดียว
+    - crops.u8:    (N, H, W) uint8 ต่อกันแบบ raw อ่านผ่าน np.memmap (ไม่ต้องเปิด/ถอดรหัสไฟล์ทีละรูป)
+    - records.bin: (N,) RECORD_DTYPE (label, เวลาเพิ่ม, ชื่อไฟล์ต้นทาง)
+    - sources.jsonl: ชื่อไฟล์ต้นทางเต็มของแต่ละ crop (บรรทัดละหนึ่ง crop)
+    - meta.json:   เวอร์ชัน, ขนาด crop, รายชื่อ (label = index) และ store_id
+    append() เขียนต่อท้ายไฟล์ crops และ sources ก่อน แล้วจึง records จำนวน crop ที่ใช้ได้คือจำนวน record ที่สมบูรณ์
+    ถ้า process ตายกลางทาง ข้อมูลที่เขียนไม่ครบจะถูกตัดทิ้งตอนเปิดเพื่อเขียนครั้งถัดไป
+    รองรับผู้เขียนทีละ process เท่านั้น; readonly=True เปิดอ่านระหว่างที่อีก process กำลังเขียนได้
+    (ใช้เฉพาะ crop ที่มี record ครบ และไม่แก้ไขไฟล์ใด ๆ)
+    """
+
+    def __init__(self, path, crop_size=CROP_SIZE, create=True, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != STORE_VERSION:
+                raise ValueError(f"crop store {path} has unsupported version {meta.get('version')}")
+        elif create and not readonly:
+            os.makedirs(path, exist_ok=True)
+            meta = {"version": STORE_VERSION, "crop_size": list(crop_size), "names": [],
+                    "store_id": uuid.uuid4().hex}
+            self._write_meta(meta)
+            open(os.path.join(path, CROPS_FILE), "ab").close()
+            open(os.path.join(path, RECORDS_FILE), "ab").close()
+            open(os.path.join(path, SOURCES_FILE), "ab").close()
+        else:
+            raise FileNotFoundError(f"crop store not found: {path}")
+
+        self.crop_size = tuple(meta["crop_size"])
+        self.names = list(meta["names"])
+        self.store_id = meta["store_id"]
+        self._crops = None
+        self._records = None
+        self._repair()
+
+    @property
+    def crop_shape(self):
+        return (self.crop_size[1], self.crop_size[0])
+
+    @property
+    def crop_bytes(self):
+        return self.crop_size[0] * self.crop_size[1]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_meta(self, meta):
+        tmp_path = self._file(META_FILE) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._file(META_FILE))
+
+    def _save_meta(self):
+        self._write_meta({"version": STORE_VERSION, "crop_size": list(self.crop_size),
+                          "names": self.names, "store_id": self.store_id})
+
+    def _repair(self):
+        """
+        ตัดข้อมูลที่เขียนไม่ครบ (append ถูกขัดจังหวะ) ให้ crops และ records ยาวเท่ากัน
+        โหมด readonly ไม่ตัดไฟล์: ข้อมูลส่วนเกินอาจเป็น append ที่ผู้เขียนอีก process กำลังทำอยู่
+        """
+        num_records = os.path.getsize(self._file(RECORDS_FILE)) // RECORD_DTYPE.itemsize
+        num_crops = os.path.getsize(self._file(CROPS_FILE)) // self.crop_bytes
+        count = min(num_records, num_crops)
+        if self.readonly:
+            self._count = count
+            self._sources = self._load_sources()
+            return
+        for name, size in ((RECORDS_FILE, count * RECORD_DTYPE.itemsize), (CROPS_FILE, count * self.crop_bytes)):
+            if os.path.getsize(self._file(name)) != size:
+                print(f"[Warning] ตัดข้อมูลที่เขียนไม่ครบใน {self._file(name)}", file=sys.stderr)
+                with open(self._file(name), "r+b") as f:
+                    f.truncate(size)
+        self._count = count
+        self._sources = self._load_sources()
+
+    def _load_sources(self):
+        """
+        อ่านชื่อไฟล์ต้นทางเต็มให้มี count รายการพอดี: ตัดบรรทัดของ append ที่ไม่สมบูรณ์ทิ้ง
+        และเติมรายการที่ขาด (store ที่สร้างก่อนมี SOURCES_FILE) จากชื่อที่ตัดแล้วใน records
+        """
+        data = b""
+        if os.path.exists(self._file(SOURCES_FILE)):
+            with open(self._file(SOURCES_FILE), "rb") as f:
+                data = f.read()
+        # ส่วนหลัง "\n" ตัวสุดท้ายคือบรรทัดที่เขียนไม่ครบ
+        lines = data.split(b"\n")[:-1]
+        sources = []
+        for line in lines[:self._count]:
+            try:
+                sources.append(json.loads(line.decode("utf-8")))
+            except ValueError:
+                break
+        parsed = len(sources)
+        if parsed < self._count:
+            records = np.fromfile(self._file(RECORDS_FILE), dtype=RECORD_DTYPE, count=self._count)
+            sources.extend(s.decode("utf-8", "replace") for s in records["source"][parsed:])
+        if self.readonly:
+            return sources
+        if parsed != len(lines) or len(lines) != self._count or not data.endswith(b"\n") and data:
+            if len(lines) > self._count or not data.endswith(b"\n") and data:
+                print(f"[Warning] ตัดข้อมูลที่เขียนไม่ครบใน {self._file(SOURCES_FILE)}", file=sys.stderr)
+            self._write_sources(sources)
+        return sources
+
+    def _write_sources(self, sources):
+        tmp_path = self._file(SOURCES_FILE) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(json.dumps(s, ensure_ascii=False).encode("utf-8") + b"\n" for s in sources))
+        os.replace(tmp_path, self._file(SOURCES_FILE))
+
+    def __len__(self):
+        return self._count
+
+    def label_for(self, name):
+        """คืน label ของชื่อ (เพิ่มชื่อใหม่ต่อท้าย label เดิมไม่เปลี่ยน)"""
+        if name not in self.names:
+            if self.readonly:
+                raise ValueError(f"crop store {self.path} is opened read-only")
+            self.names.append(name)
+            self._save_meta()
+        return self.names.index(name)
+
+    def append(self, faces, name, sources=None):
+        """
+        เพิ่ม crop grayscale ของบุคคลหนึ่ง (ขนาดไม่ตรงจะถูก resize เป็น crop_size)
+        คืนจำนวน crop ที่เพิ่ม
+        """
+        if self.readonly:
+            raise ValueError(f"crop store {self.path} is opened read-only")
+        if len(faces) == 0:
+            return 0
+        label = self.label_for(name)
+        block = np.empty((len(faces),) + self.crop_shape, dtype=np.uint8)
+        for i, face in enumerate(faces):
+            if face.ndim == 3:
+                face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+            if face.shape != self.crop_shape:
+                face = cv2.resize(face, self.crop_size)
+            block[i] = face
+
+        names = [os.path.basename(s) for s in sources] if sources is not None else [""] * len(faces)
+        records = np.zeros(len(faces), dtype=RECORD_DTYPE)
+        records["label"] = label
+        records["added"] = time.time()
+        records["source"] = [_truncate_utf8(s, RECORD_DTYPE["source"].itemsize) for s in names]
+
+        with open(self._file(CROPS_FILE), "ab") as f:
+            f.write(block.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._file(SOURCES_FILE), "ab") as f:
+            f.write(b"".join(json.dumps(s, ensure_ascii=False).encode("utf-8") + b"\n" for s in names))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._file(RECORDS_FILE), "ab") as f:
+            f.write(records.tobytes())
+
+        self._count += len(faces)
+        self._sources.extend(names)
+        # memmap เดิมยาวเท่าข้อมูลก่อน append ต้องเปิดใหม่ตอนถูกเรียกครั้งถัดไป
+        self._crops = None
+        self._records = None
+        return len(faces)
+
+    def crops(self):
+        """memmap แบบอ่านอย่างเดียว (N, H, W) uint8 ทุก crop (ไม่คัดลอกข้อมูล)"""
+        if self._crops is None:
+            if self._count == 0:
+                self._crops = np.zeros((0,) + self.crop_shape, dtype=np.uint8)
+            else:
+                self._crops = np.memmap(self._file(CROPS_FILE), dtype=np.uint8, mode="r",
+                                        shape=(self._count,) + self.crop_shape)
+        return self._crops
+
+    def records(self):
+        if self._records is None:
+            if self._count == 0:
+                self._records = np.zeros(0, dtype=RECORD_DTYPE)
+            else:
+                self._records = np.memmap(self._file(RECORDS_FILE), dtype=RECORD_DTYPE, mode="r",
+                                          shape=(self._count,))
+        return self._records
+
+    def labels(self):
+        return np.ascontiguousarray(self.records()["label"])
+
+    def sources(self):
+        """ชื่อไฟล์ต้นทางเต็มของทุก crop ("" ถ้าไม่ได้ระบุ)"""
+        return list(self._sources)
+
+    def name_map(self):
+        """name -> label id (รูปแบบเดียวกับ train_model.build_name_map)"""
+        return {name: label for label, name in enumerate(self.names)}
+
+    def counts(self):
+        """จำนวน crop ต่อชื่อ"""
+        counts = np.bincount(self.labels(), minlength=len(self.names)) if self._count else []
+        return {name: int(counts[label]) if len(counts) else 0 for label, name in enumerate(self.names)}
+
+    def export_folder(self, dataset_dir):
+        """เขียนทุก crop เป็น PNG ใน dataset_dir/<name>/ (รูปแบบเดิมของ add_face_cv.py) คืนจำนวนไฟล์"""
+        crops = self.crops()
+        sources = self.sources()
+        used = set()
+        for i, label in enumerate(self.labels()):
+            name = self.names[label]
+            person_dir = os.path.join(dataset_dir, name)
+            os.makedirs(person_dir, exist_ok=True)
+            stem = os.path.splitext(sources[i])[0] or str(i)
+            file_name = f"{stem}.png"
+            if (name, file_name) in used:
+                file_name = f"{stem}_{i}.png"
+            used.add((name, file_name))
+            cv2.imwrite(os.path.join(person_dir, file_name), crops[i])
+        return len(crops)
@@ -1,53 +1,90 @@
-import cv2
-import numpy as np
-import os
-import sys
-
-# --- การจัดการพาธโมเดล ---
-CORE_DIR = os.path.dirname(os.path.abspath(__file__))
-BASE_DIR = os.path.dirname(CORE_DIR)
-
-PROTOTXT_PATH = os.path.join(BASE_DIR, "models", "deploy.prototxt.txt")
-MODEL_PATH = os.path.join(BASE_DIR, "models", "res10_300x300_ssd_iter_140000.caffemodel")
-
-if not os.path.exists(PROTOTXT_PATH) or not os.path.exists(MODEL_PATH):
-    print("-" * 50, file=sys.stderr)
-    print("[ERROR] No expected DNN/SSD model files found:", file=sys.stderr)
-    print("  > Protottxt:", PROTOTXT_PATH, file=sys.stderr)
-    print("  > Model:", MODEL_PATH, file=sys.stderr)
-    print("Please check if the files are correctly located in the 'models' folder", file=sys.stderr)
-    print("-" * 50, file=sys.stderr)
-    net = None
-else:
-    print("[INFO] Loading DNN/SSD model...")
-    net = cv2.dnn.readNetFromCaffe(PROTOTXT_PATH, MODEL_PATH)
-    print("[INFO] DNN/SSD model loaded successfully")
-
-MIN_CONFIDENCE = 0.5
+from core.detector_backends import (
+    SSD_PROTOTXT_PATH as PROTOTXT_PATH,
+    SSD_MODEL_PATH as MODEL_PATH,
+    DETECTOR_CONFIG_PATH,
+    MIN_CONFIDENCE,
+    DEFAULT_BATCH_SIZE,
+    create_detector,
+    load_detector_config,
+    load_ssd_net,
+    set_thread_budget,
+)
+from core.registry import LazyModel
 
-def detect_faces(image):
-    """ตรวจจับใบหน้าด้วย DNN/SSD"""
-    if net is None:
-        return []
+# PROTOTXT_PATH, MODEL_PATH, MIN_CONFIDENCE และ set_thread_budget re-export จาก detector_backends ให้โค้ดเดิมใช้ต่อได้
+__all__ = [
+    "PROTOTXT_PATH", "MODEL_PATH", "MIN_CONFIDENCE", "SSD_INPUT_SIZE", "set_thread_budget",
+    "load_net", "load_detector", "new_detector_model", "detector_model", "get_detector", "get_net",
+    "detect_faces", "detect_faces_batch",
+]
 
-    if image is None or len(image.shape) < 2:
-        return []
+SSD_INPUT_SIZE = (300, 300)
+
+
+def load_net():
+    """สร้าง Caffe net ของ SSD ใหม่หนึ่งตัว (คืน None หากไม่พบไฟล์โมเดล) ใช้ตอนเทรนซึ่งต้องใช้ SSD เสมอ"""
+    return load_ssd_net()
+
+
+def load_detector(set_threads=True):
+    """
+    สร้าง detector ตาม models/detector_config.json (ไม่มีไฟล์ = SSD 300x300 เหมือนเดิม)
+    set_threads=False: ไม่ใช้ค่า threads ของ config (ผู้เรียกกำหนด cv2.setNumThreads เอง เช่น inference pool)
+    """
+    config = load_detector_config()
+    if not set_threads:
+        config = dict(config, threads=0)
+    return create_detector(config)
+
+
+def _warm_up(detector):
+    detector.warm_up()
+
+
+def new_detector_model(name="face detector", set_threads=True):
+    """
+    LazyModel ของ detector ตัวใหม่ (แต่ละตัวมี cv2.dnn.Net ของตัวเอง จึงเรียกพร้อมกันจากคนละ thread ได้)
+    โหลดเมื่อถูกใช้ครั้งแรก แทนการโหลดตอน import และโหลดใหม่อัตโนมัติเมื่อ autotune_detector.py บันทึก config ใหม่
+    """
+    return LazyModel(name, lambda: load_detector(set_threads), warmup=_warm_up,
+                     watch_paths=[DETECTOR_CONFIG_PATH])
 
-    (h, w) = image.shape[:2]
-    blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0,
-        (300, 300), (104.0, 177.0, 123.0))
 
-    net.setInput(blob)
-    detections = net.forward()
-    detected_faces = []
+detector_model = new_detector_model()
+
+
+def get_detector():
+    return detector_model.get()
+
+
+def get_net():
+    """Caffe net ของ SSD (None ถ้าโหลดไม่ได้หรือ config ใช้ backend อื่น)"""
+    return getattr(detector_model.get(), "net", None)
+
+
+def __getattr__(name):
+    # รองรับโค้ดเดิมที่อ้างถึง detector.net
+    if name == "net":
+        return get_net()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def detect_faces(image):
+    """ตรวจจับใบหน้าด้วย detector ที่ตั้งค่าไว้ (image เป็นภาพ BGR หรือ FrameContext)"""
+    detector = get_detector()
+    if detector is None:
+        return []
+    return detector.detect(image)
 
-    for i in range(0, detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > MIN_CONFIDENCE:
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (startX, startY, endX, endY) = box.astype("int")
-            x, y = startX, startY
-            box_w, box_h = endX - startX, endY - startY
-            detected_faces.append(((x, y, box_w, box_h), confidence))
 
-    return detected_faces
+def detect_faces_batch(images, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    ตรวจจับใบหน้าหลายภาพพร้อมกัน (SSD ใช้ forward pass เดียวต่อ batch)
+    - images: list ของภาพ BGR หรือ FrameContext (ภาพที่เป็น None/ไม่ถูกต้องจะได้ผลลัพธ์เป็น [])
+    - batch_size: จำนวนภาพสูงสุดต่อ blob หนึ่งก้อน
+    คืนค่า: list ของผลลัพธ์แบบเดียวกับ detect_faces() เรียงตามลำดับภาพที่ส่งเข้ามา
+    """
+    detector = get_detector()
+    if detector is None:
+        return [[] for _ in range(len(images))]
+    return detector.detect_batch(images, batch_size)
@@ -0,0 +1,363 @@
+import json
+import logging
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from core.frame_context import FrameContext, SSD_INPUT_SIZE as CONTEXT_SSD_INPUT_SIZE
+from core.instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+# --- การจัดการพาธโมเดล ---
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(CORE_DIR)
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+
+SSD_PROTOTXT_PATH = os.path.join(MODELS_DIR, "deploy.prototxt.txt")
+SSD_MODEL_PATH = os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+# YuNet (ONNX ขนาด ~340 KB) ใช้ได้เมื่อวางไฟล์ไว้ใน models/ และ OpenCV มี cv2.FaceDetectorYN (>= 4.5.4)
+YUNET_MODEL_PATH = os.path.join(MODELS_DIR, "face_detection_yunet_2023mar.onnx")
+HAAR_CASCADE_FILE = "haarcascade_frontalface_default.xml"
+# ค่าที่ autotune_detector.py บันทึกไว้ (ไม่มีไฟล์ = ใช้ DEFAULT_CONFIG)
+DETECTOR_CONFIG_PATH = os.path.join(MODELS_DIR, "detector_config.json")
+
+MIN_CONFIDENCE = 0.5
+SSD_MEAN = (104.0, 177.0, 123.0)
+# จำนวนภาพสูงสุดต่อ forward pass หนึ่งครั้ง (จำกัดขนาดหน่วยความจำของ blob)
+DEFAULT_BATCH_SIZE = 32
+
+HAAR_SCALE_FACTOR = 1.1
+HAAR_MIN_NEIGHBORS = 5
+HAAR_MIN_SIZE = (30, 30)
+YUNET_NMS_THRESHOLD = 0.3
+YUNET_TOP_K = 5000
+
+DEFAULT_CONFIG = {
+    "backend": "ssd",           # ssd | haar | yunet
+    "input_size": [300, 300],   # ขนาดภาพที่ส่งเข้า detector (haar: ย่อเฟรมให้พอดีกรอบนี้)
+    "threads": 0,               # cv2.setNumThreads (0 = ค่าเริ่มต้นของ OpenCV)
+    "dnn_backend": "default",   # ชื่อใน DNN_BACKENDS (ไม่มีผลกับ haar)
+    "dnn_target": "cpu",        # ชื่อใน DNN_TARGETS
+    "min_confidence": MIN_CONFIDENCE,
+}
+
+# ชื่อใน config -> ชื่อค่าคงที่ใน cv2.dnn (บาง build ไม่มีบางค่า)
+DNN_BACKENDS = {
+    "default": "DNN_BACKEND_DEFAULT",
+    "opencv": "DNN_BACKEND_OPENCV",
+    "openvino": "DNN_BACKEND_INFERENCE_ENGINE",
+}
+DNN_TARGETS = {
+    "cpu": "DNN_TARGET_CPU",
+    "cpu_fp16": "DNN_TARGET_CPU_FP16",
+    "opencl": "DNN_TARGET_OPENCL",
+    "opencl_fp16": "DNN_TARGET_OPENCL_FP16",
+}
+
+
+def dnn_constant(table, key):
+    """แปลงชื่อ backend/target ใน config เป็นค่าคงที่ของ cv2.dnn (ValueError ถ้า build นี้ไม่รองรับ)"""
+    attr = table.get(key)
+    if attr is None or not hasattr(cv2.dnn, attr):
+        raise ValueError(f"unsupported DNN setting {key!r}")
+    return getattr(cv2.dnn, attr)
+
+
+def postprocess_ssd_detections(detections, sizes, min_confidence=MIN_CONFIDENCE):
+    """
+    แปลงผลลัพธ์ SSD (1, 1, N, 7) เป็นรายการกล่องแยกตามภาพ แบบ vectorized
+    - detections: output ของ net.forward() (คอลัมน์ 0 คือ index ของภาพใน batch)
+    - sizes: array (num_images, 2) ของ (w, h) ของภาพต้นฉบับ
+    คืนค่า: list (ยาวเท่าจำนวนภาพ) ของ list [((x, y, w, h), confidence), ...]
+    """
+    num_images = len(sizes)
+    results = [[] for _ in range(num_images)]
+
+    rows = detections.reshape(-1, detections.shape[-1])
+    image_ids = rows[:, 0].astype(np.int64)
+    confidences = rows[:, 2]
+    keep = (confidences > min_confidence) & (image_ids >= 0) & (image_ids < num_images)
+    if not keep.any():
+        return results
+
+    rows = rows[keep]
+    image_ids = image_ids[keep]
+    confidences = confidences[keep]
+
+    # สเกลพิกัด normalized [0, 1] กลับเป็นพิกัดพิกเซลของแต่ละภาพในครั้งเดียว
+    wh = np.asarray(sizes, dtype=np.float64)[image_ids]
+    scale = np.concatenate([wh, wh], axis=1)
+    corners = (rows[:, 3:7] * scale).astype("int")
+    boxes = np.empty_like(corners)
+    boxes[:, :2] = corners[:, :2]
+    boxes[:, 2:] = corners[:, 2:] - corners[:, :2]
+
+    # SSD เรียงผลตาม index ของภาพอยู่แล้ว แต่ใช้ stable sort เพื่อความแน่นอน
+    order = np.argsort(image_ids, kind="stable")
+    image_ids = image_ids[order]
+    box_list = boxes[order].tolist()
+    conf_list = confidences[order].tolist()
+    for image_id, box, confidence in zip(image_ids.tolist(), box_list, conf_list):
+        results[image_id].append((tuple(box), confidence))
+
+    return results
+
+
+def load_ssd_net():
+    """สร้าง Caffe net ใหม่หนึ่งตัว (คืน None หากไม่พบไฟล์โมเดล)"""
+    if not os.path.exists(SSD_PROTOTXT_PATH) or not os.path.exists(SSD_MODEL_PATH):
+        print("-" * 50, file=sys.stderr)
+        print("[ERROR] No expected DNN/SSD model files found:", file=sys.stderr)
+        print("  > Protottxt:", SSD_PROTOTXT_PATH, file=sys.stderr)
+        print("  > Model:", SSD_MODEL_PATH, file=sys.stderr)
+        print("Please check if the files are correctly located in the 'models' folder", file=sys.stderr)
+        print("-" * 50, file=sys.stderr)
+        return None
+    return cv2.dnn.readNetFromCaffe(SSD_PROTOTXT_PATH, SSD_MODEL_PATH)
+
+
+def _image_of(image):
+    return image.image if isinstance(image, FrameContext) else image
+
+
+def _valid(image):
+    return image is not None and len(image.shape) >= 2
+
+
+class SSDDetector:
+    """res10 Caffe SSD (detector เดิมของโปรเจกต์) รองรับ batch หลายภาพใน forward pass เดียว"""
+
+    name = "ssd"
+
+    def __init__(self, net, input_size=(300, 300), min_confidence=MIN_CONFIDENCE):
+        self.net = net
+        self.input_size = tuple(input_size)
+        self.min_confidence = min_confidence
+
+    @staticmethod
+    def available():
+        return os.path.exists(SSD_PROTOTXT_PATH) and os.path.exists(SSD_MODEL_PATH)
+
+    @classmethod
+    def load(cls, config):
+        net = load_ssd_net()
+        if net is None:
+            return None
+        net.setPreferableBackend(dnn_constant(DNN_BACKENDS, config["dnn_backend"]))
+        net.setPreferableTarget(dnn_constant(DNN_TARGETS, config["dnn_target"]))
+        return cls(net, config["input_size"], config["min_confidence"])
+
+    def warm_up(self):
+        # forward pass แรกของ OpenCV DNN ช้ากว่าปกติมาก (จัดสรรหน่วยความจำ/เลือก kernel)
+        self.net.setInput(np.zeros((1, 3) + self.input_size[::-1], dtype=np.float32))
+        self.net.forward()
+
+    def detect(self, image):
+        if image is None or len(image.shape) < 2:
+            return []
+        (h, w) = image.shape[:2]
+        if isinstance(image, FrameContext) and self.input_size == CONTEXT_SSD_INPUT_SIZE:
+            # ใช้ blob ที่ context สร้างไว้ใน buffer เดิม (ไม่จัดสรรหน่วยความจำใหม่)
+            with stage("resize"):
+                image.ssd_input
+            with stage("blob"):
+                blob = image.blob
+        else:
+            with stage("resize"):
+                resized = cv2.resize(_image_of(image), self.input_size)
+            with stage("blob"):
+                blob = cv2.dnn.blobFromImage(resized, 1.0, self.input_size, SSD_MEAN)
+
+        with stage("forward"):
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        with stage("postprocess"):
+            return postprocess_ssd_detections(detections, [(w, h)], self.min_confidence)[0]
+
+    def detect_batch(self, images, batch_size=DEFAULT_BATCH_SIZE):
+        results = [[] for _ in range(len(images))]
+        images = [_image_of(image) for image in images]
+        valid = [i for i, image in enumerate(images) if _valid(image)]
+
+        for start in range(0, len(valid), batch_size):
+            chunk = valid[start:start + batch_size]
+            sizes = [(images[i].shape[1], images[i].shape[0]) for i in chunk]
+            with stage("blob"):
+                blob = cv2.dnn.blobFromImages([images[i] for i in chunk], 1.0, self.input_size, SSD_MEAN)
+
+            with stage("forward"):
+                self.net.setInput(blob)
+                detections = self.net.forward()
+
+            with stage("postprocess"):
+                for i, faces in zip(chunk, postprocess_ssd_detections(detections, sizes, self.min_confidence)):
+                    results[i] = faces
+
+        return results
+
+
+class HaarDetector:
+    """
+    Haar cascade ของ OpenCV (ไม่ต้องมีไฟล์โมเดลเพิ่ม) เร็วบน CPU แต่พลาดใบหน้าเอียง/มืดได้ง่ายกว่า SSD
+    เฟรมถูกย่อให้พอดีกับ input_size ก่อนตรวจจับ ไม่มีค่า confidence (ทุกกล่องได้ 1.0)
+    """
+
+    name = "haar"
+
+    def __init__(self, cascade, input_size=(640, 480)):
+        self.cascade = cascade
+        self.input_size = tuple(input_size)
+
+    @staticmethod
+    def cascade_path():
+        data = getattr(cv2, "data", None)
+        return os.path.join(data.haarcascades, HAAR_CASCADE_FILE) if data is not None else None
+
+    @classmethod
+    def available(cls):
+        path = cls.cascade_path()
+        return path is not None and os.path.exists(path)
+
+    @classmethod
+    def load(cls, config):
+        if not cls.available():
+            return None
+        cascade = cv2.CascadeClassifier(cls.cascade_path())
+        return None if cascade.empty() else cls(cascade, config["input_size"])
+
+    def warm_up(self):
+        self.cascade.detectMultiScale(np.zeros(self.input_size[::-1], dtype=np.uint8))
+
+    def detect(self, image):
+        if image is None or len(image.shape) < 2:
+            return []
+        if isinstance(image, FrameContext):
+            gray = image.gray
+        else:
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        (h, w) = gray.shape[:2]
+        scale = min(1.0, self.input_size[0] / w, self.input_size[1] / h)
+        with stage("resize"):
+            small = cv2.resize(gray, (round(w * scale), round(h * scale)),
+                               interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+        with stage("forward"):
+            boxes = self.cascade.detectMultiScale(small, HAAR_SCALE_FACTOR, HAAR_MIN_NEIGHBORS,
+                                                  minSize=HAAR_MIN_SIZE)
+        return [(tuple(int(round(v / scale)) for v in box), 1.0) for box in boxes]
+
+    def detect_batch(self, images, batch_size=DEFAULT_BATCH_SIZE):
+        return [self.detect(image) for image in images]
+
+
+class YuNetDetector:
+    """YuNet (cv2.FaceDetectorYN) CNN ขนาดเล็ก เร็วกว่า res10 SSD บน CPU ที่ความแม่นยำใกล้เคียงกัน"""
+
+    name = "yunet"
+
+    def __init__(self, detector, input_size=(320, 320), min_confidence=MIN_CONFIDENCE):
+        self.detector = detector
+        self.input_size = tuple(input_size)
+        self.min_confidence = min_confidence
+
+    @staticmethod
+    def available():
+        return hasattr(cv2, "FaceDetectorYN") and os.path.exists(YUNET_MODEL_PATH)
+
+    @classmethod
+    def load(cls, config):
+        if not cls.available():
+            return None
+        detector = cv2.FaceDetectorYN.create(
+            YUNET_MODEL_PATH, "", tuple(config["input_size"]), config["min_confidence"],
+            YUNET_NMS_THRESHOLD, YUNET_TOP_K,
+            dnn_constant(DNN_BACKENDS, config["dnn_backend"]),
+            dnn_constant(DNN_TARGETS, config["dnn_target"]))
+        return cls(detector, config["input_size"], config["min_confidence"])
+
+    def warm_up(self):
+        self.detector.detect(np.zeros(self.input_size[::-1] + (3,), dtype=np.uint8))
+
+    def detect(self, image):
+        image = _image_of(image)
+        if not _valid(image):
+            return []
+        (h, w) = image.shape[:2]
+        with stage("resize"):
+            resized = cv2.resize(image, self.input_size)
+        with stage("forward"):
+            _, faces = self.detector.detect(resized)
+        if faces is None:
+            return []
+        with stage("postprocess"):
+            sx, sy = w / self.input_size[0], h / self.input_size[1]
+            return [((int(x * sx), int(y * sy), int(bw * sx), int(bh * sy)), float(score))
+                    for x, y, bw, bh, score in faces[:, [0, 1, 2, 3, 14]].tolist()]
+
+    def detect_batch(self, images, batch_size=DEFAULT_BATCH_SIZE):
+        return [self.detect(image) for image in images]
+
+
+BACKENDS = {cls.name: cls for cls in (SSDDetector, HaarDetector, YuNetDetector)}
+
+# จำนวน thread ของ OpenCV ที่ผู้เรียกกำหนดให้ทั้ง process แล้ว (None = ใช้ค่า threads ใน config ของ detector)
+_thread_budget = None
+
+
+def set_thread_budget(threads):
+    """
+    ตั้ง cv2.setNumThreads ให้ทั้ง process (เช่นส่วนแบ่ง core ของ worker ใน process/thread pool)
+    หลังเรียกแล้ว create_detector จะไม่ใช้ค่า threads ใน config ทับ ทั้งตอนโหลดและ hot reload
+    """
+    global _thread_budget
+    _thread_budget = max(1, int(threads))
+    cv2.setNumThreads(_thread_budget)
+
+
+def available_backends():
+    return [name for name, cls in BACKENDS.items() if cls.available()]
+
+
+def load_detector_config(path=DETECTOR_CONFIG_PATH):
+    """อ่าน config ของ detector (ค่าที่ไม่ได้ระบุใช้ DEFAULT_CONFIG) ไฟล์เสียจะใช้ค่าเริ่มต้นทั้งหมด"""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("อ่าน %s ไม่ได้ (%s) ใช้ค่าเริ่มต้นของ detector", path, e)
+            return dict(DEFAULT_CONFIG)
+    return config
+
+
+def save_detector_config(config, path=DETECTOR_CONFIG_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def create_detector(config=None):
+    """
+    สร้าง detector ตาม config (None = อ่านจาก DETECTOR_CONFIG_PATH) คืน None ถ้าโหลดไม่ได้
+    backend ที่ไม่มีไฟล์โมเดลจะถอยกลับไปใช้ SSD (ค่าอื่นใน config เช่น threads, dnn_backend/target คงเดิม)
+    หมายเหตุ: cv2.setNumThreads มีผลทั้ง process (ทุก detector และ OpenCV ส่วนอื่นด้วย)
+    จึงใช้ค่า threads ใน config เฉพาะเมื่อยังไม่มีการเรียก set_thread_budget()
+    """
+    config = dict(load_detector_config() if config is None else config)
+    cls = BACKENDS.get(config["backend"])
+    if cls is None or not cls.available():
+        if config["backend"] != DEFAULT_CONFIG["backend"]:
+            logger.warning("ใช้ detector %r ไม่ได้ ถอยกลับไปใช้ SSD", config["backend"])
+        config["backend"] = DEFAULT_CONFIG["backend"]
+        config["input_size"] = list(DEFAULT_CONFIG["input_size"])
+        cls = SSDDetector
+
+    if config["threads"] > 0 and _thread_budget is None:
+        cv2.setNumThreads(int(config["threads"]))
+    return cls.load(config)
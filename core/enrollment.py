@@ -0,0 +1,176 @@
+import collections
+import logging
+import os
+import queue
+import re
+import threading
+
+import cv2
+import numpy as np
+
+from core.detector import detect_faces
+
+logger = logging.getLogger(__name__)
+
+FACE_SIZE = (200, 200)
+
+# ค่าเริ่มต้นของ quality gate ตอนเก็บภาพใบหน้า
+ENROLL_MIN_CONFIDENCE = 0.8   # เข้มกว่า MIN_CONFIDENCE ของการจดจำ ไม่เก็บกล่องที่ SSD ไม่แน่ใจ
+MIN_FACE_SIZE = 80            # ด้านสั้นของกล่องขั้นต่ำ (พิกเซล) เล็กกว่านี้ขยายเป็น 200x200 แล้วแตก
+BLUR_THRESHOLD = 50.0         # variance ของ Laplacian บน crop 200x200 ต่ำกว่านี้ถือว่าเบลอ
+DUPLICATE_HAMMING = 5         # dHash 64 บิตต่างกันไม่เกินนี้ถือว่าซ้ำกับภาพที่เก็บไปแล้ว
+
+# เหตุผลที่ไม่เก็บเฟรม (เรียงตามลำดับที่ตรวจ)
+REJECT_REASONS = ("no_face", "multiple_faces", "low_confidence", "too_small", "blurry", "duplicate")
+
+
+def blur_score(face):
+    """variance ของ Laplacian (ยิ่งน้อยยิ่งเบลอ) ของ crop grayscale"""
+    return float(cv2.Laplacian(face, cv2.CV_64F).var())
+
+
+def dhash(face):
+    """difference hash 64 บิต: เทียบความสว่างของพิกเซลติดกันในภาพย่อ 9x8"""
+    small = cv2.resize(face, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming_distances(value, hashes):
+    """จำนวนบิตที่ต่างกันระหว่าง value กับทุก hash ใน hashes (array uint64)"""
+    if len(hashes) == 0:
+        return np.empty(0, dtype=np.int64)
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class EnrollmentFilter:
+    """
+    ตัดสินว่าเฟรมหนึ่งควรเก็บเป็นตัวอย่างใบหน้าหรือไม่ ด้วย SSD ตัวเดียวกับที่ใช้จดจำ
+    ตรวจตามลำดับ: ต้องมีใบหน้าเดียว, confidence, ขนาด, ความคม และต้องไม่ซ้ำกับภาพที่เก็บไปแล้ว
+    (รวม hash ของภาพเดิมที่ส่งมาทาง known_faces เพื่อไม่ให้การเก็บรอบใหม่ซ้ำกับรอบก่อน)
+    """
+
+    def __init__(self, min_confidence=ENROLL_MIN_CONFIDENCE, min_face_size=MIN_FACE_SIZE,
+                 blur_threshold=BLUR_THRESHOLD, max_hamming=DUPLICATE_HAMMING, known_faces=(),
+                 detect_fn=detect_faces):
+        self.min_confidence = min_confidence
+        self.min_face_size = min_face_size
+        self.blur_threshold = blur_threshold
+        self.max_hamming = max_hamming
+        self.detect_fn = detect_fn
+        self._hashes = [dhash(face) for face in known_faces]
+        self.frames = 0
+        self.kept = 0
+        self.rejected = collections.Counter()
+
+    def check(self, frame):
+        """
+        คืน (face, box, reason): face เป็น crop grayscale 200x200 เมื่อควรเก็บ (reason = None)
+        ไม่เช่นนั้น face เป็น None และ reason เป็นหนึ่งใน REJECT_REASONS (box อาจเป็น None)
+        """
+        self.frames += 1
+        faces = self.detect_fn(frame)
+        if not faces:
+            return self._reject("no_face")
+        if len(faces) > 1:
+            # ไม่รู้ว่าใบหน้าไหนเป็นของคนที่กำลังลงทะเบียน
+            return self._reject("multiple_faces")
+
+        box, confidence = faces[0]
+        if confidence < self.min_confidence:
+            return self._reject("low_confidence", box)
+        x, y, w, h = box
+        if min(w, h) < self.min_face_size:
+            return self._reject("too_small", box)
+
+        x1, y1 = max(0, x), max(0, y)
+        roi = frame[y1:y + h, x1:x + w]
+        if roi.size == 0:
+            return self._reject("too_small", box)
+        face = cv2.resize(cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY), FACE_SIZE)
+        if blur_score(face) < self.blur_threshold:
+            return self._reject("blurry", box)
+
+        value = dhash(face)
+        if np.any(hamming_distances(value, self._hashes) <= self.max_hamming):
+            return self._reject("duplicate", box)
+
+        self._hashes.append(value)
+        self.kept += 1
+        return face, box, None
+
+    def _reject(self, reason, box=None):
+        self.rejected[reason] += 1
+        return None, box, reason
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "kept": self.kept,
+            "rejected": {reason: self.rejected[reason] for reason in REJECT_REASONS},
+        }
+
+
+def next_sample_index(dataset_dir):
+    """เลขไฟล์ถัดไปใน dataset/<name>/ (ไม่เขียนทับ 1.png, 2.png, ... ของรอบก่อน)"""
+    if not os.path.isdir(dataset_dir):
+        return 1
+    numbers = [int(m.group(1)) for m in (re.match(r"(\d+)\.png$", f) for f in os.listdir(dataset_dir)) if m]
+    return max(numbers, default=0) + 1
+
+
+class SampleWriter:
+    """
+    เขียนภาพตัวอย่างใน thread แยก ให้ลูปกล้องไม่ต้องรอ PNG encode / disk
+    เขียนเป็นไฟล์ PNG ใน dataset_dir หรือต่อท้าย CropStore (รวมทุกภาพที่รอเป็น append เดียว)
+    """
+
+    def __init__(self, name, dataset_dir=None, store=None):
+        self.name = name
+        self.dataset_dir = dataset_dir
+        self.store = store
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sample-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, face, filename):
+        self._queue.put((face, filename))
+
+    def close(self):
+        """รอให้เขียนครบทุกภาพแล้วหยุด thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = items[-1] is None
+            items = [item for item in items if item is not None]
+            if items:
+                self._write(items)
+            if done:
+                return
+
+    def _write(self, items):
+        if self.store is not None:
+            try:
+                self.written += self.store.append([face for face, _ in items], self.name,
+                                                  [filename for _, filename in items])
+            except Exception:
+                # เช่นดิสก์เต็ม: นับเป็นภาพที่เขียนไม่สำเร็จ thread ยังรับภาพถัดไปต่อ
+                logger.exception("appending %d samples of %r to %s failed", len(items), self.name, self.store.path)
+                self.errors += len(items)
+            return
+        for face, filename in items:
+            if cv2.imwrite(os.path.join(self.dataset_dir, filename), face):
+                self.written += 1
+            else:
+                self.errors += 1
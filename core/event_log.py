@@ -0,0 +1,218 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EVENT_DB_PATH = "recognition_events.db"
+# เห็นชื่อเดิมห่างกันไม่เกินกี่วินาทีถือเป็นการพบครั้งเดียวกัน
+SIGHTING_GAP = 2.0
+# เขียนลงดิสก์อย่างน้อยทุกกี่วินาที หรือเมื่อมีเหตุการณ์ค้างครบ FLUSH_BATCH รายการ
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH = 256
+# จำนวนเฟรมที่รอ writer thread ได้สูงสุด เกินนี้จะทิ้ง (hot loop ไม่ต้องรอ)
+MAX_PENDING_FRAMES = 10000
+# ชื่อที่ไม่ใช่คน (ผลจาก recognizer เมื่อ ROI/โมเดลใช้ไม่ได้)
+IGNORED_NAMES = frozenset({"Unknown", "Error", "Error_ROI", "Error_Predict"})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sightings (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    best_distance REAL NOT NULL,
+    frames INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sightings_name_time ON sightings (name, start_time);
+CREATE INDEX IF NOT EXISTS idx_sightings_start ON sightings (start_time);
+CREATE INDEX IF NOT EXISTS idx_sightings_end ON sightings (end_time);
+"""
+SIGHTING_COLUMNS = ("id", "name", "camera", "start_time", "end_time", "best_distance", "frames")
+
+
+def connect(path=EVENT_DB_PATH):
+    """เปิดฐานข้อมูล (สร้างตารางถ้ายังไม่มี) ในโหมด WAL ผู้อ่านจึงไม่ block writer และกลับกัน"""
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: fsync เฉพาะตอน checkpoint ไฟดับอาจเสียแค่ transaction ล่าสุด
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class EventLog:
+    """
+    บันทึกการพบใบหน้าเป็น "sighting" (ชื่อ, กล้อง, เวลาเริ่ม/จบ, ระยะ LBPH ที่ดีที่สุด, จำนวนเฟรม) ลง SQLite
+    - observe() เรียกจาก hot loop ทุกเฟรม: แค่ใส่คิว ไม่แตะดิสก์
+    - writer thread รวมเฟรมที่เห็นชื่อเดิมในกล้องเดิมติดกัน (ห่างไม่เกิน gap วินาที) เป็นเหตุการณ์เดียว
+      และเขียนเหตุการณ์ที่จบแล้วเป็น transaction ละหลายรายการ
+    เหตุการณ์จะปรากฏในฐานข้อมูลหลังคนนั้นหายไปจากภาพ gap วินาที (+ flush_interval)
+    """
+
+    def __init__(self, path=EVENT_DB_PATH, gap=SIGHTING_GAP, flush_interval=FLUSH_INTERVAL,
+                 flush_batch=FLUSH_BATCH, max_pending=MAX_PENDING_FRAMES):
+        self.path = path
+        self.gap = gap
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._queue = queue.Queue(max_pending)
+        self._open = {}
+        self._rows = []
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.frames = 0
+        self.dropped_frames = 0
+        self.events_written = 0
+        self.transactions = 0
+        self.write_errors = 0
+
+    def start(self):
+        if self._thread is None:
+            # สร้างตารางใน thread ผู้เรียก เพื่อให้ path ที่ใช้ไม่ได้แจ้ง error ทันที
+            connect(self.path).close()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+            self._thread.start()
+        return self
+
+    def observe(self, names, distances, camera="0", timestamp=None):
+        """บันทึกผลการจดจำของหนึ่งเฟรม (ไม่ block) คืน False ถ้าคิวเต็มและเฟรมนี้ถูกทิ้ง"""
+        if not names:
+            return True
+        try:
+            self._queue.put_nowait((time.time() if timestamp is None else timestamp, str(camera),
+                                    list(names), list(distances)))
+        except queue.Full:
+            self.dropped_frames += 1
+            return False
+        return True
+
+    def close(self):
+        """ปิด writer thread และเขียนทุกเหตุการณ์ที่ยังค้าง (รวมที่ยังไม่จบ)"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        conn = connect(self.path)
+        last_flush = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+                if item is not None:
+                    self._add(*item)
+                    # รับเฟรมที่รออยู่ทั้งหมดก่อนค่อยตัดสินใจเขียน
+                    while True:
+                        try:
+                            self._add(*self._queue.get_nowait())
+                        except queue.Empty:
+                            break
+
+                self._close_expired(time.time())
+                now = time.monotonic()
+                if len(self._rows) >= self.flush_batch or (self._rows and now - last_flush >= self.flush_interval):
+                    self._flush(conn)
+                    last_flush = now
+
+            while True:
+                try:
+                    self._add(*self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._close_expired(None)
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def _add(self, timestamp, camera, names, distances):
+        self.frames += 1
+        for name, distance in zip(names, distances):
+            if name in IGNORED_NAMES:
+                continue
+            key = (name, camera)
+            sighting = self._open.get(key)
+            if sighting is not None and timestamp - sighting[1] > self.gap:
+                self._rows.append((name, camera) + tuple(self._open.pop(key)))
+                sighting = None
+            if sighting is None:
+                self._open[key] = [timestamp, timestamp, float(distance), 1]
+            else:
+                sighting[1] = max(sighting[1], timestamp)
+                sighting[2] = min(sighting[2], float(distance))
+                sighting[3] += 1
+
+    def _close_expired(self, now):
+        """ย้าย sighting ที่ไม่เห็นเกิน gap วินาที (หรือทั้งหมดถ้า now=None) ไปรอเขียน"""
+        for key in [key for key, s in self._open.items() if now is None or now - s[1] > self.gap]:
+            self._rows.append(key + tuple(self._open.pop(key)))
+
+    def _flush(self, conn):
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        try:
+            with conn:
+                conn.executemany("INSERT INTO sightings (name, camera, start_time, end_time, best_distance, frames) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error:
+            # เช่นดิสก์เต็ม/ไฟล์ถูก lock นาน: ทิ้ง batch นี้ ไม่ให้ค้างสะสมในหน่วยความจำ
+            self.write_errors += 1
+            logger.exception("Failed to write %d recognition events to %s", len(rows), self.path)
+            return
+        self.events_written += len(rows)
+        self.transactions += 1
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "dropped_frames": self.dropped_frames,
+            "open_sightings": len(self._open),
+            "events_written": self.events_written,
+            "transactions": self.transactions,
+            "write_errors": self.write_errors,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- ค้นหา ---
+
+def query_sightings(conn, start, end, name=None, camera=None):
+    """sighting ที่คาบเกี่ยวช่วงเวลา [start, end] (epoch วินาที) เรียงตามเวลาเริ่ม คืน list ของ dict"""
+    sql = f"SELECT {', '.join(SIGHTING_COLUMNS)} FROM sightings WHERE start_time <= ? AND end_time >= ?"
+    params = [end, start]
+    if name is not None:
+        sql += " AND name = ?"
+        params.append(name)
+    if camera is not None:
+        sql += " AND camera = ?"
+        params.append(str(camera))
+    sql += " ORDER BY start_time"
+    return [dict(zip(SIGHTING_COLUMNS, row)) for row in conn.execute(sql, params)]
+
+
+def who_was_seen(conn, start, end, camera=None):
+    """สรุปต่อชื่อของคนที่ถูกพบในช่วง [start, end]: เห็นครั้งแรก/ล่าสุด, จำนวนครั้ง, ระยะที่ดีที่สุด, กล้อง"""
+    sql = ("SELECT name, MIN(start_time), MAX(end_time), COUNT(*), MIN(best_distance), "
+           "GROUP_CONCAT(DISTINCT camera) FROM sightings WHERE start_time <= ? AND end_time >= ?")
+    params = [end, start]
+    if camera is not None:
+        sql += " AND camera = ?"
+        params.append(str(camera))
+    sql += " GROUP BY name ORDER BY MIN(start_time)"
+    return [{"name": name, "first_seen": first, "last_seen": last, "sightings": count,
+             "best_distance": best, "cameras": sorted(cameras.split(","))}
+            for name, first, last, count, best, cameras in conn.execute(sql, params)]
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import pickle
+import sys
+
+# เวอร์ชันของรูปแบบไฟล์ cache (เปลี่ยนเมื่อโครงสร้างข้อมูลเปลี่ยน)
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """คำนวณ SHA-1 ของเนื้อหาไฟล์"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class FaceCropCache:
+    """
+    Cache บนดิสก์ของใบหน้า grayscale ที่ crop แล้ว แบบ content-addressed
+    - paths:  relpath -> (size, mtime_ns, digest) ใช้ข้ามการ hash ไฟล์ที่ไม่เปลี่ยน
+    - crops:  digest -> (gray_face หรือ None, warning) เก็บทั้งผลสำเร็จและไม่พบใบหน้า
+    - trained: relpath -> digest ของไฟล์ที่อยู่ในโมเดลที่บันทึกล่าสุด (สำหรับ update แบบเพิ่ม)
+    ทั้งหมดผูกกับ detector_config หาก config เปลี่ยน cache จะถูกล้างทั้งหมด
+    """
+
+    def __init__(self, cache_path, root_dir, detector_config):
+        self.cache_path = cache_path
+        self.root_dir = root_dir
+        self.detector_config = detector_config
+        self.paths = {}
+        self.crops = {}
+        self.trained = {}
+        self.trained_model_stat = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"[Warning] อ่านไฟล์ cache ไม่ได้ จะสร้างใหม่: {e}", file=sys.stderr)
+            return
+
+        if data.get("version") != CACHE_VERSION or data.get("detector_config") != self.detector_config:
+            print("[INFO] Detector config เปลี่ยน ล้าง face cache ทั้งหมด")
+            return
+
+        self.paths = data.get("paths", {})
+        self.crops = data.get("crops", {})
+        self.trained = data.get("trained", {})
+        self.trained_model_stat = data.get("trained_model_stat")
+
+    def _relpath(self, path):
+        return os.path.relpath(path, self.root_dir)
+
+    def digest_for(self, path):
+        """คืน digest ของไฟล์ ใช้ค่าเดิมหากขนาดและ mtime ไม่เปลี่ยน"""
+        rel = self._relpath(path)
+        size, mtime_ns = _stat_key(path)
+        entry = self.paths.get(rel)
+        if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self.paths[rel] = (size, mtime_ns, digest)
+        return digest
+
+    def get(self, path):
+        """คืน (gray_face, warning) จาก cache หรือ None หากยังไม่เคยประมวลผลเนื้อหานี้"""
+        result = self.crops.get(self.digest_for(path))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, path, result):
+        self.crops[self.digest_for(path)] = result
+
+    def evict_missing(self, image_paths):
+        """ลบ entry ของไฟล์ที่ถูกลบออกจาก dataset และ crop ที่ไม่มีไฟล์อ้างถึงแล้ว คืนจำนวนไฟล์ที่ถูกลบ"""
+        live = {self._relpath(p) for p in image_paths}
+        removed = [rel for rel in self.paths if rel not in live]
+        for rel in removed:
+            del self.paths[rel]
+        referenced = {entry[2] for entry in self.paths.values()}
+        for digest in [d for d in self.crops if d not in referenced]:
+            del self.crops[digest]
+        return len(removed)
+
+    def mark_trained(self, image_paths, model_path):
+        """บันทึกว่าโมเดลที่ model_path ถูกสร้างจากไฟล์ชุดนี้"""
+        self.trained = {self._relpath(p): self.digest_for(p) for p in image_paths}
+        self.trained_model_stat = _stat_key(model_path) if os.path.exists(model_path) else None
+
+    def new_since_training(self, image_paths, model_path):
+        """
+        คืน list ของไฟล์ที่เพิ่มเข้ามาหลังการเทรนครั้งล่าสุด
+        หรือ None หากต้องเทรนใหม่ทั้งหมด (มีไฟล์ถูกลบ/แก้ไข หรือไฟล์โมเดลถูกเปลี่ยนจากภายนอก)
+        """
+        if not self.trained or not os.path.exists(model_path):
+            return None
+        if self.trained_model_stat != _stat_key(model_path):
+            return None
+
+        current = {self._relpath(p): p for p in image_paths}
+        for rel, digest in self.trained.items():
+            if rel not in current or self.digest_for(current[rel]) != digest:
+                return None
+        return [p for rel, p in current.items() if rel not in self.trained]
+
+    def save(self):
+        data = {
+            "version": CACHE_VERSION,
+            "detector_config": self.detector_config,
+            "paths": self.paths,
+            "crops": self.crops,
+            "trained": self.trained,
+            "trained_model_stat": self.trained_model_stat,
+        }
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_path)
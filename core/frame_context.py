@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+
+SSD_INPUT_SIZE = (300, 300)
+SSD_MEAN = np.array((104.0, 177.0, 123.0), dtype=np.float32)
+FACE_SIZE = (200, 200)
+
+
+class FrameBuffers:
+    """
+    ชุด buffer ที่จัดสรรครั้งเดียวแล้วใช้ซ้ำข้ามเฟรม (จัดสรรใหม่เมื่อขนาดเปลี่ยนเท่านั้น)
+    ผู้ใช้แต่ละ thread ควรมีชุดของตัวเอง
+    """
+
+    def __init__(self):
+        self._arrays = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        array = self._arrays.get(name)
+        if array is None or array.shape != tuple(shape) or array.dtype != dtype:
+            array = np.empty(shape, dtype=dtype)
+            self._arrays[name] = array
+            self.allocations += 1
+        return array
+
+
+class BufferRing:
+    """
+    วนใช้ FrameBuffers หลายชุด เพื่อให้เฟรมที่ยังแสดงผลอยู่ (เช่นใน Tk thread)
+    ไม่ถูกเขียนทับโดยเฟรมถัดไปที่กำลังประมวลผล
+    """
+
+    def __init__(self, size=3):
+        self._sets = [FrameBuffers() for _ in range(size)]
+        self._index = 0
+
+    def next(self):
+        buffers = self._sets[self._index]
+        self._index = (self._index + 1) % len(self._sets)
+        return buffers
+
+
+class FrameContext:
+    """
+    ข้อมูลของเฟรมเดียวที่ส่งต่อระหว่าง detector และ recognizer
+    แต่ละรูปแบบของภาพ (กลับซ้ายขวา, 300x300, blob, grayscale ของ ROI, ใบหน้า 200x200)
+    ถูกคำนวณเมื่อถูกขอครั้งแรกเท่านั้น และเขียนลง buffer ที่จัดสรรไว้แล้ว
+    """
+
+    def __init__(self, frame, flip=False, buffers=None):
+        self.source = frame
+        self.flip = flip
+        self.buffers = buffers if buffers is not None else FrameBuffers()
+        self._image = None
+        self._resized = None
+        self._blob = None
+        self._gray = None
+        self._display = None
+        self._faces = {}
+        self._face_slot = 0
+
+    @property
+    def shape(self):
+        return self.source.shape
+
+    @property
+    def image(self):
+        """ภาพ BGR ที่ใช้ประมวลผลและวาดผล (กลับซ้ายขวาแล้วถ้า flip=True)"""
+        if self._image is None:
+            if self.flip:
+                self._image = cv2.flip(self.source, 1, dst=self.buffers.get("flip", self.source.shape))
+            else:
+                self._image = self.source
+        return self._image
+
+    def display(self, size):
+        """
+        ภาพสำหรับแสดงผลขนาด size (w, h) ย่อจาก source โดยตรงแล้วค่อยกลับซ้ายขวาภาพเล็ก
+        จึงไม่ต้อง flip ทั้งเฟรมความละเอียดเต็ม (วาดผลลงภาพนี้ได้ ไม่กระทบ image)
+        """
+        size = (int(size[0]), int(size[1]))
+        if self._display is not None and self._display.shape[1::-1] == size:
+            return self._display
+        shape = (size[1], size[0], 3)
+        shrink = size[0] * size[1] < self.source.shape[0] * self.source.shape[1]
+        interpolation = cv2.INTER_AREA if shrink else cv2.INTER_LINEAR
+        if self.flip:
+            resized = cv2.resize(self.source, size, dst=self.buffers.get("display_resize", shape),
+                                 interpolation=interpolation)
+            self._display = cv2.flip(resized, 1, dst=self.buffers.get("display", shape))
+        else:
+            self._display = cv2.resize(self.source, size, dst=self.buffers.get("display", shape),
+                                       interpolation=interpolation)
+        return self._display
+
+    @property
+    def ssd_input(self):
+        if self._resized is None:
+            dst = self.buffers.get("ssd_input", (SSD_INPUT_SIZE[1], SSD_INPUT_SIZE[0], 3))
+            self._resized = cv2.resize(self.image, SSD_INPUT_SIZE, dst=dst)
+        return self._resized
+
+    @property
+    def blob(self):
+        """blob (1, 3, H, W) float32 เหมือน cv2.dnn.blobFromImage(resized, 1.0, size, mean)"""
+        if self._blob is None:
+            h, w = SSD_INPUT_SIZE[1], SSD_INPUT_SIZE[0]
+            hwc = self.buffers.get("blob_hwc", (h, w, 3), np.float32)
+            np.subtract(self.ssd_input, SSD_MEAN, out=hwc, dtype=np.float32)
+            blob = self.buffers.get("blob", (1, 3, h, w), np.float32)
+            np.copyto(blob[0], hwc.transpose(2, 0, 1))
+            self._blob = blob
+        return self._blob
+
+    @property
+    def gray(self):
+        """grayscale ของทั้งเฟรม (ใช้เมื่อต้องการทั้งภาพจริง ๆ เช่น optical flow)"""
+        if self._gray is None:
+            shape = self.source.shape[:2]
+            if self.flip and self._image is None:
+                # กลับภาพช่องเดียวหลังแปลงเป็น gray ถูกกว่า flip ภาพ BGR ทั้งเฟรม
+                gray = cv2.cvtColor(self.source, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray_source", shape))
+                self._gray = cv2.flip(gray, 1, dst=self.buffers.get("gray", shape))
+            else:
+                self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray", shape))
+        return self._gray
+
+    def gray_roi(self, box):
+        """grayscale เฉพาะ ROI (ใช้ gray ทั้งเฟรมถ้าคำนวณไว้แล้ว) คืน None ถ้า ROI ว่าง"""
+        (x, y, w, h) = box
+        height, width = self.source.shape[:2]
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + w, width), min(y + h, height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        if self._gray is not None:
+            return self._gray[y1:y2, x1:x2]
+        if self.flip and self._image is None:
+            # ยังไม่ได้ flip ทั้งเฟรม: ตัด ROI ฝั่งตรงข้ามจาก source แล้วกลับเฉพาะ ROI
+            roi = cv2.cvtColor(self.source[y1:y2, width - x2:width - x1], cv2.COLOR_BGR2GRAY)
+            return cv2.flip(roi, 1)
+        return cv2.cvtColor(self.image[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+
+    def face(self, box):
+        """ใบหน้า 200x200 ที่ equalize แล้ว (เขียนลง buffer ของ slot ถัดไป) คืน None ถ้า ROI ว่าง"""
+        key = tuple(int(v) for v in box)
+        if key in self._faces:
+            return self._faces[key]
+
+        roi = self.gray_roi(key)
+        if roi is None:
+            self._faces[key] = None
+            return None
+
+        slot = self._face_slot
+        self._face_slot += 1
+        shape = (FACE_SIZE[1], FACE_SIZE[0])
+        resized = cv2.resize(roi, FACE_SIZE, dst=self.buffers.get(f"face_resize_{slot}", shape))
+        face = cv2.equalizeHist(resized, dst=self.buffers.get(f"face_{slot}", shape))
+        self._faces[key] = face
+        return face
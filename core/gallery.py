@@ -0,0 +1,101 @@
+import numpy as np
+
+from core.lbph_engine import LBPHMatrixEngine
+
+MEDOID_ITERATIONS = 10
+# จำนวน candidate สูงสุดต่อคนที่พิจารณาเป็น medoid (คนที่มีรูปมากกว่านี้จะสุ่ม candidate)
+MAX_MEDOID_CANDIDATES = 1000
+# จำนวนใบหน้าต่อครั้งตอนคำนวณ histogram (ภาพ LBP ของทั้ง batch อยู่ในหน่วยความจำพร้อมกัน)
+HISTOGRAM_CHUNK = 64
+
+
+def face_histograms(faces, **params):
+    """LBPH histogram (N, D) ของใบหน้า grayscale เหมือนที่ LBPHFaceRecognizer.train() เก็บไว้"""
+    engine = LBPHMatrixEngine(np.zeros((0, 0), dtype=np.float32), [], **params)
+    if len(faces) <= HISTOGRAM_CHUNK:
+        return engine.compute_histograms(faces)
+    return np.vstack([engine.compute_histograms(faces[start:start + HISTOGRAM_CHUNK])
+                      for start in range(0, len(faces), HISTOGRAM_CHUNK)])
+
+
+def _pairwise_distances(candidates, points):
+    """ระยะ L2 กำลังสองระหว่าง sqrt ของ histogram (Hellinger) ใกล้เคียง chi-square แต่คำนวณด้วย matmul ได้"""
+    sq_c = (candidates * candidates).sum(axis=1)
+    sq_p = (points * points).sum(axis=1)
+    dist = sq_c[:, None] + sq_p[None, :] - 2.0 * (candidates @ points.T)
+    np.maximum(dist, 0.0, out=dist)
+    return dist
+
+
+def select_medoids(histograms, k, iterations=MEDOID_ITERATIONS, seed=0):
+    """
+    เลือก k sample ตัวแทนของคนหนึ่งด้วย k-medoids (คืน index เรียงจากน้อยไปมาก)
+    เริ่มแบบ greedy (BUILD ของ PAM: เพิ่มทีละตัวที่ลดผลรวมระยะถึง medoid ใกล้สุดได้มากที่สุด)
+    จึงไม่เลือกภาพที่ตรวจจับผิด/แปลกแยกเป็นตัวแทน แล้วปรับ medoid ของแต่ละกลุ่มซ้ำจนคงที่
+    """
+    num_samples = len(histograms)
+    if num_samples <= k:
+        return np.arange(num_samples)
+
+    points = np.sqrt(np.asarray(histograms, dtype=np.float32))
+    candidates = np.arange(num_samples)
+    if num_samples > MAX_MEDOID_CANDIDATES:
+        rng = np.random.default_rng(seed)
+        candidates = np.sort(rng.choice(num_samples, MAX_MEDOID_CANDIDATES, replace=False))
+    dist = _pairwise_distances(points[candidates], points)
+
+    chosen = [int(np.argmin(dist.sum(axis=1)))]
+    nearest = dist[chosen[0]].copy()
+    while len(chosen) < k:
+        cost = np.minimum(dist, nearest[None, :]).sum(axis=1)
+        cost[chosen] = np.inf
+        best = int(np.argmin(cost))
+        chosen.append(best)
+        np.minimum(nearest, dist[best], out=nearest)
+
+    is_candidate = np.zeros(num_samples, dtype=bool)
+    is_candidate[candidates] = True
+    candidate_pos = np.full(num_samples, -1)
+    candidate_pos[candidates] = np.arange(len(candidates))
+    for _ in range(iterations):
+        assign = np.argmin(dist[chosen], axis=0)
+        updated = list(chosen)
+        for cluster in range(k):
+            members = np.flatnonzero(assign == cluster)
+            member_candidates = candidate_pos[members[is_candidate[members]]]
+            if len(member_candidates) == 0:
+                continue
+            cost = dist[np.ix_(member_candidates, members)].sum(axis=1)
+            updated[cluster] = int(member_candidates[np.argmin(cost)])
+        if len(set(updated)) < k or updated == chosen:
+            break
+        chosen = updated
+
+    return np.sort(candidates[chosen])
+
+
+def condense_gallery(histograms, labels, max_per_identity, seed=0):
+    """index ของ sample ที่เก็บไว้ (ไม่เกิน max_per_identity ต่อ label) เรียงตามลำดับเดิม"""
+    labels = np.asarray(labels).reshape(-1)
+    keep = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        keep.append(members[select_medoids(histograms[members], max_per_identity, seed=seed)])
+    return np.sort(np.concatenate(keep)) if keep else np.zeros(0, dtype=np.int64)
+
+
+def holdout_split(labels, fraction, seed=0):
+    """
+    แบ่ง index เป็น (train, held-out) แยกตามคน โดยสุ่มแบบกำหนด seed
+    คนที่มีรูปเดียวจะอยู่ใน train ทั้งหมด (ไม่มีอะไรให้จับคู่ถ้าเอาไปทดสอบ)
+    """
+    labels = np.asarray(labels).reshape(-1)
+    rng = np.random.default_rng(seed)
+    train, test = [], []
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        count = int(round(len(members) * fraction)) if len(members) > 1 else 0
+        count = min(max(count, 1 if len(members) > 1 else 0), len(members) - 1)
+        test.append(members[:count])
+        train.append(members[count:])
+    return np.sort(np.concatenate(train)), np.sort(np.concatenate(test))
@@ -0,0 +1,266 @@
+import collections
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+
+from core.detector import new_detector_model, set_thread_budget
+from core.detector_backends import DEFAULT_BATCH_SIZE
+from core.instrumentation import RollingHistogram
+from core.recognition_cache import RecognitionCache
+from core.recognizer import DEFAULT_CONFIDENCE_THRESHOLD, new_lbph_model, recognize_faces_lbph_multi
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUEUE = 64
+
+
+class PoolFullError(Exception):
+    """คิวของ inference pool เต็ม (submit แบบ block=False)"""
+
+
+class _Task:
+    __slots__ = ("frame", "detect_only", "confidence_threshold", "nprobe", "future", "submitted_at")
+
+    def __init__(self, frame, detect_only, confidence_threshold, nprobe):
+        self.frame = frame
+        self.detect_only = detect_only
+        self.confidence_threshold = confidence_threshold
+        self.nprobe = nprobe
+        self.future = concurrent.futures.Future()
+        self.submitted_at = time.perf_counter()
+
+
+class _Worker:
+    """
+    detector (cv2.dnn.Net) และโมเดล LBPH ของ worker หนึ่งตัว ไม่ใช้ร่วมกับ worker อื่น
+    (LBPHMatrixEngine / ดัชนี IVF ของ recognizer ถูกสร้างแยกตาม LazyModel จึงเป็นของ worker เองด้วย)
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.detector = new_detector_model(f"face detector (worker {index})", set_threads=False)
+        self.lbph = new_lbph_model(f"LBPH model (worker {index})")
+        # version ของโมเดลแต่ละ worker นับแยกกัน จึงใช้ cache ของตัวเอง
+        self.cache = RecognitionCache()
+        self.thread = None
+        self.tasks = 0
+        self.busy_time = 0.0
+
+
+class InferencePool:
+    """
+    worker K thread แต่ละตัวมี detector (Net) และ LBPH recognizer ของตัวเอง จึงประมวลผลได้พร้อมกัน
+    โดยไม่ต้อง lock (Net เดียวกันเรียก setInput/forward จากหลาย thread พร้อมกันไม่ได้)
+    OpenCV ปล่อย GIL ระหว่าง forward/predict งานหนักจึงใช้หลาย core ได้แม้เป็น thread
+
+    - submit(frame) คืน concurrent.futures.Future ของ [((x, y, w, h), det_confidence, name, distance), ...]
+      ใช้จาก thread ใดก็ได้ และ asyncio ใช้ผ่าน asyncio.wrap_future()
+    - worker ที่ว่างจะหยิบงานที่รออยู่ได้ถึง max_batch งานไปทำเป็น SSD forward pass เดียว (ไม่รอเพิ่ม)
+      แล้วจับคู่ใบหน้าทั้งหมดด้วย recognize_faces_lbph_multi (engine NumPy แบบเดียวกับ service แบบ worker เดียว)
+    - cv2.setNumThreads มีผลทั้ง process: pool ตั้งเป็น threads_per_worker (ค่าเริ่มต้น core // K)
+      ให้ K worker ที่ทำงานพร้อมกันใช้ thread รวมประมาณเท่าจำนวน core
+    """
+
+    def __init__(self, num_workers=None, threads_per_worker=None, max_batch=DEFAULT_BATCH_SIZE,
+                 max_queue=DEFAULT_MAX_QUEUE):
+        cores = os.cpu_count() or 1
+        self.num_workers = max(1, int(num_workers or min(cores, 4)))
+        self.threads_per_worker = max(1, int(threads_per_worker or cores // self.num_workers))
+        self.max_batch = max(1, int(max_batch))
+        self._tasks = queue.Queue(max_queue)
+        self._workers = [_Worker(i) for i in range(self.num_workers)]
+        self._lock = threading.Lock()
+        self._started = False
+
+        self.requests = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batch_sizes = collections.Counter()
+        self._queue_wait = RollingHistogram()
+        self._latency = RollingHistogram()
+
+    def start(self, preload=True):
+        """เริ่ม worker (preload=True: โหลดและ warm-up โมเดลของทุก worker ให้เสร็จก่อนคืนค่า)"""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        set_thread_budget(self.threads_per_worker)
+        if preload:
+            for worker in self._workers:
+                worker.detector.get()
+                worker.lbph.get()
+        for worker in self._workers:
+            worker.thread = threading.Thread(target=self._run, args=(worker,),
+                                             name=f"inference-{worker.index}", daemon=True)
+            worker.thread.start()
+        logger.info("Inference pool: %d workers x %d OpenCV threads", self.num_workers, self.threads_per_worker)
+        return self
+
+    def submit(self, frame, detect_only=False, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+               nprobe=None, block=True, timeout=None):
+        """
+        ส่งเฟรม (ภาพ BGR หรือ FrameContext) ไปประมวลผล คืน Future
+        - detect_only=True: ผลเป็น [((x, y, w, h), det_confidence), ...] แบบ detect_faces
+        - block=False: raise PoolFullError ทันทีถ้าคิวเต็ม แทนการรอ
+        ห้ามแก้ไขเฟรมจนกว่า Future จะเสร็จ
+        """
+        if not self._started:
+            self.start()
+        task = _Task(frame, detect_only, confidence_threshold, nprobe)
+        try:
+            self._tasks.put(task, block=block, timeout=timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise PoolFullError(f"inference pool queue full ({self._tasks.maxsize} pending frames)")
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._tasks.qsize())
+        return task.future
+
+    def map(self, frames, **kwargs):
+        """ประมวลผลหลายเฟรมพร้อมกัน คืนผลเรียงตามลำดับเฟรม"""
+        futures = [self.submit(frame, **kwargs) for frame in frames]
+        return [future.result() for future in futures]
+
+    def _take_batch(self):
+        task = self._tasks.get()
+        if task is None:
+            return None
+        batch = [task]
+        while len(batch) < self.max_batch:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                # sentinel ของการปิด: คืนให้ worker ที่จะหยิบครั้งถัดไป
+                self._tasks.put(None)
+                break
+            batch.append(task)
+        # งานที่ผู้เรียกยกเลิกไปแล้วไม่ต้องประมวลผล
+        return [task for task in batch if task.future.set_running_or_notify_cancel()]
+
+    def _run(self, worker):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for task in batch:
+                self._queue_wait.add(started - task.submitted_at)
+            try:
+                detector = worker.detector.get()
+                frames = [task.frame for task in batch]
+                if detector is None:
+                    detections = [[] for _ in frames]
+                elif len(frames) == 1:
+                    detections = [detector.detect(frames[0])]
+                else:
+                    detections = detector.detect_batch(frames, len(frames))
+            except Exception as e:
+                logger.exception("Inference worker %d: detection failed", worker.index)
+                for task in batch:
+                    self._finish(task, exception=e)
+                continue
+
+            # งานที่ต้องจดจำ: จับคู่ทุกใบหน้าของทั้ง batch ด้วย engine (NumPy) ของ worker ในครั้งเดียว
+            groups = collections.defaultdict(list)
+            for task, faces in zip(batch, detections):
+                if task.detect_only or not faces:
+                    self._finish(task, faces if task.detect_only else [])
+                else:
+                    groups[(task.confidence_threshold, task.nprobe)].append((task, faces))
+            for (confidence_threshold, nprobe), items in groups.items():
+                try:
+                    recognized = recognize_faces_lbph_multi(
+                        [task.frame for task, _ in items], [[box for (box, conf) in faces] for _, faces in items],
+                        confidence_threshold, nprobe, model=worker.lbph, cache=worker.cache)
+                except Exception as e:
+                    logger.exception("Inference worker %d: recognition failed", worker.index)
+                    for task, _ in items:
+                        self._finish(task, exception=e)
+                    continue
+                for (task, faces), (names, distances) in zip(items, recognized):
+                    self._finish(task, [(tuple(int(v) for v in box), float(conf), name, float(distance))
+                                        for (box, conf), name, distance in zip(faces, names, distances)])
+
+            with self._lock:
+                self.batch_sizes[len(batch)] += 1
+            worker.tasks += len(batch)
+            worker.busy_time += time.perf_counter() - started
+
+    def _finish(self, task, result=None, exception=None):
+        self._latency.add(time.perf_counter() - task.submitted_at)
+        with self._lock:
+            if exception is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+        if exception is not None:
+            task.future.set_exception(exception)
+        else:
+            task.future.set_result(result)
+
+    @property
+    def queue_depth(self):
+        return self._tasks.qsize()
+
+    def stats(self):
+        """สถิติสำหรับ export (ชื่อเดียวกับ MicroBatcher.metrics()) พร้อมงานต่อ worker"""
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "workers": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "max_batch_size": self.max_batch,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": batches,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "queue_wait": self._queue_wait.snapshot(),
+            "latency": self._latency.snapshot(),
+            "per_worker": [{"tasks": w.tasks, "busy_s": round(w.busy_time, 3),
+                            "cache_hit_rate": w.cache.stats()["hit_rate"]} for w in self._workers],
+        }
+
+    def cache_stats(self):
+        """สถิติ recognition cache ของทุก worker (แต่ละ worker มี cache ของตัวเอง) รวมกันและแยกต่อ worker"""
+        per_worker = [w.cache.stats() for w in self._workers]
+        totals = {key: sum(s[key] for s in per_worker)
+                  for key in ("entries", "max_entries", "hits", "misses", "evicted_size", "evicted_age",
+                              "invalidations")}
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = totals["hits"] / lookups if lookups else 0.0
+        totals["per_worker"] = per_worker
+        return totals
+
+    def close(self, wait=True):
+        """หยุดรับงาน ทำงานที่ค้างในคิวให้เสร็จ แล้วปิด worker"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+        for _ in self._workers:
+            self._tasks.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
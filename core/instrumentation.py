@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+# ชื่อ stage มาตรฐานใน hot path (ใช้ชื่ออื่นเพิ่มได้)
+STAGES = ("resize", "blob", "forward", "postprocess",
+          "gray", "face_resize", "equalize", "predict",
+          "draw", "photoimage")
+
+DEFAULT_WINDOW = 512
+LOG_LEVEL_ENV = "FACE_LOG_LEVEL"
+PROFILE_ENV = "FACE_PROFILE"
+
+# logger ของทั้งโปรเจกต์อยู่ใต้ "core" ปิดไว้เป็นค่าเริ่มต้น (NullHandler ไม่ให้ logging พิมพ์อะไรเอง)
+logging.getLogger("core").addHandler(logging.NullHandler())
+
+
+def configure_logging(level=None):
+    """
+    เปิด log ระดับ level (เช่น "DEBUG", "INFO") ไปที่ stderr
+    ถ้าไม่ระบุ จะอ่านจาก environment variable FACE_LOG_LEVEL (ไม่ตั้ง = ปิด)
+    """
+    level = level or os.environ.get(LOG_LEVEL_ENV)
+    if not level:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+    for name in ("core", "app"):
+        logger = logging.getLogger(name)
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        logger.addHandler(handler)
+
+
+class RollingHistogram:
+    """เก็บค่าล่าสุด window ค่าใน ring buffer สำหรับคำนวณ percentile ตอนเรียก snapshot()"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self._values = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        with self._lock:
+            self._values[self._index] = value
+            self._index = (self._index + 1) % len(self._values)
+            self.count += 1
+            self.total += value
+
+    def values(self):
+        with self._lock:
+            return self._values[:min(self.count, len(self._values))].copy()
+
+    def snapshot(self):
+        """สถิติเป็น ms: จำนวนครั้ง, ค่าเฉลี่ยทั้งหมด และ p50/p95/p99/max ของช่วงล่าสุด"""
+        recent = self.values() * 1000.0
+        if len(recent) == 0:
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99])
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000.0,
+            "recent_mean_ms": float(recent.mean()),
+            "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+            "max_ms": float(recent.max()),
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageTimer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.add(time.perf_counter() - self._start)
+        return False
+
+
+class Instrumentation:
+    """
+    ตัวจับเวลาแยกตาม stage พร้อม rolling histogram
+    ปิดเป็นค่าเริ่มต้น: stage() คืน context manager เปล่าที่ใช้ร่วมกัน เกือบไม่มี overhead
+    """
+
+    def __init__(self, enabled=False, window=DEFAULT_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, RollingHistogram(self.window))
+        return histogram
+
+    def stage(self, name):
+        """ใช้กับ with: `with stage("forward"): net.forward()`"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageTimer(self._histogram(name))
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self._histogram(name).add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def snapshot(self):
+        """คืน dict ของสถิติทุก stage เรียงตาม STAGES ก่อน แล้วตามด้วย stage อื่น"""
+        # คัดลอกภายใต้ lock: worker thread อาจเพิ่ม stage ใหม่ระหว่างวนลูป
+        with self._lock:
+            histograms = list(self._histograms.items())
+        histograms.sort(key=lambda item: (STAGES.index(item[0]) if item[0] in STAGES else len(STAGES), item[0]))
+        return {name: histogram.snapshot() for name, histogram in histograms}
+
+    def summary_lines(self):
+        lines = []
+        for name, stats in self.snapshot().items():
+            if stats.get("count"):
+                lines.append(f"{name:<12} p50 {stats['p50_ms']:6.2f}  p95 {stats['p95_ms']:6.2f} ms")
+        return lines
+
+    def export_json(self, path):
+        data = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": self.snapshot()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return data
+
+
+# instance กลางที่ทุกโมดูลใช้ร่วมกัน (เปิดด้วย FACE_PROFILE=1 หรือ instruments.enabled = True)
+instruments = Instrumentation(enabled=os.environ.get(PROFILE_ENV, "") not in ("", "0"))
+stage = instruments.stage
@@ -0,0 +1,166 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from core.lbph_engine import LBPHMatrixEngine, NO_MATCH_DISTANCE
+
+# รูปแบบไฟล์ (little-endian):
+#   header 128 ไบต์ (HEADER_FORMAT เติมศูนย์ให้เต็ม) ตามด้วย section ที่จัดตำแหน่งทุก ALIGNMENT ไบต์
+#   histograms_t (D, N) float32/float16 -> histogram_sums (N,) float64 -> labels (N,) int32 -> names (JSON UTF-8)
+# histogram ถูกเก็บแบบ transpose ตรงกับที่ LBPHMatrixEngine ใช้ จึง memmap ไปใช้ได้ทันทีโดยไม่คัดลอก
+MAGIC = b"LBPHBIN\0"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<8sIBxxxiiiidQQQQI"
+HEADER_SIZE = 128
+ALIGNMENT = 64
+
+DTYPE_CODES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+# ไฟล์ที่เล็กกว่านี้อ่านเข้าหน่วยความจำแล้วปิดไฟล์ทันที แทนการ mmap ค้างไว้
+MMAP_MIN_SIZE = 64 * 1024 * 1024
+
+
+class LBPHFormatError(ValueError):
+    """ไฟล์โมเดล binary เสียหาย, checksum ไม่ตรง หรือเป็นเวอร์ชันที่ไม่รองรับ"""
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(num_samples, hist_dim, itemsize, names_len):
+    """คืน offset ของแต่ละ section และขนาดไฟล์ทั้งหมด"""
+    hist_offset = _aligned(HEADER_SIZE)
+    sums_offset = _aligned(hist_offset + hist_dim * num_samples * itemsize)
+    labels_offset = _aligned(sums_offset + num_samples * 8)
+    names_offset = _aligned(labels_offset + num_samples * 4)
+    return hist_offset, sums_offset, labels_offset, names_offset, names_offset + names_len
+
+
+def save_binary(path, engine, id_to_name_map, dtype=np.float32):
+    """
+    บันทึก LBPHMatrixEngine และ name map เป็นไฟล์ binary (เขียนไฟล์ชั่วคราวแล้ว rename)
+    dtype=np.float16 ลดขนาดลงครึ่งหนึ่ง แลกกับระยะที่คลาดเคลื่อนเล็กน้อย
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    dtype_code = next((code for code, dt in DTYPE_CODES.items() if dt == dtype), None)
+    if dtype_code is None:
+        raise ValueError(f"unsupported histogram dtype {dtype}")
+
+    histograms_t = np.ascontiguousarray(engine.histograms_t, dtype=dtype)
+    hist_dim, num_samples = histograms_t.shape
+    # ผลรวมคำนวณจากค่าที่บันทึกจริง ให้ระยะตรงกับ histogram ที่โหลดกลับมา
+    sums = histograms_t.sum(axis=0, dtype=np.float64).astype("<f8")
+    labels = np.ascontiguousarray(engine.labels, dtype="<i4")
+    names = json.dumps({str(k): v for k, v in sorted(id_to_name_map.items())}, ensure_ascii=False).encode("utf-8")
+
+    hist_offset, sums_offset, labels_offset, names_offset, total = _layout(
+        num_samples, hist_dim, dtype.itemsize, len(names))
+    payload = bytearray(total - HEADER_SIZE)
+
+    def place(offset, data):
+        payload[offset - HEADER_SIZE:offset - HEADER_SIZE + len(data)] = data
+
+    place(hist_offset, histograms_t.tobytes())
+    place(sums_offset, sums.tobytes())
+    place(labels_offset, labels.tobytes())
+    place(names_offset, names)
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, dtype_code,
+                         engine.radius, engine.neighbors, engine.grid_x, engine.grid_y,
+                         engine.threshold, num_samples, hist_dim, len(names), 0,
+                         zlib.crc32(payload))
+    header = header.ljust(HEADER_SIZE, b"\0")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return total
+
+
+def load_binary(path, verify=True, use_mmap=None):
+    """
+    โหลดไฟล์ binary คืน (LBPHMatrixEngine, id_to_name_map) verify=True ตรวจ CRC32 ของข้อมูลทั้งหมด
+    - use_mmap=True: histogram ของ engine เป็น view ของ mmap (ไม่คัดลอก) mapping ถูกปิดเองเมื่อ engine
+      ไม่ถูกใช้แล้ว (เช่นหลัง hot reload สร้าง engine ใหม่)
+    - use_mmap=None: mmap เฉพาะไฟล์ตั้งแต่ MMAP_MIN_SIZE บน POSIX ไฟล์เล็กอ่านเข้าหน่วยความจำ
+      บน Windows อ่านเข้าหน่วยความจำเสมอ เพราะไฟล์ที่ถูก map อยู่จะถูก os.replace ของ save_binary ทับไม่ได้
+      (เทรนใหม่ระหว่างที่ GUI/service เปิดโมเดลอยู่จะล้มเหลว)
+    """
+    with open(path, "rb") as f:
+        if use_mmap is None:
+            use_mmap = os.name != "nt" and os.fstat(f.fileno()).st_size >= MMAP_MIN_SIZE
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else f.read()
+
+    if len(buffer) < HEADER_SIZE:
+        raise LBPHFormatError(f"{path}: file too small")
+    (magic, version, dtype_code, radius, neighbors, grid_x, grid_y, threshold,
+     num_samples, hist_dim, names_len, _, crc) = struct.unpack_from(HEADER_FORMAT, buffer)
+    if magic != MAGIC:
+        raise LBPHFormatError(f"{path}: not an LBPH binary model")
+    if version != FORMAT_VERSION:
+        raise LBPHFormatError(f"{path}: unsupported format version {version}")
+    if dtype_code not in DTYPE_CODES:
+        raise LBPHFormatError(f"{path}: unknown histogram dtype code {dtype_code}")
+
+    dtype = DTYPE_CODES[dtype_code]
+    hist_offset, sums_offset, labels_offset, names_offset, total = _layout(
+        num_samples, hist_dim, dtype.itemsize, names_len)
+    if len(buffer) != total:
+        raise LBPHFormatError(f"{path}: expected {total} bytes, found {len(buffer)}")
+    if verify and zlib.crc32(memoryview(buffer)[HEADER_SIZE:]) != crc:
+        raise LBPHFormatError(f"{path}: checksum mismatch")
+
+    histograms_t = np.frombuffer(buffer, dtype=dtype, count=hist_dim * num_samples,
+                                 offset=hist_offset).reshape(hist_dim, num_samples)
+    sums = np.frombuffer(buffer, dtype="<f8", count=num_samples, offset=sums_offset)
+    labels = np.frombuffer(buffer, dtype="<i4", count=num_samples, offset=labels_offset)
+    names = json.loads(bytes(buffer[names_offset:names_offset + names_len]).decode("utf-8"))
+
+    engine = LBPHMatrixEngine.from_transposed(
+        histograms_t, labels, sums, radius=radius, neighbors=neighbors,
+        grid_x=grid_x, grid_y=grid_y, threshold=threshold)
+    return engine, {int(k): v for k, v in names.items()}
+
+
+class BinaryLBPHRecognizer:
+    """
+    ใช้แทน cv2.face.LBPHFaceRecognizer ในส่วนที่ core.recognizer ใช้ (predict / getter ของพารามิเตอร์)
+    โดยจับคู่ผ่าน LBPHMatrixEngine ที่โหลดจากไฟล์ binary ผลเหมือน predict() ของ OpenCV
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def predict(self, face):
+        labels, distances = self.engine.predict_batch([np.asarray(face, dtype=np.uint8)])
+        return int(labels[0]), float(distances[0])
+
+    def getHistograms(self):
+        return [row.reshape(1, -1) for row in self.engine.histograms]
+
+    def getLabels(self):
+        return self.engine.labels.reshape(-1, 1)
+
+    def getRadius(self):
+        return self.engine.radius
+
+    def getNeighbors(self):
+        return self.engine.neighbors
+
+    def getGridX(self):
+        return self.engine.grid_x
+
+    def getGridY(self):
+        return self.engine.grid_y
+
+    def getThreshold(self):
+        return self.engine.threshold
+
+    def setThreshold(self, threshold):
+        self.engine.threshold = float(threshold) if threshold is not None else NO_MATCH_DISTANCE
@@ -0,0 +1,194 @@
+import math
+import sys
+
+import numpy as np
+
+# predict() ของ OpenCV ใช้ DBL_MAX เป็นค่าเริ่มต้นของระยะ และคืน label -1 เมื่อไม่มีตัวไหนผ่าน threshold
+NO_MATCH_LABEL = -1
+NO_MATCH_DISTANCE = sys.float_info.max
+
+_FLT_EPSILON = np.float32(np.finfo(np.float32).eps)
+
+
+def elbp(faces, radius=1, neighbors=8):
+    """
+    Extended LBP แบบเดียวกับ elbp_() ของ cv2.face (รวมการ interpolate และ epsilon)
+    - faces: uint8 array (B, H, W)
+    คืนค่า: int32 array (B, H - 2r, W - 2r)
+    """
+    src = np.asarray(faces, dtype=np.float32)
+    _, rows, cols = src.shape
+    center = src[:, radius:rows - radius, radius:cols - radius]
+    dst = np.zeros(center.shape, dtype=np.int32)
+
+    for n in range(neighbors):
+        # คำนวณ sample point ด้วยลำดับและชนิดข้อมูลเดียวกับ OpenCV (double -> float)
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / float(neighbors)))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / float(neighbors)))
+        fx, fy = int(math.floor(x)), int(math.floor(y))
+        cx, cy = int(math.ceil(x)), int(math.ceil(y))
+        ty = y - np.float32(fy)
+        tx = x - np.float32(fx)
+        one = np.float32(1)
+        w1 = (one - tx) * (one - ty)
+        w2 = tx * (one - ty)
+        w3 = (one - tx) * ty
+        w4 = tx * ty
+
+        def window(dy, dx):
+            return src[:, radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+        t = w1 * window(fy, fx) + w2 * window(fy, cx) + w3 * window(cy, fx) + w4 * window(cy, cx)
+        bit = (t > center) | (np.abs(t - center) < _FLT_EPSILON)
+        dst += bit.astype(np.int32) << n
+
+    return dst
+
+
+def spatial_histograms(lbp_images, num_patterns, grid_x, grid_y):
+    """
+    Histogram แยกตาม cell (grid_x x grid_y) ต่อภาพ แบบเดียวกับ spatial_histogram() ของ cv2.face
+    คืนค่า: float32 array (B, grid_x * grid_y * num_patterns)
+    """
+    batch, rows, cols = lbp_images.shape
+    width = cols // grid_x
+    height = rows // grid_y
+    num_cells = grid_x * grid_y
+
+    cells = lbp_images[:, :grid_y * height, :grid_x * width]
+    cells = cells.reshape(batch, grid_y, height, grid_x, width).transpose(0, 1, 3, 2, 4)
+    cells = cells.reshape(batch * num_cells, height * width)
+
+    # bincount ครั้งเดียวสำหรับทุก cell ของทุกภาพ โดยเลื่อน offset ของแต่ละ cell
+    valid = (cells >= 0) & (cells < num_patterns)
+    offsets = (np.arange(batch * num_cells, dtype=np.int64) * num_patterns)[:, None]
+    counts = np.bincount((cells + offsets)[valid], minlength=batch * num_cells * num_patterns)
+
+    hist = counts.astype(np.float32) * np.float32(1.0 / (height * width))
+    return hist.reshape(batch, num_cells * num_patterns)
+
+
+def chi_square_alt(queries, gallery_t, gallery_sums=None):
+    """
+    ระยะ HISTCMP_CHISQR_ALT ระหว่างทุก query กับทุก histogram ใน gallery
+    - queries: (Q, D) float32
+    - gallery_t: gallery แบบ transpose (D, N) เพื่อให้ดึงเฉพาะ bin ที่ต้องใช้ได้ต่อเนื่องในหน่วยความจำ
+    - gallery_sums: ผลรวมของแต่ละ histogram (N,) ถ้าไม่ส่งมาจะคำนวณให้
+    คืนค่า: float64 array (Q, N)
+
+    ใช้ 2(a-b)^2/(a+b) = 2[(a+b) - 4ab/(a+b)] ทำให้ต้องคำนวณเฉพาะ bin ที่ query ไม่เป็นศูนย์
+    (histogram ของ LBPH ส่วนใหญ่เป็นศูนย์) ส่วนที่เหลือคือผลรวมของ gallery ที่คำนวณไว้ล่วงหน้า
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    num_gallery = gallery_t.shape[1]
+    out = np.empty((len(queries), num_gallery), dtype=np.float64)
+    if len(queries) == 0 or num_gallery == 0:
+        return out
+    if gallery_sums is None:
+        gallery_sums = gallery_t.sum(axis=0, dtype=np.float64)
+
+    for i, query in enumerate(queries):
+        nonzero = np.flatnonzero(query)
+        a = gallery_t[nonzero].astype(np.float32, copy=False)
+        b = query[nonzero][:, None]
+        cross = a * b
+        a += b
+        cross /= a
+        out[i] = gallery_sums + query.sum(dtype=np.float64) - 4.0 * cross.sum(axis=0, dtype=np.float64)
+
+    # ป้องกันค่าติดลบเล็กน้อยจาก floating point เมื่อ histogram เหมือนกันทุก bin
+    np.maximum(out, 0.0, out=out)
+    out *= 2.0
+    return out
+
+
+class LBPHMatrixEngine:
+    """
+    ตัวจับคู่ LBPH แบบ vectorized: เก็บ histogram ของ gallery เป็น matrix ต่อเนื่อง
+    แล้วคำนวณระยะ chi-square ของทุกใบหน้าในเฟรมพร้อมกัน (ผลเหมือน recognizer.predict)
+    """
+
+    def __init__(self, histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 threshold=NO_MATCH_DISTANCE, dtype=np.float32):
+        histograms = np.asarray(histograms, dtype=dtype)
+        # เก็บแบบ transpose (bins x samples) สำหรับ chi_square_alt
+        self.histograms_t = np.ascontiguousarray(histograms.T)
+        self.histogram_sums = histograms.sum(axis=1, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        self.radius = int(radius)
+        self.neighbors = int(neighbors)
+        self.grid_x = int(grid_x)
+        self.grid_y = int(grid_y)
+        self.threshold = float(threshold)
+
+    @classmethod
+    def from_recognizer(cls, recognizer, dtype=np.float32):
+        """ดึง histogram, label และพารามิเตอร์จาก cv2.face.LBPHFaceRecognizer ที่เทรน/โหลดแล้ว"""
+        histograms = recognizer.getHistograms()
+        if len(histograms):
+            matrix = np.vstack([h.reshape(1, -1) for h in histograms])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return cls(matrix, recognizer.getLabels(),
+                   radius=recognizer.getRadius(), neighbors=recognizer.getNeighbors(),
+                   grid_x=recognizer.getGridX(), grid_y=recognizer.getGridY(),
+                   threshold=recognizer.getThreshold(), dtype=dtype)
+
+    @classmethod
+    def from_transposed(cls, histograms_t, labels, histogram_sums=None, **params):
+        """สร้างจาก histogram แบบ transpose (D, N) ที่มีอยู่แล้ว เช่น memmap ของไฟล์โมเดล binary (ไม่คัดลอก)"""
+        engine = cls(np.zeros((0, histograms_t.shape[0]), dtype=histograms_t.dtype), [], **params)
+        engine.histograms_t = histograms_t
+        if histogram_sums is None:
+            histogram_sums = histograms_t.sum(axis=0, dtype=np.float64)
+        engine.histogram_sums = histogram_sums
+        engine.labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        return engine
+
+    @property
+    def histograms(self):
+        """histogram ของ gallery (N, D) (view ของ histograms_t)"""
+        return self.histograms_t.T
+
+    def __len__(self):
+        return self.histograms_t.shape[1]
+
+    def compute_histograms(self, faces):
+        """
+        คำนวณ LBPH histogram ของใบหน้า grayscale (uint8)
+        - faces: list หรือ array (B, H, W) ภาพขนาดเดียวกันจะถูกคำนวณพร้อมกันทั้ง batch
+        """
+        if len(faces) == 0:
+            return np.zeros((0, self.histograms_t.shape[0]), dtype=np.float32)
+
+        num_patterns = 2 ** self.neighbors
+        shapes = {face.shape for face in faces}
+        if len(shapes) == 1:
+            lbp = elbp(np.stack(faces), self.radius, self.neighbors)
+            return spatial_histograms(lbp, num_patterns, self.grid_x, self.grid_y)
+
+        return np.vstack([
+            spatial_histograms(elbp(face[None], self.radius, self.neighbors),
+                               num_patterns, self.grid_x, self.grid_y)
+            for face in faces
+        ])
+
+    def predict_histograms(self, query_histograms):
+        """คืน (labels, distances) ของ histogram ที่คำนวณแล้ว ตามกติกาเดียวกับ predict()"""
+        num_queries = len(query_histograms)
+        labels = np.full(num_queries, NO_MATCH_LABEL, dtype=np.int32)
+        distances = np.full(num_queries, NO_MATCH_DISTANCE, dtype=np.float64)
+        if num_queries == 0 or len(self) == 0:
+            return labels, distances
+
+        dist = chi_square_alt(query_histograms, self.histograms_t, self.histogram_sums)
+        best = np.argmin(dist, axis=1)
+        best_dist = dist[np.arange(num_queries), best]
+        matched = best_dist < self.threshold
+        labels[matched] = self.labels[best[matched]]
+        distances[matched] = best_dist[matched]
+        return labels, distances
+
+    def predict_batch(self, faces):
+        """จดจำใบหน้าหลายใบพร้อมกัน คืน (labels, distances) เป็น numpy array"""
+        return self.predict_histograms(self.compute_histograms(faces))
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+from core.lbph_engine import NO_MATCH_DISTANCE, NO_MATCH_LABEL, chi_square_alt
+
+INDEX_VERSION = 1
+DEFAULT_NPROBE = 4
+KMEANS_ITERATIONS = 10
+# จำนวน sample สูงสุดที่ใช้หา centroid (assign ทุก sample ทีหลัง)
+KMEANS_MAX_TRAIN_SAMPLES = 20000
+
+
+def _embed(histograms):
+    """sqrt ของ histogram (Hellinger) ทำให้ระยะ L2 ใกล้เคียง chi-square และคำนวณด้วย matmul ได้"""
+    return np.sqrt(np.asarray(histograms, dtype=np.float32))
+
+
+def _nearest_centroids(points, centroids, count=1):
+    """คืน index ของ centroid ที่ใกล้ที่สุด count ตัว (L2) สำหรับแต่ละจุด"""
+    dist = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * (points @ centroids.T)
+    if count == 1:
+        return np.argmin(dist, axis=1)[:, None]
+    count = min(count, centroids.shape[0])
+    nearest = np.argpartition(dist, count - 1, axis=1)[:, :count]
+    order = np.take_along_axis(dist, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1)
+
+
+def _kmeans(points, num_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    train = points
+    if len(points) > KMEANS_MAX_TRAIN_SAMPLES:
+        train = points[rng.choice(len(points), KMEANS_MAX_TRAIN_SAMPLES, replace=False)]
+
+    centroids = train[rng.choice(len(train), num_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroids(train, centroids)[:, 0]
+        for k in range(num_lists):
+            members = train[assign == k]
+            if len(members):
+                centroids[k] = members.mean(axis=0)
+            else:
+                # cluster ว่าง: สุ่มจุดใหม่มาแทน
+                centroids[k] = train[rng.integers(len(train))]
+    return centroids
+
+
+class IVFIndex:
+    """
+    ดัชนีแบบ IVF (inverted file) สำหรับ gallery ของ LBPH
+    แบ่ง histogram เป็น num_lists กลุ่มด้วย k-means แล้วค้นหาเฉพาะ nprobe กลุ่มที่ใกล้ query ที่สุด
+    จากนั้นคำนวณระยะ chi-square จริงกับ sample ในกลุ่มเหล่านั้น (nprobe = num_lists เท่ากับค้นหาทั้งหมด)
+    """
+
+    def __init__(self, engine, centroids, order, offsets):
+        self.engine = engine
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.order = np.asarray(order, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+        # เรียง gallery ใหม่ตามกลุ่ม ให้แต่ละกลุ่มเป็น slice ต่อเนื่องของคอลัมน์
+        self.histograms_t = np.ascontiguousarray(engine.histograms_t[:, self.order])
+        self.histogram_sums = engine.histogram_sums[self.order]
+        self.labels = engine.labels[self.order]
+
+    @property
+    def num_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, engine, num_lists=None, seed=0):
+        """สร้างดัชนีจาก LBPHMatrixEngine (num_lists ค่าเริ่มต้น ~ sqrt(จำนวน sample))"""
+        num_samples = len(engine)
+        if num_lists is None:
+            num_lists = int(round(np.sqrt(num_samples)))
+        num_lists = max(1, min(num_lists, num_samples))
+
+        points = _embed(engine.histograms)
+        centroids = _kmeans(points, num_lists, seed=seed)
+        assign = _nearest_centroids(points, centroids)[:, 0]
+
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=num_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(engine, centroids, order, offsets)
+
+    def save(self, path):
+        np.savez(path, version=INDEX_VERSION, centroids=self.centroids,
+                 order=self.order, offsets=self.offsets,
+                 labels=self.engine.labels, histogram_sums=self.engine.histogram_sums)
+
+    @classmethod
+    def load(cls, path, engine):
+        """โหลดดัชนีที่บันทึกไว้ คืน None หากไม่ตรงกับโมเดลที่โหลดอยู่ (เช่นเทรนใหม่แล้วไม่ได้สร้างดัชนี)"""
+        with np.load(path) as data:
+            matches = (int(data["version"]) == INDEX_VERSION
+                       and np.array_equal(data["labels"], engine.labels)
+                       and np.allclose(data["histogram_sums"], engine.histogram_sums))
+            if not matches:
+                print(f"[Warning] ดัชนี {path} ไม่ตรงกับโมเดล LBPH ปัจจุบัน จะไม่ใช้ดัชนี", file=sys.stderr)
+                return None
+            return cls(engine, data["centroids"], data["order"], data["offsets"])
+
+    def search(self, query_histograms, nprobe=DEFAULT_NPROBE):
+        """คืน (labels, distances) แบบเดียวกับ LBPHMatrixEngine.predict_histograms แต่ค้นหาเฉพาะ nprobe กลุ่ม"""
+        num_queries = len(query_histograms)
+        labels = np.full(num_queries, NO_MATCH_LABEL, dtype=np.int32)
+        distances = np.full(num_queries, NO_MATCH_DISTANCE, dtype=np.float64)
+        if num_queries == 0 or len(self.order) == 0:
+            return labels, distances
+
+        probes = _nearest_centroids(_embed(query_histograms), self.centroids, nprobe)
+        threshold = self.engine.threshold
+        for i, query in enumerate(query_histograms):
+            best_dist = NO_MATCH_DISTANCE
+            best_label = NO_MATCH_LABEL
+            for k in probes[i]:
+                start, end = self.offsets[k], self.offsets[k + 1]
+                if start == end:
+                    continue
+                dist = chi_square_alt(query[None], self.histograms_t[:, start:end],
+                                      self.histogram_sums[start:end])[0]
+                j = int(np.argmin(dist))
+                if dist[j] < best_dist and dist[j] < threshold:
+                    best_dist = dist[j]
+                    best_label = self.labels[start + j]
+            labels[i] = best_label
+            distances[i] = best_dist
+        return labels, distances
+
+
+def evaluate_recall(index, query_histograms, nprobes=None):
+    """
+    เปรียบเทียบผลของดัชนีกับการค้นหาทั้งหมด (exhaustive) ที่ nprobe ต่าง ๆ
+    คืน list ของ dict: nprobe, recall (พบ sample ที่ใกล้ที่สุดจริง), label_agreement, speedup
+    """
+    start = time.perf_counter()
+    exact_labels, exact_dist = index.engine.predict_histograms(query_histograms)
+    exact_time = time.perf_counter() - start
+
+    if nprobes is None:
+        nprobes = sorted({1, 2, 4, 8, 16, index.num_lists} & set(range(1, index.num_lists + 1)))
+
+    report = []
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        labels, dist = index.search(query_histograms, nprobe)
+        elapsed = time.perf_counter() - start
+        found = np.isclose(dist, exact_dist, rtol=1e-9, atol=1e-9)
+        report.append({
+            "nprobe": nprobe,
+            "recall": float(found.mean()) if len(found) else 1.0,
+            "label_agreement": float((labels == exact_labels).mean()) if len(labels) else 1.0,
+            "speedup": exact_time / elapsed if elapsed > 0 else float("inf"),
+        })
+    return report
+
+
+def default_index_path(model_path):
+    return os.path.splitext(model_path)[0] + "_index.npz"
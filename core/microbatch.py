@@ -0,0 +1,149 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import time
+
+from core.instrumentation import RollingHistogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_QUEUE = 256
+
+
+class QueueFullError(Exception):
+    """คิวคำขอเต็ม (ผู้เรียกควรตอบกลับว่าระบบไม่ว่างแทนการรอ)"""
+
+
+class MicroBatcher:
+    """
+    รวมคำขอ asyncio ที่มาถึงในช่วงเวลาสั้น ๆ เป็น batch เดียว แล้วเรียก process_batch(items) ครั้งเดียว
+    - max_batch_size: จำนวนคำขอสูงสุดต่อ batch
+    - max_wait_ms: เวลาที่รอคำขอเพิ่มหลังคำขอแรกของ batch (มาก = batch ใหญ่/throughput สูง, น้อย = latency ต่ำ)
+    - max_queue: จำนวนคำขอที่รอได้สูงสุด เกินนี้ submit() จะ raise QueueFullError
+    process_batch ทำงานใน thread เดียว (OpenCV Net ไม่รองรับการเรียก forward พร้อมกัน)
+    และต้องคืน list ผลลัพธ์ที่ยาวเท่ากับ items
+    """
+
+    def __init__(self, process_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, max_queue=DEFAULT_MAX_QUEUE):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="microbatch")
+
+        self.requests = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = collections.Counter()
+        self._queue_wait = RollingHistogram()
+        self._batch_time = RollingHistogram()
+        self._latency = RollingHistogram()
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item):
+        """ส่งคำขอหนึ่งรายการ แล้วรอผลลัพธ์ของรายการนั้นจาก batch ที่มันถูกรวมอยู่"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(f"queue full ({self.max_queue} pending requests)")
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self):
+        """รอคำขอแรก แล้วรวมคำขอที่ตามมาจนครบ max_batch_size หรือหมดเวลา max_wait"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # คำขอที่ค้างอยู่ในคิวระหว่าง batch ก่อนหน้า ไม่ต้องรอเพิ่ม
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # คำขอที่ผู้เรียกยกเลิกไปแล้ว (เช่น client ตัดการเชื่อมต่อ) ไม่ต้องประมวลผล
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self._queue_wait.add(started - enqueued)
+            self.batch_sizes[len(batch)] += 1
+
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.process_batch, [item for item, _, _ in batch])
+            except Exception as e:
+                self.failed_batches += 1
+                logger.exception("Batch of %d failed", len(batch))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self._batch_time.add(finished - started)
+            for (_, future, enqueued), result in zip(batch, results):
+                self._latency.add(finished - enqueued)
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self):
+        """สถิติสำหรับ export: ความลึกคิว, การกระจายขนาด batch และเวลารอ/ประมวลผล (ms)"""
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": batches,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "queue_wait": self._queue_wait.snapshot(),
+            "batch_time": self._batch_time.snapshot(),
+            "latency": self._latency.snapshot(),
+        }
@@ -0,0 +1,195 @@
+import cv2
+
+from core.detector import detect_faces, detect_faces_batch
+from core.frame_context import FrameContext
+from core.tracker import iou_matrix
+
+# ค่าเริ่มต้นของ motion gate
+MOTION_WIDTH = 160            # ความกว้างของภาพย่อที่ใช้ทำ frame differencing
+PIXEL_THRESHOLD = 15          # ผลต่างความสว่างขั้นต่ำที่นับว่าพิกเซลเปลี่ยน
+MIN_CHANGED_FRACTION = 0.002  # สัดส่วนพิกเซลที่เปลี่ยนขั้นต่ำ ต่ำกว่านี้ถือว่าฉากนิ่ง (ข้าม SSD)
+MAX_CROP_FRACTION = 0.5       # ถ้าพื้นที่ crop รวมเกินสัดส่วนนี้ของเฟรม ให้รัน SSD ทั้งเฟรมแทน
+CROP_MARGIN = 0.5             # ขยาย crop รอบบริเวณที่เปลี่ยนไปอีกกี่เท่าของขนาดด้านยาว
+MIN_CROP_SIZE = 160           # ขนาด crop ขั้นต่ำ (พิกเซลของเฟรมเต็ม) ให้มีบริบทพอสำหรับ SSD
+FULL_REFRESH_EVERY = 30       # บังคับรัน SSD ทั้งเฟรมทุก N เฟรมที่ไม่ได้รัน (กันแสง/ฉากค่อย ๆ เปลี่ยน)
+DUPLICATE_IOU = 0.5           # กล่องจาก crop ที่ซ้อนกันเกินนี้ถือเป็นใบหน้าเดียวกัน
+
+
+def _merge_rects(rects):
+    """รวมสี่เหลี่ยม (x1, y1, x2, y2) ที่ซ้อนทับกันจนไม่มีคู่ใดซ้อนกัน"""
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in rects]
+
+
+def _suppress_duplicates(detections, threshold=DUPLICATE_IOU):
+    """ตัดกล่องที่ซ้อนกับกล่องที่ confidence สูงกว่า (ใบหน้าที่คร่อมขอบ crop ถูกพบซ้ำ)"""
+    if len(detections) < 2:
+        return detections
+    detections = sorted(detections, key=lambda d: -d[1])
+    iou = iou_matrix([box for box, _ in detections], [box for box, _ in detections])
+    keep = []
+    for i in range(len(detections)):
+        if all(iou[i, j] < threshold for j in keep):
+            keep.append(i)
+    return [detections[i] for i in keep]
+
+
+class MotionGatedDetector:
+    """
+    ตัวตรวจจับสำหรับกล้องที่ฉากส่วนใหญ่นิ่ง
+    - เทียบภาพ gray ย่อ (กว้าง MOTION_WIDTH) กับเฟรมที่รัน SSD ล่าสุด
+    - ไม่มีอะไรเปลี่ยน: ข้าม SSD และคืนผลเดิม
+    - เปลี่ยนเฉพาะบางบริเวณ: รัน SSD เฉพาะ crop ที่ขยายรอบบริเวณนั้น (batch เดียว) แล้วแปลงพิกัดกลับ
+      ใบหน้าเดิมที่อยู่นอกบริเวณที่เปลี่ยนยังคงอยู่
+    - เปลี่ยนมาก: รัน SSD ทั้งเฟรมตามปกติ
+    ใช้แทน detect_faces ได้โดยตรง (เช่นเป็น detect_fn ของ FaceTracker)
+    """
+
+    def __init__(self, detect_fn=detect_faces, detect_batch_fn=detect_faces_batch,
+                 motion_width=MOTION_WIDTH, pixel_threshold=PIXEL_THRESHOLD,
+                 min_changed_fraction=MIN_CHANGED_FRACTION, max_crop_fraction=MAX_CROP_FRACTION,
+                 full_refresh_every=FULL_REFRESH_EVERY):
+        self.detect_fn = detect_fn
+        self.detect_batch_fn = detect_batch_fn
+        self.motion_width = motion_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_crop_fraction = max_crop_fraction
+        self.full_refresh_every = full_refresh_every
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        self.reset()
+
+    def reset(self):
+        self._reference = None
+        self._spare = None
+        self._detections = []
+        self._since_full = 0
+        self.frames = 0
+        self.skipped_frames = 0
+        self.crop_frames = 0
+        self.full_frames = 0
+        self.total_pixels = 0
+        self.processed_pixels = 0
+
+    def __call__(self, frame):
+        return self.detect(frame)
+
+    def _small_gray(self, image):
+        h, w = image.shape[:2]
+        size = (self.motion_width, max(1, round(h * self.motion_width / w)))
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        spare = self._spare if self._spare is not None and self._spare.shape == small.shape[:2] else None
+        # INTER_AREA เฉลี่ยพิกเซลอยู่แล้ว จึงกรอง noise ของกล้องไปในตัว
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=spare)
+
+    def detect(self, frame):
+        """คืน [((x, y, w, h), confidence), ...] เหมือน detect_faces (frame เป็นภาพ BGR หรือ FrameContext)"""
+        image = frame.image if isinstance(frame, FrameContext) else frame
+        if image is None or len(image.shape) < 2:
+            return []
+
+        h, w = image.shape[:2]
+        self.frames += 1
+        self.total_pixels += h * w
+        small = self._small_gray(image)
+
+        reference = self._reference
+        if (reference is None or reference.shape != small.shape
+                or self._since_full >= self.full_refresh_every):
+            return self._run_full(frame, small, w * h)
+
+        diff = cv2.absdiff(small, reference)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        if cv2.countNonZero(mask) < self.min_changed_fraction * mask.size:
+            # ฉากนิ่ง: ไม่รัน SSD และไม่เปลี่ยนเฟรมอ้างอิง (การเปลี่ยนแปลงเล็ก ๆ จะสะสมจนเกิน threshold)
+            self.skipped_frames += 1
+            self._since_full += 1
+            self._spare = small
+            return list(self._detections)
+
+        rects = self._changed_rects(mask, w / small.shape[1], w, h)
+        crop_area = sum((x2 - x1) * (y2 - y1) for (x1, y1, x2, y2) in rects)
+        if not rects or crop_area > self.max_crop_fraction * w * h:
+            return self._run_full(frame, small, w * h)
+
+        crops = [image[y1:y2, x1:x2] for (x1, y1, x2, y2) in rects]
+        new_detections = []
+        for (x1, y1, _, _), faces in zip(rects, self.detect_batch_fn(crops)):
+            for (bx, by, bw, bh), conf in faces:
+                new_detections.append(((bx + x1, by + y1, bw, bh), conf))
+
+        # ใบหน้าเดิมที่อยู่นอกบริเวณที่ตรวจใหม่ยังคงอยู่ ส่วนที่อยู่ใน crop ใช้ผลใหม่แทน
+        kept = [(box, conf) for (box, conf) in self._detections
+                if not any(_box_center_in(box, rect) for rect in rects)]
+        self._detections = _suppress_duplicates(kept + new_detections)
+
+        self.crop_frames += 1
+        self.processed_pixels += crop_area
+        self._since_full += 1
+        self._swap_reference(small)
+        return list(self._detections)
+
+    def _run_full(self, frame, small, area):
+        self._detections = list(self.detect_fn(frame))
+        self.full_frames += 1
+        self.processed_pixels += area
+        self._since_full = 0
+        self._swap_reference(small)
+        return list(self._detections)
+
+    def _swap_reference(self, small):
+        self._spare, self._reference = self._reference, small
+
+    def _changed_rects(self, mask, scale, w, h):
+        """สี่เหลี่ยม (x1, y1, x2, y2) บนเฟรมเต็มที่ครอบบริเวณที่เปลี่ยนและใบหน้าเดิมที่ทับกัน (ขยายแล้ว)"""
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        rects = []
+        for x, y, rw, rh, _ in stats[1:count]:
+            rects.append((x * scale, y * scale, (x + rw) * scale, (y + rh) * scale))
+
+        # ใบหน้าเดิมที่ทับบริเวณที่เปลี่ยน (เช่นคนที่ขยับเล็กน้อย) ต้องอยู่ใน crop ทั้งใบ
+        for (bx, by, bw, bh), _ in self._detections:
+            for i, (x1, y1, x2, y2) in enumerate(rects):
+                if bx < x2 and x1 < bx + bw and by < y2 and y1 < by + bh:
+                    rects[i] = (min(x1, bx), min(y1, by), max(x2, bx + bw), max(y2, by + bh))
+
+        expanded = []
+        for (x1, y1, x2, y2) in rects:
+            side = max(x2 - x1, y2 - y1)
+            side = max(side * (1 + 2 * CROP_MARGIN), MIN_CROP_SIZE)
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            # crop สี่เหลี่ยมจัตุรัส เพื่อไม่ให้ใบหน้าถูกบีบเมื่อ SSD ย่อเป็น 300x300
+            expanded.append((int(max(0, cx - side / 2)), int(max(0, cy - side / 2)),
+                             int(min(w, cx + side / 2)), int(min(h, cy + side / 2))))
+        return _merge_rects(expanded)
+
+    def stats(self):
+        """สัดส่วนเฟรมที่ข้าม SSD และสัดส่วนพิกเซลที่ไม่ได้ส่งเข้า SSD"""
+        return {
+            "frames": self.frames,
+            "skipped_frames": self.skipped_frames,
+            "crop_frames": self.crop_frames,
+            "full_frames": self.full_frames,
+            "skipped_frame_fraction": self.skipped_frames / self.frames if self.frames else 0.0,
+            "skipped_pixel_fraction": 1.0 - self.processed_pixels / self.total_pixels if self.total_pixels else 0.0,
+        }
+
+
+def _box_center_in(box, rect):
+    (x, y, w, h) = box
+    cx, cy = x + w / 2, y + h / 2
+    return rect[0] <= cx < rect[2] and rect[1] <= cy < rect[3]
@@ -0,0 +1,228 @@
+import collections
+import logging
+import threading
+import time
+
+import cv2
+
+from core.detector import detect_faces_batch
+from core.frame_context import FrameContext, BufferRing
+from core.instrumentation import stage
+from core.pipeline import LatestFrameQueue, PipelineResult
+from core.recognizer import recognize_faces_lbph_multi
+
+logger = logging.getLogger(__name__)
+
+# จำนวนเฟรมสูงสุดต่อ SSD forward pass หนึ่งครั้ง (None = ทุก stream ที่มีเฟรมรออยู่)
+DEFAULT_MAX_BATCH = None
+STATS_WINDOW = 60
+
+
+class StreamState:
+    """สถานะและตัวนับของ stream หนึ่ง (capture thread เขียน, inference thread อ่าน)"""
+
+    def __init__(self, index, source, mirror=False):
+        self.index = index
+        self.source = source
+        self.name = f"cam{source}" if isinstance(source, int) else str(source)
+        self.mirror = mirror
+        self.cap = None
+        self.frames = LatestFrameQueue(1)
+        self.results = LatestFrameQueue(1)
+        self.buffers = BufferRing()
+        self.thread = None
+        self.finished = False
+
+        self.captured = 0
+        self.processed = 0
+        self.read_failures = 0
+        self._processed_at = collections.deque(maxlen=STATS_WINDOW)
+        self._latencies = collections.deque(maxlen=STATS_WINDOW)
+
+    def record(self, captured_at, processed_at):
+        self.processed += 1
+        self._processed_at.append(processed_at)
+        self._latencies.append(processed_at - captured_at)
+
+    def stats(self):
+        times = self._processed_at
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        latency = sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+        return {
+            "name": self.name,
+            "captured": self.captured,
+            "processed": self.processed,
+            "dropped": self.frames.dropped,
+            "fps": fps,
+            "latency_ms": latency * 1000.0,
+            "finished": self.finished,
+        }
+
+
+class MultiStreamPipeline:
+    """
+    เปิดหลายแหล่งภาพ (index กล้องหรือไฟล์วิดีโอ) พร้อมกัน โดยมี capture thread ต่อแหล่ง
+    และ inference thread เดียวที่รวมเฟรมจากทุก stream เป็น SSD forward pass เดียว
+
+    ความเป็นธรรมระหว่าง stream:
+    - แต่ละ stream มีคิวแบบ latest-frame-wins ขนาด 1 stream ที่เร็วจึงค้างได้ไม่เกินหนึ่งเฟรม
+    - แต่ละ batch รับได้ไม่เกินหนึ่งเฟรมต่อ stream
+    - ถ้า max_batch น้อยกว่าจำนวน stream จะเริ่มเลือกแบบ round-robin ต่อจาก stream ที่ได้ไปล่าสุด
+    event_log (EventLog) ถ้ากำหนด จะได้รับผลการจดจำของทุกเฟรม โดยใช้ชื่อ stream เป็นชื่อกล้อง
+    """
+
+    def __init__(self, sources, process_fn=None, max_batch=DEFAULT_MAX_BATCH, mirror=False,
+                 realtime_files=True, event_log=None):
+        self.streams = [StreamState(i, source, mirror) for i, source in enumerate(sources)]
+        self.process_fn = process_fn
+        self.event_log = event_log
+        self.max_batch = max_batch
+        self.realtime_files = realtime_files
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._inference_thread = None
+        self._next_stream = 0
+
+        self.batches = 0
+        self.batch_sizes = collections.Counter()
+        self._batch_times = collections.deque(maxlen=STATS_WINDOW)
+
+    def start(self):
+        """เปิดทุกแหล่งภาพ คืน list ของชื่อแหล่งที่เปิดไม่ได้"""
+        failed = []
+        self._stop.clear()
+        for stream in self.streams:
+            stream.cap = cv2.VideoCapture(stream.source)
+            if not stream.cap.isOpened():
+                failed.append(stream.name)
+                stream.finished = True
+                continue
+            stream.thread = threading.Thread(target=self._capture_loop, args=(stream,),
+                                             name=f"capture-{stream.index}", daemon=True)
+            stream.thread.start()
+        self._inference_thread = threading.Thread(target=self._inference_loop, name="inference", daemon=True)
+        self._inference_thread.start()
+        return failed
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._ready.set()
+        for stream in self.streams:
+            if stream.thread is not None:
+                stream.thread.join(timeout)
+                stream.thread = None
+        if self._inference_thread is not None:
+            self._inference_thread.join(timeout)
+            self._inference_thread = None
+        for stream in self.streams:
+            if stream.cap is not None:
+                stream.cap.release()
+                stream.cap = None
+
+    @property
+    def finished(self):
+        """True เมื่อทุก stream จบแล้ว (เช่นไฟล์วิดีโอเล่นจบ) และไม่มีเฟรมรอประมวลผล"""
+        return all(stream.finished and len(stream.frames) == 0 for stream in self.streams)
+
+    def _capture_loop(self, stream):
+        is_file = not isinstance(stream.source, int)
+        fps = stream.cap.get(cv2.CAP_PROP_FPS) if is_file else 0.0
+        interval = 1.0 / fps if is_file and self.realtime_files and fps > 0 else 0.0
+        next_frame = time.perf_counter()
+        while not self._stop.is_set():
+            ret, frame = stream.cap.read()
+            if not ret:
+                if is_file:
+                    stream.finished = True
+                    break
+                stream.read_failures += 1
+                time.sleep(0.01)
+                continue
+            stream.captured += 1
+            stream.frames.put((frame, time.perf_counter(), stream.captured))
+            self._ready.set()
+            if interval:
+                # อ่านไฟล์วิดีโอตามความเร็วจริง เหมือนกล้อง
+                next_frame += interval
+                delay = next_frame - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.perf_counter()
+
+    def _collect(self):
+        """หยิบเฟรมล่าสุดได้ไม่เกินหนึ่งเฟรมต่อ stream แบบ round-robin คืน list ของ (stream, item)"""
+        count = len(self.streams)
+        limit = self.max_batch or count
+        batch = []
+        for offset in range(count):
+            stream = self.streams[(self._next_stream + offset) % count]
+            item = stream.frames.get_nowait()
+            if item is None:
+                continue
+            batch.append((stream, item))
+            if len(batch) >= limit:
+                # รอบถัดไปเริ่มที่ stream ถัดจากตัวสุดท้ายที่ได้ไป
+                self._next_stream = (stream.index + 1) % count
+                break
+        return batch
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            if not self._ready.wait(0.1):
+                continue
+            self._ready.clear()
+            batch = self._collect()
+            if not batch:
+                continue
+            if len(batch) == (self.max_batch or len(self.streams)):
+                # อาจยังมีเฟรมค้างใน stream ที่ไม่ได้เข้ารอบนี้
+                self._ready.set()
+
+            start = time.perf_counter()
+            contexts = [FrameContext(frame, flip=stream.mirror, buffers=stream.buffers.next())
+                        for stream, (frame, _, _) in batch]
+            outputs = self._process(contexts, [stream.name for stream, _ in batch])
+            now = time.perf_counter()
+            self.batches += 1
+            self.batch_sizes[len(batch)] += 1
+            self._batch_times.append(now - start)
+
+            for (stream, (_, captured_at, index)), output in zip(batch, outputs):
+                stream.record(captured_at, now)
+                stream.results.put(PipelineResult(output, captured_at, now, index))
+
+    def _process(self, contexts, cameras):
+        """SSD หนึ่ง forward pass สำหรับทุกเฟรม แล้วจดจำทุกใบหน้าของทุกเฟรมในครั้งเดียว"""
+        detections = detect_faces_batch(contexts, batch_size=max(1, len(contexts)))
+        boxes_list = [[box for (box, _) in faces] for faces in detections]
+        if any(boxes_list):
+            recognized = recognize_faces_lbph_multi(contexts, boxes_list)
+        else:
+            recognized = [([], []) for _ in contexts]
+
+        outputs = []
+        for ctx, camera, boxes, (names, confidences) in zip(contexts, cameras, boxes_list, recognized):
+            if self.event_log is not None:
+                self.event_log.observe(names, confidences, camera=camera)
+            if self.process_fn is not None:
+                with stage("draw"):
+                    outputs.append(self.process_fn(ctx.image, boxes, names, confidences))
+            else:
+                outputs.append((ctx.image, boxes, names, confidences))
+        return outputs
+
+    def get_result(self, index):
+        """ผลล่าสุดของ stream index ที่ยังไม่ได้ดึง (PipelineResult) หรือ None"""
+        return self.streams[index].results.get_nowait()
+
+    def stats(self):
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+        batch_ms = sum(self._batch_times) / len(self._batch_times) * 1000.0 if self._batch_times else 0.0
+        return {
+            "streams": [stream.stats() for stream in self.streams],
+            "batches": batches,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "batch_ms": batch_ms,
+        }
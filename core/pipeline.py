@@ -0,0 +1,158 @@
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameQueue:
+    """
+    คิวขนาดจำกัดแบบ latest-frame-wins: เมื่อคิวเต็ม รายการที่เก่าที่สุดจะถูกทิ้ง
+    ผู้ใช้จึงได้เฟรมล่าสุดเสมอ ไม่ต้องรอเฟรมเก่าที่ค้างในคิว
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = collections.deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """คืนรายการถัดไป หรือ None เมื่อหมดเวลา"""
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def get_nowait(self):
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class PipelineResult:
+    __slots__ = ("frame", "captured_at", "processed_at", "index")
+
+    def __init__(self, frame, captured_at, processed_at, index):
+        self.frame = frame
+        self.captured_at = captured_at
+        self.processed_at = processed_at
+        self.index = index
+
+
+class FramePipeline:
+    """
+    Pipeline 3 ขั้น: capture thread -> inference thread -> ผู้แสดงผล (เช่น Tk main loop)
+    - capture thread อ่านเฟรมจาก cap ตลอดเวลา เพื่อไม่ให้ buffer ของกล้องค้างเฟรมเก่า
+    - inference thread หยิบเฟรมล่าสุดไปเรียก process_fn(frame)
+    - ผู้แสดงผลเรียก get_result() เพื่อรับเฟรมที่ประมวลผลเสร็จแล้วล่าสุด (ไม่ block)
+    exception จาก process_fn ถูก log และนับใน stats()["errors"] แล้วทำเฟรมถัดไปต่อ (thread ไม่ตาย)
+    """
+
+    LATENCY_WINDOW = 60
+
+    def __init__(self, cap, process_fn, queue_size=1):
+        self.cap = cap
+        self.process_fn = process_fn
+        self._frames = LatestFrameQueue(queue_size)
+        self._results = LatestFrameQueue(1)
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.captured = 0
+        self.processed = 0
+        self.displayed = 0
+        self.read_failures = 0
+        self.errors = 0
+        self._consecutive_errors = 0
+        self._latencies = collections.deque(maxlen=self.LATENCY_WINDOW)
+        self._inference_times = collections.deque(maxlen=self.LATENCY_WINDOW)
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        """หยุดทุก thread (ต้องเรียกก่อน cap.release())"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            self.captured += 1
+            self._frames.put((frame, time.perf_counter(), self.captured))
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            item = self._frames.get(timeout=0.1)
+            if item is None:
+                continue
+            frame, captured_at, index = item
+            start = time.perf_counter()
+            try:
+                processed = self.process_fn(frame)
+            except Exception:
+                # log traceback เฉพาะครั้งแรกของความผิดพลาดที่เกิดติดกัน ไม่ให้ log ท่วมทุกเฟรม
+                if self._consecutive_errors == 0:
+                    logger.exception("process_fn failed on frame %d", index)
+                self._consecutive_errors += 1
+                self.errors += 1
+                continue
+            if self._consecutive_errors:
+                logger.info("process_fn recovered after %d failed frames", self._consecutive_errors)
+                self._consecutive_errors = 0
+            now = time.perf_counter()
+            self._inference_times.append(now - start)
+            self.processed += 1
+            self._results.put(PipelineResult(processed, captured_at, now, index))
+
+    def get_result(self):
+        """คืน PipelineResult ล่าสุดที่ยังไม่ได้แสดง หรือ None (ไม่ block)"""
+        result = self._results.get_nowait()
+        if result is not None:
+            self.displayed += 1
+            self._latencies.append(time.perf_counter() - result.captured_at)
+        return result
+
+    def stats(self):
+        """ตัวนับสำหรับแสดงผล: เฟรมที่ถูกทิ้ง และ latency เฉลี่ย (ms) จากการจับภาพถึงการแสดงผล"""
+        latency = sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+        inference = sum(self._inference_times) / len(self._inference_times) if self._inference_times else 0.0
+        return {
+            "captured": self.captured,
+            "processed": self.processed,
+            "displayed": self.displayed,
+            "dropped_capture": self._frames.dropped,
+            "dropped_display": self._results.dropped,
+            "errors": self.errors,
+            "latency_ms": latency * 1000.0,
+            "inference_ms": inference * 1000.0,
+        }
@@ -0,0 +1,100 @@
+import collections
+import threading
+import time
+
+import cv2
+
+# ค่าเริ่มต้นของ cache ผลจดจำ
+DEFAULT_MAX_ENTRIES = 4096    # ~350 ไบต์ต่อรายการ (เก็บภาพย่อ 16x16 และผล)
+DEFAULT_MAX_AGE = 300.0       # วินาที ผลที่เก่ากว่านี้ถือว่าหมดอายุ
+FINGERPRINT_SIZE = (16, 16)
+
+
+def face_fingerprint(face):
+    """
+    ภาพย่อ 16x16 (INTER_AREA) ของใบหน้า 200x200 ที่ normalize แล้ว คืนเป็น bytes
+    การเฉลี่ยพื้นที่ 12x12 พิกเซลต่อจุดลบ noise ของ sensor ทิ้ง ใบหน้าเดิมที่นิ่งอยู่จึงได้ภาพย่อแทบเท่าเดิมทุกเฟรม
+    """
+    return cv2.resize(face, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA).tobytes()
+
+
+class RecognitionCache:
+    """
+    LRU cache ของผล LBPH (label, distance) ต่อใบหน้า key คือ fingerprint ของใบหน้าที่ normalize แล้ว
+    ร่วมกับ version ของโมเดลและวิธีจับคู่ (method) เก็บผลดิบก่อนเทียบ threshold จึงใช้ได้กับทุก threshold
+    - เจอเฉพาะเมื่อภาพย่อตรงกันทุกจุด (ไม่เทียบแบบใกล้เคียง จึงไม่คืนผลของใบหน้าอื่นที่แค่คล้ายกัน)
+    - ถูกล้างทั้งหมดเมื่อ version ของโมเดลเปลี่ยน (เทรนใหม่/hot-reload)
+    - เกิน max_entries จะลบรายการที่ใช้ล่าสุดนานที่สุด และรายการที่อายุเกิน max_age จะไม่ถูกใช้
+    ใช้ร่วมกันหลาย thread ได้
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = collections.OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted_size = 0
+        self.evicted_age = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(face, method=None):
+        """method แยกผลของวิธีจับคู่ที่ให้ระยะต่างกันเล็กน้อย (cv2 predict / engine / IVF แต่ละ nprobe)"""
+        return face_fingerprint(face), method
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """คืน (label_id, distance) ที่เคยคำนวณไว้ หรือ None"""
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] > self.max_age:
+                del self._entries[key]
+                self.evicted_age += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, version, label_id, distance):
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (label_id, distance, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted_size += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evicted_size": self.evicted_size,
+            "evicted_age": self.evicted_age,
+            "invalidations": self.invalidations,
+        }
@@ -1,82 +1,233 @@
 import cv2
+import logging
 import pickle
 import os
 import sys
+import threading
+import weakref
 import numpy as np
 
+from core.frame_context import FrameContext
+from core.instrumentation import stage
+from core.lbph_binary import BinaryLBPHRecognizer, LBPHFormatError, load_binary
+from core.lbph_engine import LBPHMatrixEngine
+from core.lbph_index import IVFIndex, default_index_path
+from core.recognition_cache import RecognitionCache
+from core.registry import LazyModel
+
+logger = logging.getLogger(__name__)
+
 # --- การจัดการพาธโมเดล ---
 CORE_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(CORE_DIR)
 MODEL_PATH = os.path.join(BASE_DIR, "models", "lbph_model.yml")
 NAMES_PATH = os.path.join(BASE_DIR, "models", "lbph_names.pickle")
+# โมเดลแบบ binary (core.lbph_binary) โหลดผ่าน mmap ใช้แทน yml/pickle เมื่อใหม่กว่าหรือเท่ากัน
+BINARY_MODEL_PATH = os.path.join(BASE_DIR, "models", "lbph_model.lbph")
+INDEX_PATH = default_index_path(MODEL_PATH)
+
+DEFAULT_CONFIDENCE_THRESHOLD = 90
+FACE_SIZE = (200, 200)
+# cache ผลจดจำต่อใบหน้า (ภาพเดิมที่อัปโหลดซ้ำ / ใบหน้านิ่งหน้ากล้อง) ล้างเองเมื่อโมเดลเปลี่ยน
+USE_RECOGNITION_CACHE = True
+recognition_cache = RecognitionCache()
+
+
+def _binary_is_current():
+    if not os.path.exists(BINARY_MODEL_PATH):
+        return False
+    return not os.path.exists(MODEL_PATH) or os.path.getmtime(BINARY_MODEL_PATH) >= os.path.getmtime(MODEL_PATH)
+
+
+def load_lbph():
+    """โหลดโมเดล LBPH และ name map คืน (recognizer, id_to_name_map) หรือ (None, {}) หากยังไม่ได้เทรน"""
+    if _binary_is_current():
+        try:
+            engine, id_to_name_map = load_binary(BINARY_MODEL_PATH)
+            logger.info("Loaded binary LBPH model: %d samples, %d labels", len(engine), len(id_to_name_map))
+            return BinaryLBPHRecognizer(engine), id_to_name_map
+        except (LBPHFormatError, OSError) as e:
+            print(f"[Warning] โหลดโมเดล binary ไม่ได้ จะใช้ yml แทน: {e}", file=sys.stderr)
+
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(NAMES_PATH):
+        print("-" * 50, file=sys.stderr)
+        print(f"[ERROR] ไม่พบโมเดล LBPH ที่คาดหวัง:", file=sys.stderr)
+        print(f"  > Model: {MODEL_PATH}", file=sys.stderr)
+        print(f"  > Names: {NAMES_PATH}", file=sys.stderr)
+        print("กรุณารัน train_model.py ก่อน!", file=sys.stderr)
+        print("-" * 50, file=sys.stderr)
+        return None, {}
 
-if not os.path.exists(MODEL_PATH) or not os.path.exists(NAMES_PATH):
-    print("-" * 50, file=sys.stderr)
-    print(f"[ERROR] ไม่พบโมเดล LBPH ที่คาดหวัง:", file=sys.stderr)
-    print(f"  > Model: {MODEL_PATH}", file=sys.stderr)
-    print(f"  > Names: {NAMES_PATH}", file=sys.stderr)
-    print("กรุณารัน train_model.py ก่อน!", file=sys.stderr)
-    print("-" * 50, file=sys.stderr)
-    recognizer = None
-    id_to_name_map = {}
-else:
-    print("[INFO] กำลังโหลดโมเดล LBPH...")
     recognizer = cv2.face.LBPHFaceRecognizer_create()
     recognizer.read(MODEL_PATH)
 
     with open(NAMES_PATH, 'rb') as f:
         id_to_name_map = pickle.load(f)
 
-    print("[INFO] โหลดโมเดล LBPH สำเร็จ")
-    print(f"[INFO] Loaded {len(id_to_name_map)} labels")
+    logger.info("Loaded %d LBPH labels", len(id_to_name_map))
+    return recognizer, id_to_name_map
 
 
-DEFAULT_CONFIDENCE_THRESHOLD = 90
+def _warm_up(model):
+    recognizer, _ = model
+    if recognizer is not None:
+        recognizer.predict(np.zeros(FACE_SIZE, dtype=np.uint8))
+
+
+def new_lbph_model(name="LBPH model"):
+    """
+    LazyModel ของ LBPH ตัวใหม่ที่โหลด recognizer ของตัวเอง (แยกจาก lbph_model)
+    โหลดเมื่อถูกใช้ครั้งแรก และโหลดใหม่อัตโนมัติเมื่อ train_model.py เขียนไฟล์โมเดลใหม่
+    """
+    return LazyModel(name, load_lbph, warmup=_warm_up, watch_paths=[MODEL_PATH, NAMES_PATH, BINARY_MODEL_PATH])
+
+
+lbph_model = new_lbph_model()
+
+
+def get_lbph_model():
+    """คืน (recognizer, id_to_name_map) ของโมเดลปัจจุบัน"""
+    return lbph_model.get()
+
 
+# engine แบบ NumPy และดัชนีค้นหา สร้างจากโมเดลเวอร์ชันปัจจุบันเมื่อถูกเรียกใช้ครั้งแรก
+# แยกตาม LazyModel (เช่น worker ของ core.inference_pool มีโมเดลและ engine ของตัวเอง)
+_derived_lock = threading.Lock()
+_derived_by_model = weakref.WeakKeyDictionary()
 
-def recognize_faces_lbph(frame, face_boxes, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+
+def _derived_for_current_model(model=None):
+    model = lbph_model if model is None else model
+    (recognizer, id_to_name_map), version = model.get_versioned()
+    with _derived_lock:
+        derived = _derived_by_model.get(model)
+        if derived is None or derived["version"] != version:
+            if isinstance(recognizer, BinaryLBPHRecognizer):
+                # โมเดล binary มี engine (memmap) อยู่แล้ว
+                engine = recognizer.engine
+            else:
+                engine = LBPHMatrixEngine.from_recognizer(recognizer) if recognizer is not None else None
+            derived = {"version": version, "names": id_to_name_map, "engine": engine,
+                       "index": None, "index_loaded": False}
+            _derived_by_model[model] = derived
+        return derived
+
+
+def _search_index(derived):
+    with _derived_lock:
+        if not derived["index_loaded"]:
+            derived["index_loaded"] = True
+            if derived["engine"] is not None and os.path.exists(INDEX_PATH):
+                derived["index"] = IVFIndex.load(INDEX_PATH, derived["engine"])
+        return derived["index"]
+
+
+def get_matrix_engine(model=None):
+    """คืน LBPHMatrixEngine ที่สร้างจากโมเดลที่โหลดอยู่ (None หากไม่มีโมเดล)"""
+    return _derived_for_current_model(model)["engine"]
+
+
+def get_search_index(model=None):
+    """คืน IVFIndex ที่สร้างไว้ตอนเทรน (models/lbph_model_index.npz) หรือ None หากไม่มี/ไม่ตรงกับโมเดล"""
+    return _search_index(_derived_for_current_model(model))
+
+
+def __getattr__(name):
+    # รองรับโค้ดเดิมที่อ้างถึง recognizer.recognizer / recognizer.id_to_name_map
+    if name == "recognizer":
+        return get_lbph_model()[0]
+    if name == "id_to_name_map":
+        return get_lbph_model()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _prepare_faces(frame, face_boxes):
+    """
+    คืนใบหน้า 200x200 ที่ equalize แล้วของทุกกล่อง (None สำหรับ ROI ว่าง)
+    ถ้า frame เป็น FrameContext จะแปลง grayscale เฉพาะ ROI และใช้ buffer ของ context
+    """
+    if isinstance(frame, FrameContext):
+        with stage("face_resize"):
+            return [frame.face(box) for box in face_boxes]
+
+    with stage("gray"):
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return [_prepare_face(gray_frame, box) for box in face_boxes]
+
+
+def _prepare_face(gray_frame, box):
+    """Crop, resize และ equalize ใบหน้า คืน None หาก ROI ว่าง"""
+    (x, y, w, h) = box
+    # ตรวจสอบ boundary
+    x1 = max(x, 0)
+    y1 = max(y, 0)
+    x2 = min(x + w, gray_frame.shape[1])
+    y2 = min(y + h, gray_frame.shape[0])
+
+    face_roi = gray_frame[y1:y2, x1:x2]
+    if face_roi.size == 0:
+        return None
+
+    # Resize และ Normalize histogram
+    with stage("face_resize"):
+        face_resized = cv2.resize(face_roi, FACE_SIZE)
+    with stage("equalize"):
+        return cv2.equalizeHist(face_resized)
+
+
+def recognize_faces_lbph(frame, face_boxes, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                         nprobe=None, model=None, cache=None):
     """
     จดจำใบหน้าโดยใช้ LBPH
-    - frame: BGR image (OpenCV)
+    - frame: BGR image (OpenCV) หรือ FrameContext
     - face_boxes: list of (x,y,w,h)
     - confidence_threshold: ค่า threshold เพื่อพิจารณาว่าแมทหรือไม่
+    - nprobe: ถ้ากำหนด จะค้นหาผ่านดัชนี IVF เฉพาะ nprobe กลุ่ม (มาก = แม่นขึ้น, น้อย = เร็วขึ้น)
+    - model / cache: LazyModel และ RecognitionCache ที่ใช้แทนตัวกลางของ module
+      (เช่น worker ของ core.inference_pool ที่มี recognizer ของตัวเอง)
     คืนค่า: (names_list, confidences_list)
     """
+    if nprobe is not None and get_search_index(model) is not None:
+        return recognize_faces_lbph_batch(frame, face_boxes, confidence_threshold, nprobe=nprobe,
+                                          model=model, cache=cache)
+
     names = []
     confidences = []
 
+    model = lbph_model if model is None else model
+    cache = recognition_cache if cache is None else cache
+    (recognizer, id_to_name_map), version = model.get_versioned()
     if recognizer is None:
         return ["Unknown"] * len(face_boxes), [0.0] * len(face_boxes)
 
     if frame is None or len(frame.shape) < 2:
         return ["Error"] * len(face_boxes), [0.0] * len(face_boxes)
 
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-    for (x, y, w, h) in face_boxes:
-        # ตรวจสอบ boundary
-        x1 = max(x, 0)
-        y1 = max(y, 0)
-        x2 = min(x + w, gray_frame.shape[1])
-        y2 = min(y + h, gray_frame.shape[0])
-
-        face_roi = gray_frame[y1:y2, x1:x2]
-
-        if face_roi.size == 0:
+    for face_norm in _prepare_faces(frame, face_boxes):
+        if face_norm is None:
             names.append("Error_ROI")
             confidences.append(999.0)
             continue
 
         try:
-            # Resize และ Normalize histogram
-            face_resized = cv2.resize(face_roi, (200, 200))
-            face_norm = cv2.equalizeHist(face_resized)
-
-            label_id, confidence = recognizer.predict(face_norm)
+            key = None
+            cached = None
+            if USE_RECOGNITION_CACHE:
+                with stage("cache"):
+                    key = cache.key(face_norm, "predict")
+                    cached = cache.get(key, version)
+            if cached is not None:
+                label_id, confidence = cached
+            else:
+                with stage("predict"):
+                    label_id, confidence = recognizer.predict(face_norm)
+                if key is not None:
+                    cache.put(key, version, label_id, confidence)
 
-            # Debug log
-            reason = "Matched" if confidence < confidence_threshold else "Unknown"
-            print(f"[DEBUG][LBPH] ID={label_id}, Conf={confidence:.2f}, Result={reason}")
+            # Debug log (ปิดเป็นค่าเริ่มต้น ตรวจระดับก่อนเพื่อไม่ต้อง format ข้อความทุกเฟรม)
+            if logger.isEnabledFor(logging.DEBUG):
+                reason = "Matched" if confidence < confidence_threshold else "Unknown"
+                logger.debug("LBPH ID=%s, Conf=%.2f, Result=%s", label_id, confidence, reason)
 
             # ตัดสินว่าเป็นใคร
             if confidence < confidence_threshold:
@@ -97,3 +248,105 @@ def recognize_faces_lbph(frame, face_boxes, confidence_threshold=DEFAULT_CONFIDE
             confidences.append(999.0)
 
     return names, confidences
+
+
+def recognize_faces_lbph_batch(frame, face_boxes, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                               nprobe=None, model=None, cache=None):
+    """
+    เหมือน recognize_faces_lbph แต่ใช้ LBPHMatrixEngine (NumPy) จดจำทุกใบหน้าในเฟรมพร้อมกัน
+    ให้ label และระยะเท่ากับ recognizer.predict (หรือค้นหาผ่านดัชนี IVF เมื่อกำหนด nprobe)
+    คืนค่า: (names_list, confidences_list)
+    """
+    derived = _derived_for_current_model(model)
+    if derived["engine"] is None:
+        return ["Unknown"] * len(face_boxes), [0.0] * len(face_boxes)
+
+    if frame is None or len(frame.shape) < 2:
+        return ["Error"] * len(face_boxes), [0.0] * len(face_boxes)
+
+    return _match_faces(_prepare_faces(frame, face_boxes), derived, confidence_threshold, nprobe, cache)
+
+
+def recognize_faces_lbph_multi(frames, face_boxes_list, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                               nprobe=None, model=None, cache=None):
+    """
+    จดจำใบหน้าจากหลายเฟรมด้วยการคำนวณ histogram และระยะเพียงครั้งเดียว
+    - frames: list ของภาพ BGR หรือ FrameContext
+    - face_boxes_list: list ของรายการกล่องของแต่ละเฟรม (ยาวเท่า frames)
+    - model / cache: เหมือน recognize_faces_lbph
+    คืนค่า: list ของ (names_list, confidences_list) เรียงตามเฟรม
+    """
+    derived = _derived_for_current_model(model)
+    if derived["engine"] is None:
+        return [(["Unknown"] * len(boxes), [0.0] * len(boxes)) for boxes in face_boxes_list]
+
+    faces = []
+    counts = []
+    for frame, boxes in zip(frames, face_boxes_list):
+        if frame is None or len(frame.shape) < 2:
+            counts.append(None)
+            continue
+        prepared = _prepare_faces(frame, boxes) if boxes else []
+        faces.extend(prepared)
+        counts.append(len(prepared))
+
+    names, confidences = _match_faces(faces, derived, confidence_threshold, nprobe, cache)
+    results = []
+    start = 0
+    for boxes, count in zip(face_boxes_list, counts):
+        if count is None:
+            results.append((["Error"] * len(boxes), [0.0] * len(boxes)))
+            continue
+        results.append((names[start:start + count], confidences[start:start + count]))
+        start += count
+    return results
+
+
+def _match_faces(faces, derived, confidence_threshold, nprobe, cache=None):
+    """จับคู่ใบหน้าที่เตรียมแล้ว (None = ROI ว่าง) กับ gallery ในครั้งเดียว คืน (names, confidences)"""
+    engine = derived["engine"]
+    id_to_name_map = derived["names"]
+    version = derived["version"]
+    cache = recognition_cache if cache is None else cache
+    valid = [face for face in faces if face is not None]
+    index = _search_index(derived) if nprobe is not None else None
+
+    matches = [None] * len(valid)
+    keys = [None] * len(valid)
+    if USE_RECOGNITION_CACHE:
+        with stage("cache"):
+            # ผลจาก IVF เป็นค่าประมาณ จึงแยก key ตาม nprobe
+            method = ("ivf", nprobe) if index is not None else "engine"
+            keys = [cache.key(face, method) for face in valid]
+            matches = [cache.get(key, version) for key in keys]
+    pending = [i for i, match in enumerate(matches) if match is None]
+
+    if pending:
+        pending_faces = [valid[i] for i in pending]
+        with stage("predict"):
+            if index is not None:
+                label_ids, distances = index.search(engine.compute_histograms(pending_faces), nprobe)
+            else:
+                label_ids, distances = engine.predict_batch(pending_faces)
+        for i, label_id, distance in zip(pending, label_ids.tolist(), distances.tolist()):
+            matches[i] = (label_id, distance)
+            if keys[i] is not None:
+                cache.put(keys[i], version, label_id, distance)
+
+    names = []
+    confidences = []
+    results = iter(matches)
+    for face in faces:
+        if face is None:
+            names.append("Error_ROI")
+            confidences.append(999.0)
+            continue
+
+        label_id, confidence = next(results)
+        if confidence < confidence_threshold:
+            names.append(id_to_name_map.get(label_id, "Unknown"))
+        else:
+            names.append("Unknown")
+        confidences.append(confidence)
+
+    return names, confidences
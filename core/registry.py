@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ตรวจ mtime ของไฟล์โมเดลไม่เกินทุก ๆ กี่วินาที (ลดการเรียก os.stat ใน hot path)
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+def _file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class LazyModel:
+    """
+    ตัวโหลดโมเดลแบบ lazy และ thread-safe
+    - loader(): คืนค่าโมเดล (โหลดครั้งแรกเมื่อเรียก get())
+    - warmup(model): เรียกหลังโหลดเสร็จ เช่น forward pass เปล่า เพื่อไม่ให้เฟรมแรกช้า
+    - watch_paths: ถ้ากำหนด จะโหลดใหม่อัตโนมัติเมื่อไฟล์เหล่านี้เปลี่ยน (hot-reload)
+    version จะเพิ่มขึ้นทุกครั้งที่โหลดสำเร็จ ใช้ตรวจว่าสิ่งที่สร้างจากโมเดล (cache, engine) ยังใช้ได้หรือไม่
+    """
+
+    _UNLOADED = object()
+
+    def __init__(self, name, loader, warmup=None, watch_paths=None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.watch_paths = list(watch_paths or [])
+        self.version = 0
+        self._value = self._UNLOADED
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def loaded(self):
+        return self._value is not self._UNLOADED
+
+    def get(self):
+        value = self._value
+        if value is self._UNLOADED:
+            return self._load()
+        if self.watch_paths:
+            now = time.monotonic()
+            if now - self._last_check >= RELOAD_CHECK_INTERVAL:
+                self._last_check = now
+                if _file_signature(self.watch_paths) != self._signature:
+                    return self._load(reload=True)
+        return value
+
+    def get_versioned(self):
+        """คืน (model, version) ที่เป็นคู่เดียวกันเสมอ (hot reload ระหว่างอ่านสองค่าจะไม่ทำให้ได้ version ใหม่คู่กับโมเดลเดิม)"""
+        with self._lock:
+            return self.get(), self.version
+
+    def _load(self, reload=False, force=False):
+        with self._lock:
+            signature = _file_signature(self.watch_paths)
+            # thread อื่นอาจโหลดเสร็จไปแล้วระหว่างรอ lock (force: โหลดใหม่แม้ไฟล์ไม่เปลี่ยน)
+            if self.loaded and not force and (not reload or signature == self._signature):
+                return self._value
+
+            start = time.perf_counter()
+            logger.info("%s %s...", "Reloading" if reload else "Loading", self.name)
+            try:
+                value = self.loader()
+            except Exception:
+                logger.exception("Failed to load %s", self.name)
+                if self.loaded:
+                    # โหลดใหม่ไม่สำเร็จ (เช่นไฟล์ยังเขียนไม่เสร็จ): ใช้โมเดลเดิมต่อไป
+                    return self._value
+                raise
+
+            if self.warmup is not None and value is not None:
+                try:
+                    self.warmup(value)
+                except Exception:
+                    logger.exception("Warm-up failed for %s", self.name)
+
+            self._value = value
+            self._signature = signature
+            self._last_check = time.monotonic()
+            self.version += 1
+            logger.info("%s ready in %.1f ms (version %d)", self.name,
+                        (time.perf_counter() - start) * 1000.0, self.version)
+            return value
+
+    def set(self, value):
+        """แทนที่โมเดลด้วยค่าที่เตรียมไว้แล้ว (เช่นโมเดลสังเคราะห์ใน benchmark) และปิด hot-reload"""
+        with self._lock:
+            self.watch_paths = []
+            self._value = value
+            self._signature = ()
+            self.version += 1
+
+    def reload(self, force=True):
+        """
+        โหลดใหม่ทันที
+        force=False: โหลดใหม่เฉพาะเมื่อไฟล์ใน watch_paths เปลี่ยน (โมเดลที่ไม่มี watch_paths จะไม่ถูกโหลดใหม่)
+        """
+        return self._load(reload=True, force=force) if self.loaded else self._load()
+
+
+def preload_models(*models, background=True):
+    """
+    โหลด (และ warm-up) โมเดลล่วงหน้า
+    background=True จะโหลดใน daemon thread แล้วคืน thread นั้นทันที
+    """
+    def _run():
+        for model in models:
+            try:
+                if model.get() is None:
+                    # loader คืน None เมื่อไม่พบไฟล์โมเดล (เช่นไม่มี caffemodel)
+                    logger.warning("model %r is not available after preload", model.name)
+            except Exception:
+                # ไม่ให้โมเดลหนึ่งที่โหลดไม่ได้หยุดการโหลดตัวอื่น แต่ต้องบอกว่าตัวไหนเสีย
+                logger.exception("preloading model %r failed", model.name)
+
+    if not background:
+        _run()
+        return None
+    thread = threading.Thread(target=_run, name="model-preload", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,407 @@
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+DEFAULT_SLOTS_PER_WORKER = 2
+# เวลารอสูงสุดต่อครั้งตอนรอผล/slot ว่าง (ใช้ตรวจ stop และ process ที่ตายไปแล้ว)
+POLL_INTERVAL = 0.2
+JOIN_TIMEOUT = 5.0
+# สถานะของ worker ใน SharedMemoryPipeline._inflight (ค่า >= 0 คือ seq ของเฟรมที่กำลังประมวลผล)
+WORKER_IDLE = -1
+WORKER_EXITED = -2
+
+
+class SharedFrameRing:
+    """
+    ring ของ slot ขนาดคงที่ใน multiprocessing.shared_memory (หนึ่ง slot = หนึ่งเฟรม BGR ขนาด slot_shape)
+    process อื่นเปิด ring เดิมด้วย SharedFrameRing.attach(ring.spec()) แล้วอ่าน/เขียนเฟรมแบบไม่ต้อง copy
+    ring ไม่ได้จัดการว่า slot ไหนว่าง ผู้ใช้ต้องส่งเลข slot ต่อกันเอง (ดู SharedMemoryPipeline)
+    """
+
+    def __init__(self, shm, num_slots, slot_shape, owner):
+        self.shm = shm
+        self.num_slots = num_slots
+        self.slot_shape = tuple(slot_shape)
+        self.owner = owner
+        self._slots = np.ndarray((num_slots,) + self.slot_shape, dtype=np.uint8, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, num_slots, slot_shape):
+        size = int(num_slots * np.prod(slot_shape))
+        return cls(shared_memory.SharedMemory(create=True, size=size), num_slots, slot_shape, owner=True)
+
+    @classmethod
+    def attach(cls, spec):
+        # process ลูกที่สร้างด้วย multiprocessing ใช้ resource tracker ตัวเดียวกับเจ้าของ
+        # การ attach จึงไม่ทำให้ segment ถูกลบเมื่อ process ลูกจบ (เจ้าของเป็นผู้ unlink เท่านั้น)
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        return cls(shm, spec["num_slots"], spec["slot_shape"], owner=False)
+
+    def spec(self):
+        """ข้อมูลที่ process อื่นใช้เปิด ring เดิม (pickle ได้ ขนาดเล็ก)"""
+        return {"name": self.shm.name, "num_slots": self.num_slots, "slot_shape": self.slot_shape}
+
+    def slot(self, index):
+        """ภาพเต็ม slot (ใช้เป็น dst ของ cap.read/cv2.resize)"""
+        return self._slots[index]
+
+    def view(self, index, shape):
+        """ภาพขนาด shape ใน slot index โดยไม่ copy (ใช้ได้จนกว่า slot จะถูกคืนและเขียนทับ)"""
+        size = int(np.prod(shape))
+        return self._slots[index].reshape(-1)[:size].reshape(shape)
+
+    def write(self, index, frame):
+        """copy เฟรมลง slot (ย่อลงถ้าใหญ่กว่า slot) คืน shape ที่เก็บจริง"""
+        h, w = frame.shape[:2]
+        slot_h, slot_w = self.slot_shape[:2]
+        if frame.ndim != 3 or frame.shape[2] != self.slot_shape[2]:
+            raise ValueError(f"frame shape {frame.shape} ไม่ตรงกับ slot {self.slot_shape}")
+        if h * w <= slot_h * slot_w:
+            np.copyto(self.view(index, frame.shape), frame)
+            return frame.shape
+        scale = min(slot_w / w, slot_h / h)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        shape = (size[1], size[0], frame.shape[2])
+        cv2.resize(frame, size, dst=self.view(index, shape), interpolation=cv2.INTER_AREA)
+        return shape
+
+    def close(self):
+        self._slots = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # ยังมีภาพที่อ้างถึง slot อยู่ (เช่น RingResult.frame ที่ผู้เรียกเก็บไว้) หน่วยความจำจะถูกคืนเมื่อภาพนั้นถูกทิ้ง
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def probe_frame_shape(source):
+    """ขนาด (h, w, 3) ของเฟรมจากกล้อง/วิดีโอ (อ่านจาก property ถ้ามี ไม่งั้นอ่านเฟรมแรก) หรือ None"""
+    cap = cv2.VideoCapture(source)
+    try:
+        if not cap.isOpened():
+            return None
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if w > 0 and h > 0:
+            return (h, w, 3)
+        ret, frame = cap.read()
+        return frame.shape if ret else None
+    finally:
+        cap.release()
+
+
+# --- ฟังก์ชันที่รันใน process ลูก (ต้องอยู่ระดับ module เพื่อให้ใช้กับ spawn บน Windows ได้) ---
+
+def load_recognition_models():
+    """initializer เริ่มต้นของ worker: โหลดและ warm-up detector/LBPH ก่อนรับเฟรมแรก"""
+    from core.detector import detector_model
+    from core.recognizer import lbph_model
+    from core.registry import preload_models
+    preload_models(detector_model, lbph_model, background=False)
+
+
+def detect_and_recognize(frame):
+    """process_fn เริ่มต้น: คืน [((x, y, w, h), det_confidence, name, distance), ...] (ไม่อ้างถึงภาพใน slot)"""
+    from core.detector import detect_faces
+    from core.recognizer import recognize_faces_lbph
+    faces = detect_faces(frame)
+    if not faces:
+        return []
+    names, distances = recognize_faces_lbph(frame, [box for (box, conf) in faces])
+    return [(tuple(int(v) for v in box), float(conf), name, float(distance))
+            for (box, conf), name, distance in zip(faces, names, distances)]
+
+
+def _producer_main(source, spec, free_slots, ready, num_workers, every, drop_when_full, stop, counters):
+    ring = SharedFrameRing.attach(spec)
+    cap = cv2.VideoCapture(source)
+    seq = 0
+    index = 0
+    try:
+        if not cap.isOpened():
+            print(f"[ERROR] เปิด {source} ไม่ได้", file=sys.stderr)
+            return
+        while not stop.is_set():
+            if not cap.grab():
+                break
+            index += 1
+            if (index - 1) % every:
+                continue
+
+            slot = None
+            if drop_when_full:
+                # กล้อง: ไม่มี slot ว่าง = worker ตามไม่ทัน ทิ้งเฟรมนี้ (grab แล้วแต่ไม่ decode)
+                try:
+                    slot = free_slots.get_nowait()
+                except queue.Empty:
+                    counters["dropped"].value += 1
+                    continue
+            else:
+                # ไฟล์: รอจนกว่าจะมี slot ว่าง (backpressure ไปถึงการ decode)
+                while slot is None and not stop.is_set():
+                    try:
+                        slot = free_slots.get(timeout=POLL_INTERVAL)
+                    except queue.Empty:
+                        pass
+                if slot is None:
+                    break
+
+            # decode ลง slot โดยตรงถ้าขนาดตรงกัน ไม่งั้น copy/ย่อ
+            dst = ring.slot(slot)
+            ret, frame = cap.retrieve(dst)
+            if not ret:
+                free_slots.put(slot)
+                break
+            if np.shares_memory(frame, dst) and frame.shape == dst.shape:
+                shape = frame.shape
+            else:
+                shape = ring.write(slot, frame)
+            ready.put((seq, index - 1, slot, shape, time.time()))
+            seq += 1
+            counters["produced"].value += 1
+    finally:
+        cap.release()
+        for _ in range(num_workers):
+            ready.put(None)
+        ring.close()
+
+
+def _worker_main(worker_id, spec, ready, results, process_fn, initializer, threads, stop, inflight, inflight_slots):
+    # แบ่ง core ให้ worker แต่ละตัว ไม่ให้ OpenCV เปิด thread ซ้อนกันเกินจำนวน core
+    from core.detector_backends import set_thread_budget
+    set_thread_budget(threads)
+    ring = SharedFrameRing.attach(spec)
+    try:
+        if initializer is not None:
+            initializer()
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            seq, frame_index, slot, shape, captured_at = item
+            # บอก process หลักว่าเฟรมไหนอยู่กับ worker นี้ ถ้า worker ตาย (segfault/OOM) จะได้ข้ามเฟรมนั้นและคืน slot
+            inflight_slots[worker_id] = slot
+            inflight[worker_id] = seq
+            if stop.is_set():
+                # กำลังปิด: ไม่ประมวลผลเฟรมที่ค้างในคิว แค่รอ sentinel
+                inflight[worker_id] = WORKER_IDLE
+                continue
+            try:
+                result = process_fn(ring.view(slot, shape))
+            except Exception as e:
+                print(f"[Warning] ประมวลผลเฟรม {frame_index} ไม่สำเร็จ: {e}", file=sys.stderr)
+                result = None
+            results.put((seq, frame_index, slot, shape, captured_at, result))
+            inflight[worker_id] = WORKER_IDLE
+    finally:
+        inflight[worker_id] = WORKER_EXITED
+        results.put(None)
+        ring.close()
+
+
+class RingResult:
+    __slots__ = ("seq", "index", "frame", "captured_at", "result")
+
+    def __init__(self, seq, index, frame, captured_at, result):
+        self.seq = seq
+        self.index = index
+        self.frame = frame
+        self.captured_at = captured_at
+        self.result = result
+
+
+class SharedMemoryPipeline:
+    """
+    decoder หนึ่ง process -> inference worker N process ผ่าน SharedFrameRing (ไม่ pickle เฟรม)
+    - producer อ่านกล้อง/วิดีโอแล้ว decode ลง slot ว่างโดยตรง ส่งแค่ (seq, slot, shape) ให้ worker
+    - worker เรียก process_fn(frame) กับภาพใน slot (zero-copy) แล้วส่งผล (เล็ก) กลับทาง Queue
+    - results() คืนผลเรียงตามลำดับเฟรมเสมอ แม้ worker จะทำเสร็จไม่ตามลำดับ
+    slot ถูกคืนให้ producer หลังผู้เรียกรับผลของเฟรมนั้นไปแล้ว และขอผลถัดไป (RingResult.frame
+    จึงใช้ได้จนถึงตอนนั้น) เฟรมที่ค้างอยู่ในระบบจึงไม่เกิน num_slots:
+    วิดีโอ producer จะรอ (backpressure) ส่วนกล้อง (drop_when_full) จะทิ้งเฟรมใหม่แทน
+    process_fn/initializer ต้องเป็นฟังก์ชันระดับ module (pickle ได้) และ process_fn ต้องไม่คืนภาพที่อ้างถึง slot
+    """
+
+    def __init__(self, source, num_workers=2, process_fn=detect_and_recognize,
+                 initializer=load_recognition_models, num_slots=None, slot_shape=None,
+                 every=1, drop_when_full=None, threads_per_worker=None):
+        self.source = source
+        self.num_workers = max(1, int(num_workers))
+        self.process_fn = process_fn
+        self.initializer = initializer
+        self.num_slots = num_slots or self.num_workers * DEFAULT_SLOTS_PER_WORKER + 1
+        self.slot_shape = slot_shape
+        self.every = max(1, int(every))
+        # ค่าเริ่มต้น: กล้อง (index เป็น int) ทิ้งเฟรม, ไฟล์รอ slot ว่าง
+        self.drop_when_full = isinstance(source, int) if drop_when_full is None else drop_when_full
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+
+        self.ring = None
+        self._processes = []
+        self._held_slot = None
+        self._counters = None
+        self._first_result_at = None
+        self._last_result_at = None
+        self.delivered = 0
+        self.failed = 0
+        self.lost = 0
+
+    def start(self):
+        if self.slot_shape is None:
+            self.slot_shape = probe_frame_shape(self.source)
+            if self.slot_shape is None:
+                raise RuntimeError(f"เปิด {self.source} ไม่ได้")
+        self.ring = SharedFrameRing.create(self.num_slots, self.slot_shape)
+        spec = self.ring.spec()
+
+        self._free_slots = multiprocessing.Queue()
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+        # เฟรมที่รอ worker ไม่เกินจำนวน slot อยู่แล้ว (+ sentinel ของ worker แต่ละตัว)
+        self._ready = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._counters = {"produced": multiprocessing.Value("l", 0, lock=False),
+                          "dropped": multiprocessing.Value("l", 0, lock=False)}
+        self._inflight = multiprocessing.Array("l", [WORKER_IDLE] * self.num_workers, lock=False)
+        self._inflight_slots = multiprocessing.Array("l", [0] * self.num_workers, lock=False)
+
+        self._processes = [multiprocessing.Process(
+            target=_producer_main, name="shm-decoder", daemon=True,
+            args=(self.source, spec, self._free_slots, self._ready, self.num_workers, self.every,
+                  self.drop_when_full, self._stop, self._counters))]
+        for i in range(self.num_workers):
+            self._processes.append(multiprocessing.Process(
+                target=_worker_main, name=f"shm-worker-{i}", daemon=True,
+                args=(i, spec, self._ready, self._results, self.process_fn, self.initializer,
+                      self.threads_per_worker, self._stop, self._inflight, self._inflight_slots)))
+        for process in self._processes:
+            process.start()
+        return self
+
+    def _release_held(self):
+        if self._held_slot is not None:
+            self._free_slots.put(self._held_slot)
+            self._held_slot = None
+
+    def _reap_crashed_workers(self, crashed, lost):
+        """
+        worker ที่ตายโดยไม่ได้จบตามปกติ (segfault, ถูก OOM kill) จะไม่ส่งผลของเฟรมที่ถืออยู่และไม่ส่ง sentinel
+        บันทึก seq ของเฟรมนั้นใน lost (results() จะข้ามไป) และคืน slot ให้ producer คืนจำนวน worker ที่เพิ่งพบว่าตาย
+        """
+        found = 0
+        for i, process in enumerate(self._processes[1:]):
+            if i in crashed or process.is_alive() or self._inflight[i] == WORKER_EXITED:
+                continue
+            crashed.add(i)
+            found += 1
+            seq = self._inflight[i]
+            if seq >= 0:
+                lost.add(seq)
+                self._free_slots.put(self._inflight_slots[i])
+            print(f"[Warning] {process.name} หยุดทำงาน (exit code {process.exitcode})"
+                  + (f" ข้ามเฟรม seq {seq}" if seq >= 0 else ""), file=sys.stderr)
+        return found
+
+    def results(self):
+        """generator ของ RingResult เรียงตาม seq จนกว่า source จะหมด (หรือ stop())"""
+        pending = {}
+        lost = set()
+        crashed = set()
+        next_seq = 0
+        workers_alive = self.num_workers
+        last_check = time.monotonic()
+        while True:
+            if next_seq in lost:
+                lost.discard(next_seq)
+                next_seq += 1
+                self.lost += 1
+                continue
+            item = pending.pop(next_seq, None)
+            if item is None:
+                if workers_alive == 0:
+                    if not pending:
+                        break
+                    # ไม่มี worker เหลือ: เฟรมที่ยังขาดจะไม่มีวันมาถึง ข้ามไปเฟรมถัดไปที่มีผลแล้ว
+                    self.lost += min(pending) - next_seq
+                    next_seq = min(pending)
+                    continue
+                try:
+                    received = self._results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    received = False
+                if received is False or time.monotonic() - last_check >= POLL_INTERVAL:
+                    last_check = time.monotonic()
+                    workers_alive -= self._reap_crashed_workers(crashed, lost)
+                    if received is False and not any(p.is_alive() for p in self._processes[1:]):
+                        workers_alive = 0
+                if received is None:
+                    workers_alive -= 1
+                elif received is not False:
+                    pending[received[0]] = received
+                continue
+
+            self._release_held()
+            seq, frame_index, slot, shape, captured_at, result = item
+            self._held_slot = slot
+            next_seq += 1
+            self.delivered += 1
+            if result is None:
+                self.failed += 1
+            self._last_result_at = time.perf_counter()
+            if self._first_result_at is None:
+                self._first_result_at = self._last_result_at
+            yield RingResult(seq, frame_index, self.ring.view(slot, shape), captured_at, result)
+        self._release_held()
+
+    def stats(self):
+        # นับจากผลแรก ไม่รวมเวลาเปิด process และโหลดโมเดล
+        elapsed = self._last_result_at - self._first_result_at if self._first_result_at else 0.0
+        return {
+            "workers": self.num_workers,
+            "slots": self.num_slots,
+            "produced": self._counters["produced"].value if self._counters else 0,
+            "dropped": self._counters["dropped"].value if self._counters else 0,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "lost": self.lost,
+            "fps": (self.delivered - 1) / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def stop(self):
+        if not self._processes:
+            return
+        self._stop.set()
+        self._release_held()
+        # อ่านผลที่ค้างทิ้งไป ไม่งั้น worker ที่ยังส่งผลไม่หมดจะจบไม่ได้
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        while any(p.is_alive() for p in self._processes) and time.monotonic() < deadline:
+            try:
+                self._results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        for process in self._processes:
+            process.join(POLL_INTERVAL)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for q in (self._free_slots, self._ready, self._results):
+            q.cancel_join_thread()
+            q.close()
+        self._processes = []
+        self.ring.close()
+        self.ring = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,198 @@
+import cv2
+import numpy as np
+
+from core.frame_context import FrameContext
+
+# ค่าเริ่มต้นของ tracking layer
+DETECT_EVERY_N = 5          # รัน SSD ทุก N เฟรม
+RECOGNIZE_EVERY_N = 15      # รัน LBPH ซ้ำต่อ track ทุก N เฟรม
+IOU_MATCH_THRESHOLD = 0.3   # IoU ขั้นต่ำในการจับคู่กล่องจาก detector กับ track เดิม
+MIN_FLOW_QUALITY = 0.5      # สัดส่วนจุดที่ optical flow ตามได้ ต่ำกว่านี้จะบังคับตรวจจับใหม่
+MAX_MISSES = 1              # จำนวนครั้งที่ detector หา track ไม่เจอก่อนลบทิ้ง
+MAX_FLOW_POINTS = 20
+
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU ระหว่างทุกคู่ของกล่อง (x, y, w, h) คืน array (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def match_boxes(track_boxes, det_boxes, threshold=IOU_MATCH_THRESHOLD):
+    """จับคู่แบบ greedy ตาม IoU มากไปน้อย คืน list ของ (track_idx, det_idx)"""
+    if len(track_boxes) == 0 or len(det_boxes) == 0:
+        return []
+    iou = iou_matrix(track_boxes, det_boxes)
+    pairs = []
+    used_tracks, used_dets = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        t, d = np.unravel_index(flat, iou.shape)
+        if iou[t, d] < threshold:
+            break
+        if t in used_tracks or d in used_dets:
+            continue
+        used_tracks.add(t)
+        used_dets.add(d)
+        pairs.append((int(t), int(d)))
+    return pairs
+
+
+class Track:
+    _next_id = 0
+
+    def __init__(self, box, det_confidence):
+        self.id = Track._next_id
+        Track._next_id += 1
+        self.box = tuple(int(v) for v in box)
+        self.det_confidence = det_confidence
+        self.name = None
+        self.lbph_confidence = None
+        self.last_recognized = None
+        self.misses = 0
+        self.points = None
+
+
+class FaceTracker:
+    """
+    Tracking layer ระหว่าง detect_faces และ recognize_faces_lbph
+    - รัน detector ทุก detect_every เฟรม (หรือเร็วกว่านั้นเมื่อ optical flow ตามไม่ได้)
+    - เฟรมระหว่างนั้นเลื่อนกล่องด้วย Lucas-Kanade optical flow
+    - รัน recognizer ต่อ track เฉพาะเมื่อเป็น track ใหม่หรือครบ recognize_every เฟรม
+      นอกนั้นใช้ชื่อ/ค่า confidence ที่ cache ไว้
+    """
+
+    def __init__(self, detect_fn, recognize_fn, detect_every=DETECT_EVERY_N,
+                 recognize_every=RECOGNIZE_EVERY_N):
+        self.detect_fn = detect_fn
+        self.recognize_fn = recognize_fn
+        self.detect_every = max(1, detect_every)
+        self.recognize_every = max(1, recognize_every)
+        self.tracks = []
+        self.frame_index = 0
+        self._prev_gray = None
+        self._spare_gray = None
+        self._force_detect = True
+        self.detections_run = 0
+        self.recognitions_run = 0
+
+    def reset(self):
+        self.tracks = []
+        self.frame_index = 0
+        self._prev_gray = None
+        self._force_detect = True
+
+    def update(self, frame):
+        """ประมวลผลเฟรมถัดไป (ภาพ BGR หรือ FrameContext) คืน list ของ (box, name, lbph_confidence)"""
+        # ต้องเก็บ gray ของเฟรมก่อนหน้าไว้สำหรับ optical flow จึงสลับใช้ buffer 2 ชุดของ tracker เอง
+        spare = self._spare_gray
+        shape = frame.shape[:2]
+        if spare is None or spare.shape != shape:
+            spare = None
+        if isinstance(frame, FrameContext):
+            gray = spare if spare is not None else np.empty(shape, dtype=np.uint8)
+            np.copyto(gray, frame.gray)
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=spare)
+
+        if self._force_detect or self.frame_index % self.detect_every == 0:
+            self._detect(frame)
+        else:
+            self._propagate(gray)
+
+        for track in self.tracks:
+            if track.points is None:
+                track.points = self._sample_points(gray, track.box)
+
+        self._recognize(frame)
+        self._spare_gray, self._prev_gray = self._prev_gray, gray
+        self.frame_index += 1
+        return [(track.box, track.name, track.lbph_confidence) for track in self.tracks]
+
+    def _detect(self, frame):
+        self.detections_run += 1
+        self._force_detect = False
+        detections = self.detect_fn(frame)
+        det_boxes = [box for (box, conf) in detections]
+
+        matched_tracks, matched_dets = set(), set()
+        for t, d in match_boxes([track.box for track in self.tracks], det_boxes):
+            track = self.tracks[t]
+            track.box = tuple(int(v) for v in det_boxes[d])
+            track.det_confidence = detections[d][1]
+            track.misses = 0
+            track.points = None
+            matched_tracks.add(t)
+            matched_dets.add(d)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                if track.misses > MAX_MISSES:
+                    continue
+                # จุดเดิมมาจากเฟรมก่อน: สุ่มใหม่จากเฟรมนี้ ไม่งั้น optical flow รอบถัดไปจะคลาดไปหนึ่งเฟรม
+                track.points = None
+            survivors.append(track)
+
+        for d, (box, conf) in enumerate(detections):
+            if d not in matched_dets:
+                survivors.append(Track(box, conf))
+        self.tracks = survivors
+
+    def _sample_points(self, gray, box):
+        (x, y, w, h) = box
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + w, gray.shape[1]), min(y + h, gray.shape[0])
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return np.empty((0, 1, 2), dtype=np.float32)
+        points = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], MAX_FLOW_POINTS, 0.01, 3)
+        if points is None:
+            return np.empty((0, 1, 2), dtype=np.float32)
+        points[:, 0, 0] += x1
+        points[:, 0, 1] += y1
+        return points.astype(np.float32)
+
+    def _propagate(self, gray):
+        for track in self.tracks:
+            points = track.points
+            if points is None or len(points) == 0:
+                self._force_detect = True
+                continue
+
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None, **LK_PARAMS)
+            good = status.reshape(-1) == 1
+            if good.mean() < MIN_FLOW_QUALITY:
+                # ตามจุดไม่ได้แล้ว: ให้ detector ทำงานในเฟรมถัดไป
+                self._force_detect = True
+            if not good.any():
+                continue
+
+            shift = np.median(new_points[good] - points[good], axis=0).reshape(-1)
+            (x, y, w, h) = track.box
+            track.box = (int(round(x + shift[0])), int(round(y + shift[1])), w, h)
+            track.points = new_points[good].reshape(-1, 1, 2)
+
+    def _recognize(self, frame):
+        due = [track for track in self.tracks
+               if track.last_recognized is None
+               or self.frame_index - track.last_recognized >= self.recognize_every]
+        if not due:
+            return
+
+        self.recognitions_run += len(due)
+        names, confidences = self.recognize_fn(frame, [track.box for track in due])
+        for track, name, confidence in zip(due, names, confidences):
+            track.name = name
+            track.lbph_confidence = confidence
+            track.last_recognized = self.frame_index
@@ -7,36 +7,61 @@ import time
 import numpy as np
 import os 
 import sys
+import logging
+import sqlite3
 
-# --- (START) การจัดการพาธให้เข้าถึง core modules ---
-# เพิ่ม sys.path เพื่อให้แน่ใจว่ามันหา 'core' เจอ (เช่น detector.py)
+# นำเข้าฟังก์ชันจาก package 'core' ทั้งหมด: detector/recognizer ต้องเป็น module ตัวเดียวกับที่
+# core.motion / core.pipeline ใช้ ไม่งั้นจะโหลด Net และโมเดล LBPH ซ้ำอีกชุดที่ไม่ได้ preload
 try:
-    BASE_DIR = os.getcwd()
-except Exception as e:
-    print(f"[ERROR] Cannot get Current Working Directory: {e}", file=sys.stderr)
+    from core.detector import detect_faces, detect_faces_batch, detector_model
+    from core.recognizer import recognize_faces_lbph, lbph_model, recognition_cache
+    from core.registry import preload_models
+    from core.pipeline import FramePipeline
+    from core.tracker import FaceTracker, DETECT_EVERY_N, RECOGNIZE_EVERY_N
+except ImportError as e:
+    print(f"[ERROR] ไม่สามารถ import 'core' modules ได้: {e}", file=sys.stderr)
+    print("  > กรุณารันจากโฟลเดอร์โปรเจกต์ที่มีโฟลเดอร์ core/", file=sys.stderr)
     sys.exit(1)
 
-CORE_PATH = os.path.join(BASE_DIR, "core")
-if CORE_PATH not in sys.path:
-    sys.path.append(CORE_PATH)
-# --- (END) การจัดการพาธ ---
+from core.instrumentation import instruments, stage, configure_logging
+from core.frame_context import FrameContext, BufferRing
+from core.motion import MotionGatedDetector
+from core.event_log import EventLog, EVENT_DB_PATH
+from utils.drawing import draw_stats_overlay, draw_face_results
 
-# นำเข้าฟังก์ชันจากไฟล์อื่น ๆ ในโปรเจกต์
-try:
-    # ต้อง import จาก 'detector' และ 'recognizer' ที่อยู่ในโฟลเดอร์ core/
-    from detector import detect_faces 
-    from recognizer import recognize_faces_lbph # ใช้ฟังก์ชัน recognize_faces_lbph
-except ImportError:
-    # พิมพ์คำเตือนหากหาไฟล์ไม่เจอ
-    print("[ERROR] ไม่สามารถ import 'core' modules ได้", file=sys.stderr)
-    print(f"  > กำลังค้นหาที่: {CORE_PATH}", file=sys.stderr)
-    print("  > กรุณาตรวจสอบว่ามีไฟล์ detector.py และ recognizer.py ในโฟลเดอร์ core/", file=sys.stderr)
-    sys.exit(1)
+logger = logging.getLogger("app.gui")
 
 # --- ค่าคงที่/การตั้งค่า ---
 APP_TITLE = "Face Recognition Application (GUI)"
 CAMERA_ID = 0 
 UPDATE_DELAY_MS = 15 
+# True = แยก capture / inference ไปทำงานใน thread ของตัวเอง ให้ Tk loop แค่แสดงเฟรมที่เสร็จแล้ว
+USE_PIPELINE = True
+# True = รัน SSD ทุก DETECT_EVERY_N เฟรม และเลื่อนกล่องด้วย optical flow ระหว่างนั้น (เฉพาะโหมดกล้อง)
+USE_TRACKER = True
+# True = ข้าม SSD เมื่อฉากนิ่ง และรัน SSD เฉพาะบริเวณที่เปลี่ยน (เหมาะกับกล้องที่ติดตั้งอยู่กับที่)
+USE_MOTION_GATE = True
+# True = ย่อเฟรมเป็นขนาดที่แสดงจริงก่อน แล้วตรวจจับ/วาดผลบนภาพย่อ (จดจำใบหน้ายังใช้ ROI จากเฟรมเต็ม)
+USE_DISPLAY_RENDERING = True
+# ตรวจจับบนภาพย่อเฉพาะเมื่อกว้างอย่างน้อยเท่านี้ (SSD ย่อเหลือ 300x300 อยู่แล้ว) เล็กกว่านี้ใช้เฟรมเต็ม
+MIN_DETECT_WIDTH = 480
+STATS_EXPORT_PATH = "frame_stats.json"
+# True = บันทึกการพบแต่ละคน (ชื่อ, เวลาเริ่ม/จบ, ระยะที่ดีที่สุด) ลง SQLite ใน background (ค้นด้วย query_events.py)
+USE_EVENT_LOG = True
+
+def _start_event_log():
+    """เปิดบันทึกการพบ ถ้าเปิดฐานข้อมูลไม่ได้ (เช่นโฟลเดอร์ปัจจุบันเขียนไม่ได้) ให้ GUI ทำงานต่อโดยไม่บันทึก"""
+    try:
+        return EventLog(EVENT_DB_PATH).start()
+    except sqlite3.Error as e:
+        print(f"[Warning] เปิดฐานข้อมูลเหตุการณ์ {EVENT_DB_PATH} ไม่ได้ ({e}) ปิดการบันทึกการพบ", file=sys.stderr)
+        return None
+
+
+def _scale_box(box, scale):
+    (x, y, w, h) = box
+    return (int(round(x * scale)), int(round(y * scale)), int(round(w * scale)), int(round(h * scale)))
+
 
 class FaceRecognitionApp:
     def __init__(self, master):
@@ -48,6 +73,20 @@ class FaceRecognitionApp:
         self.is_running_camera = False
         self.prev_frame_time = time.time()
         self._after_id = None 
+        self.pipeline = None
+        self.tracker = None
+        self.motion_gate = None
+        # buffer ของ FrameContext ที่ใช้ซ้ำข้ามเฟรม (หลายชุด เพื่อไม่เขียนทับเฟรมที่กำลังแสดงอยู่)
+        self.frame_buffers = BufferRing()
+        self.detect_buffers = BufferRing()
+        # ขนาดของ video_label (อัปเดตจาก <Configure> ใน Tk thread เพื่อให้ inference thread อ่านได้โดยไม่เรียก winfo)
+        self._display_size = None
+        # ภาพย่อที่ใช้ตรวจจับในเฟรมปัจจุบัน: (FrameContext, สเกลกลับเป็นพิกัดเต็มเฟรม) หรือ None
+        self._detect_view = None
+        self._detect_view_size = None
+        self._rgb = None
+        self.photo = None
+        self.event_log = _start_event_log() if USE_EVENT_LOG else None
 
         # 2. สร้าง Main Frame
         main_frame = tk.Frame(master)
@@ -57,6 +96,7 @@ class FaceRecognitionApp:
         self.video_label = tk.Label(main_frame, text="Select an option to start.", 
                                       bg='black', fg='white', relief=tk.RAISED)
         self.video_label.pack(side=tk.LEFT, padx=10, fill=tk.BOTH, expand=True)
+        self.video_label.bind("<Configure>", self._on_resize)
         
         # 4. Control Panel (ปุ่มต่าง ๆ)
         control_frame = tk.Frame(main_frame)
@@ -77,6 +117,18 @@ class FaceRecognitionApp:
         # Label แสดงสถานะ
         self.status_label = tk.Label(control_frame, text="Status: Ready", fg="blue", wraplength=150)
         self.status_label.pack(pady=20, fill=tk.X)
+
+        # Label แสดงตัวนับของ pipeline (เฟรมที่ทิ้ง / latency)
+        self.stats_label = tk.Label(control_frame, text="", fg="gray", justify=tk.LEFT, wraplength=150)
+        self.stats_label.pack(pady=5, fill=tk.X)
+
+        # สถิติเวลาต่อ stage: เปิด/ปิดการจับเวลา + overlay และบันทึกเป็น JSON
+        self.show_stats = tk.BooleanVar(value=instruments.enabled)
+        self.chk_stats = tk.Checkbutton(control_frame, text="Show stage timings", variable=self.show_stats,
+                                        command=self.toggle_stats)
+        self.chk_stats.pack(pady=5)
+        self.btn_export = tk.Button(control_frame, text="💾 Export Stats", command=self.export_stats, width=20)
+        self.btn_export.pack(pady=5)
         
         # ผูกฟังก์ชัน On Close
         master.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -99,10 +151,31 @@ class FaceRecognitionApp:
         self.btn_upload.config(state=tk.DISABLED)
         self.status_label.config(text="Status: Camera Running...", fg="green")
         self.prev_frame_time = time.time()
+
+        self.motion_gate = (MotionGatedDetector(detect_fn=detect_faces, detect_batch_fn=detect_faces_batch)
+                            if USE_MOTION_GATE else None)
+        if USE_TRACKER:
+            self.tracker = FaceTracker(lambda ctx: self._detect(ctx, is_camera=True), recognize_faces_lbph,
+                                       detect_every=DETECT_EVERY_N, recognize_every=RECOGNIZE_EVERY_N)
+        if USE_PIPELINE:
+            self.pipeline = FramePipeline(self.cap, lambda frame: self._process_frame(frame, is_camera=True))
+            self.pipeline.start()
         self.update_frame() 
 
     def stop_camera(self):
         """หยุดการทำงานของกล้อง"""
+        if self.pipeline:
+            # ต้องหยุด thread ที่อ่านกล้องก่อน release
+            self.pipeline.stop()
+            self.pipeline = None
+        self.tracker = None
+        if self.motion_gate is not None:
+            stats = self.motion_gate.stats()
+            logger.info("Motion gate: skipped %.0f%% of frames, %.0f%% of pixels (%d frames)",
+                        stats["skipped_frame_fraction"] * 100, stats["skipped_pixel_fraction"] * 100,
+                        stats["frames"])
+            self.motion_gate = None
+
         if self.is_running_camera and self.cap:
             self.cap.release()
         
@@ -116,6 +189,31 @@ class FaceRecognitionApp:
             self.master.after_cancel(self._after_id) 
             self._after_id = None
 
+    def _on_resize(self, event):
+        self._display_size = (event.width, event.height)
+
+    def _fit_display_size(self, shape):
+        """ขนาด (w, h) ที่ภาพขนาด shape ถูกย่อ/ขยายให้พอดี video_label หรือ None ถ้ายังไม่รู้ขนาด label"""
+        if self._display_size is None:
+            return None
+        label_w, label_h = self._display_size
+        if label_w <= 1 or label_h <= 1:
+            return None
+        img_h, img_w = shape[:2]
+        scale = min(label_w / img_w, label_h / img_h)
+        return max(1, int(img_w * scale)), max(1, int(img_h * scale))
+
+    def toggle_stats(self):
+        """เปิด/ปิดการจับเวลาแต่ละ stage (ปิดแล้วแทบไม่มี overhead)"""
+        instruments.enabled = self.show_stats.get()
+        if instruments.enabled:
+            instruments.reset()
+
+    def export_stats(self):
+        data = instruments.export_json(STATS_EXPORT_PATH)
+        self.status_label.config(text=f"Status: Saved {len(data['stages'])} stages to {STATS_EXPORT_PATH}",
+                                 fg="green")
+
     def upload_image(self):
         """อนุญาตให้ผู้ใช้อัปโหลดไฟล์ภาพเพื่อประมวลผล"""
         if self.is_running_camera:
@@ -145,73 +243,114 @@ class FaceRecognitionApp:
     def _process_frame(self, frame, is_camera=True):
         """ฟังก์ชันหลักในการตรวจจับและจดจำใบหน้า พร้อมแสดงผลใน Terminal"""
         
-        if is_camera:
-            frame = cv2.flip(frame, 1) 
-        
-        # 1. ตรวจจับใบหน้า
-        detected_results = detect_faces(frame)
-        boxes = [box for (box, conf) in detected_results]
+        # context ของเฟรม: flip / resize / blob / gray ของ ROI ถูกคำนวณครั้งเดียวและใช้ buffer เดิม
+        ctx = FrameContext(frame, flip=is_camera, buffers=self.frame_buffers.next())
+        display_size = self._fit_display_size(ctx.shape) if USE_DISPLAY_RENDERING else None
+        if display_size is not None:
+            # ย่อครั้งเดียวเป็นขนาดที่แสดงจริง: ใช้ทั้งวาดผลและ (ถ้าใหญ่พอ) ตรวจจับ เฟรมเต็มไม่ต้อง flip ทั้งภาพ
+            frame = ctx.display(display_size)
+            display_scale = display_size[0] / ctx.shape[1]
+            self._set_detect_view(ctx, display_size, display_scale)
+        else:
+            frame = ctx.image
+            display_scale = 1.0
+            self._set_detect_view(ctx, None, display_scale)
         
-        # 2. จดจำใบหน้า
-        if boxes:
-            names, lbph_confidences = recognize_faces_lbph(frame, boxes)
+        # อ่านครั้งเดียว: stop_camera อาจตั้งเป็น None ระหว่างนี้ ถ้า pipeline.stop รอ worker ไม่ทัน
+        tracker = self.tracker if is_camera else None
+        if tracker is not None:
+            # 1-2. ตรวจจับ/ติดตาม และจดจำใบหน้า (ใช้ผลที่ cache ไว้ต่อ track)
+            tracked = tracker.update(ctx)
+            boxes = [box for (box, name, conf) in tracked]
+            names = [name for (box, name, conf) in tracked]
+            lbph_confidences = [conf for (box, name, conf) in tracked]
         else:
-            names = []
-            lbph_confidences = []
+            # 1. ตรวจจับใบหน้า (โหมดกล้องผ่าน motion gate ถ้าเปิดไว้)
+            detected_results = self._detect(ctx, is_camera)
+            boxes = [box for (box, conf) in detected_results]
+
+            # 2. จดจำใบหน้า
+            if boxes:
+                names, lbph_confidences = recognize_faces_lbph(ctx, boxes)
+            else:
+                names = []
+                lbph_confidences = []
 
         
-        # --- แสดงผลใน Terminal (สำหรับ Debug) ---
-        if names:
-            print("\n--- Detection Results ---")
-            for i in range(len(names)):
-                name = names[i]
-                conf = lbph_confidences[i]
-                match_status = f"Match: {conf:.2f}" 
+        # --- Log ผลลัพธ์ (สำหรับ Debug, ปิดเป็นค่าเริ่มต้น: FACE_LOG_LEVEL=DEBUG) ---
+        if names and logger.isEnabledFor(logging.DEBUG):
+            for name, conf in zip(names, lbph_confidences):
                 if name != "Unknown":
-                    print(f"✅ Found: {name} | Confidence (Lower is better): {conf:.2f}")
+                    logger.debug("Found: %s | Confidence (Lower is better): %.2f", name, conf)
                 else:
-                    print(f"❓ Unknown | Confidence: {conf:.2f}")
-            print("-------------------------")
+                    logger.debug("Unknown | Confidence: %.2f", conf)
+
+        if is_camera and self.event_log is not None:
+            self.event_log.observe(names, lbph_confidences, camera=CAMERA_ID)
         
         # --- วาดผลลัพธ์ลงบนภาพ ---
-        for i, (x, y, w, h) in enumerate(boxes):
-            name = names[i]
-            
-            text_name = name
-            text_lbph_conf = f"Match: {lbph_confidences[i]:.2f}" 
-            
-            color = (0, 0, 255) if name == "Unknown" else (0, 255, 0) # BGR
-            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-            
-            # พื้นหลังข้อความ
-            y_text_bg = y - 40 if y - 40 > 0 else y + 10
-            cv2.rectangle(frame, (x, y_text_bg), (x + w, y), color, cv2.FILLED)
-            
-            cv2.putText(frame, text_name, (x + 6, y - 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-            cv2.putText(frame, text_lbph_conf, (x + 6, y - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        with stage("draw"):
+            if display_scale != 1.0:
+                boxes = [_scale_box(box, display_scale) for box in boxes]
+            self._draw_results(frame, boxes, names, lbph_confidences)
 
         return frame
 
+    def _set_detect_view(self, ctx, display_size, display_scale):
+        """เตรียมภาพย่อสำหรับ detector ของเฟรมนี้ (ภาพที่แสดงผล ก่อนวาดอะไรลงไป)"""
+        if display_scale >= 1.0 or display_size is None or display_size[0] < MIN_DETECT_WIDTH:
+            display_size = None
+        if display_size != self._detect_view_size:
+            # ผลที่ motion gate เก็บไว้อยู่ในพิกัดของภาพที่ใช้ตรวจจับขนาดเดิม
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+            self._detect_view_size = display_size
+        if display_size is None:
+            self._detect_view = None
+            return
+        view = FrameContext(ctx.display(display_size), buffers=self.detect_buffers.next())
+        self._detect_view = (view, 1.0 / display_scale)
+
+    def _detect(self, ctx, is_camera):
+        """ตรวจจับใบหน้า (โหมดกล้องผ่าน motion gate ถ้าเปิดไว้) บนภาพย่อถ้ามี คืนกล่องในพิกัดของเฟรมเต็ม"""
+        view, scale = self._detect_view or (ctx, 1.0)
+        if is_camera and self.motion_gate is not None:
+            detected_results = self.motion_gate.detect(view)
+        else:
+            detected_results = detect_faces(view)
+        if scale == 1.0:
+            return detected_results
+        return [(_scale_box(box, scale), conf) for (box, conf) in detected_results]
+
+    def _draw_results(self, frame, boxes, names, lbph_confidences):
+        draw_face_results(frame, boxes, names, lbph_confidences)
+
     def _display_frame(self, frame):
         """แปลงและแสดงเฟรมภาพใน Tkinter Label พร้อมปรับขนาด"""
         
-        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        img_h, img_w, _ = cv2image.shape
-        label_w = self.video_label.winfo_width()
-        label_h = self.video_label.winfo_height()
+        if instruments.enabled and self.show_stats.get():
+            draw_stats_overlay(frame, instruments.summary_lines())
 
-        if label_w <= 1 or label_h <= 1: 
-             scale_factor = 1 
-        else:
-             scale_factor = min(label_w / img_w, label_h / img_h)
+        with stage("photoimage"):
+            self._update_photo(frame)
 
-        new_w = int(img_w * scale_factor)
-        new_h = int(img_h * scale_factor)
-        
-        cv2image = cv2.resize(cv2image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    def _update_photo(self, frame):
+        img_h, img_w = frame.shape[:2]
+        size = self._fit_display_size(frame.shape)
+        # เฟรมที่ render ที่ขนาดแสดงผลแล้วไม่ต้อง resize ซ้ำ
+        if size is not None and size != (img_w, img_h):
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            img_h, img_w = frame.shape[:2]
 
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = np.empty(frame.shape, dtype=np.uint8)
+        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
         img = Image.fromarray(cv2image)
+
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == (img_w, img_h):
+            # ขนาดเดิม: เขียนทับ PhotoImage ตัวเดิม ไม่ต้องสร้างใหม่และไม่ต้อง config label
+            self.photo.paste(img)
+            return
         self.photo = ImageTk.PhotoImage(image=img)
         
         self.video_label.config(image=self.photo, text="")
@@ -219,36 +358,66 @@ class FaceRecognitionApp:
 
     # --- Loop สำหรับกล้อง ---
 
+    def _show_processed_frame(self, processed_frame):
+        """วาด FPS แล้วแสดงเฟรมที่ประมวลผลเสร็จแล้ว"""
+        # คำนวณ FPS
+        new_frame_time = time.time()
+        try:
+            fps = 1 / (new_frame_time - self.prev_frame_time)
+        except ZeroDivisionError:
+            fps = 0
+        self.prev_frame_time = new_frame_time
+        cv2.putText(processed_frame, f"FPS: {int(fps)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+        self._display_frame(processed_frame)
+
     def update_frame(self):
         """Loop สำหรับดึงเฟรมจากกล้องและอัปเดต GUI"""
-        if self.is_running_camera and self.cap:
+        if self.is_running_camera and self.pipeline:
+            # โหมด pipeline: Tk loop แค่แสดงเฟรมที่ inference thread ทำเสร็จแล้ว
+            result = self.pipeline.get_result()
+            if result is not None:
+                self._show_processed_frame(result.frame)
+                stats = self.pipeline.stats()
+                text = (f"Dropped: {stats['dropped_capture'] + stats['dropped_display']}\n"
+                        f"Latency: {stats['latency_ms']:.0f} ms\n"
+                        f"Inference: {stats['inference_ms']:.0f} ms")
+                if self.motion_gate is not None:
+                    motion = self.motion_gate.stats()
+                    text += (f"\nSSD skipped: {motion['skipped_frame_fraction'] * 100:.0f}% frames, "
+                             f"{motion['skipped_pixel_fraction'] * 100:.0f}% px")
+                cache = recognition_cache.stats()
+                text += f"\nCache hits: {cache['hit_rate'] * 100:.0f}% ({cache['entries']} faces)"
+                if self.event_log is not None:
+                    text += f"\nEvents logged: {self.event_log.stats()['events_written']}"
+                self.stats_label.config(text=text)
+            self._after_id = self.master.after(UPDATE_DELAY_MS, self.update_frame)
+
+        elif self.is_running_camera and self.cap:
             ret, frame = self.cap.read()
             if ret:
                 # 1. ประมวลผลภาพ 
                 processed_frame = self._process_frame(frame, is_camera=True)
                 
-                # คำนวณ FPS
-                new_frame_time = time.time()
-                try:
-                    fps = 1 / (new_frame_time - self.prev_frame_time)
-                except ZeroDivisionError:
-                    fps = 0
-                self.prev_frame_time = new_frame_time
-                cv2.putText(processed_frame, f"FPS: {int(fps)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                
                 # 2. แสดงผลใน GUI
-                self._display_frame(processed_frame)
+                self._show_processed_frame(processed_frame)
             
             # เรียกตัวเองซ้ำหลังจากหน่วงเวลา
             self._after_id = self.master.after(UPDATE_DELAY_MS, self.update_frame)
             
     def on_close(self):
         """ฟังก์ชันที่ถูกเรียกเมื่อผู้ใช้กดปิดหน้าต่าง"""
-        print("[INFO] Closing application...")
+        logger.info("Closing application...")
         self.stop_camera() 
+        if self.event_log is not None:
+            # เขียนเหตุการณ์ที่ยังค้างก่อนปิด
+            self.event_log.close()
         self.master.destroy() 
 
 if __name__ == "__main__":
+    # โหลดและ warm-up โมเดลใน background ระหว่างที่หน้าต่างกำลังเปิด
+    configure_logging()
+    preload_models(detector_model, lbph_model, background=True)
     root = tk.Tk()
     root.geometry("1000x700") 
     app = FaceRecognitionApp(root)
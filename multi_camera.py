@@ -0,0 +1,144 @@
+"""
+ตรวจจับและจดจำใบหน้าจากหลายกล้อง/ไฟล์วิดีโอพร้อมกัน โดยรวมเฟรมจากทุก stream เป็น SSD forward pass เดียว
+
+    python multi_camera.py 0 1 2                     # กล้อง index 0, 1, 2 (แสดงเป็นตาราง กด q เพื่อออก)
+    python multi_camera.py 0 videos/door.mp4 --max-batch 2
+    python multi_camera.py a.mp4 b.mp4 --headless    # ไม่แสดงภาพ พิมพ์ FPS/latency ต่อ stream
+"""
+import argparse
+import math
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core.detector import detector_model
+from core.event_log import EventLog, EVENT_DB_PATH
+from core.instrumentation import configure_logging
+from core.multistream import MultiStreamPipeline
+from core.recognizer import lbph_model
+from core.registry import preload_models
+from utils.drawing import draw_face_results, draw_stats_overlay
+
+WINDOW_TITLE = "Face Recognition (multi-camera)"
+DISPLAY_DELAY_MS = 15
+
+
+def parse_source(value):
+    """ตัวเลขคือ index ของกล้อง นอกนั้นเป็นพาธไฟล์/URL"""
+    return int(value) if value.isdigit() else value
+
+
+def stream_lines(stats):
+    return [f"{s['name']}: {s['fps']:.1f} FPS, {s['latency_ms']:.0f} ms, dropped {s['dropped']}"
+            for s in stats["streams"]]
+
+
+def build_mosaic(tiles, tile_size):
+    """วางภาพของทุก stream (ต้องย่อเป็นขนาด tile_size แล้ว) เป็นตารางเกือบจัตุรัส"""
+    tile_w, tile_h = tile_size
+    cols = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / cols)
+    mosaic = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        if tile is None:
+            continue
+        r, c = divmod(i, cols)
+        mosaic[r * tile_h:(r + 1) * tile_h, c * tile_w:(c + 1) * tile_w] = tile
+    return mosaic
+
+
+def run_display(pipeline, tile_width):
+    tile_size = (tile_width, tile_width * 3 // 4)
+    tiles = [None] * len(pipeline.streams)
+    while not pipeline.finished:
+        for i in range(len(tiles)):
+            result = pipeline.get_result(i)
+            if result is not None:
+                tiles[i] = result.frame
+
+        stats = pipeline.stats()
+        display = []
+        for tile, stream_stats in zip(tiles, stats["streams"]):
+            if tile is not None:
+                # ย่อเป็นภาพใหม่ขนาด tile: ช่องของ mosaic มีขนาดตายตัว และไม่วาด overlay ทับเฟรมผลลัพธ์เดิมซ้ำทุกรอบ
+                tile = cv2.resize(tile, tile_size, interpolation=cv2.INTER_AREA)
+                draw_stats_overlay(tile, [f"{stream_stats['name']}  {stream_stats['fps']:.1f} FPS  "
+                                          f"{stream_stats['latency_ms']:.0f} ms"], origin=(10, 10))
+            display.append(tile)
+        cv2.imshow(WINDOW_TITLE, build_mosaic(display, tile_size))
+        if cv2.waitKey(DISPLAY_DELAY_MS) & 0xFF == ord('q'):
+            break
+    cv2.destroyAllWindows()
+
+
+def run_headless(pipeline, interval):
+    next_report = time.perf_counter() + interval
+    while not pipeline.finished:
+        for i in range(len(pipeline.streams)):
+            pipeline.get_result(i)
+        time.sleep(0.01)
+        if time.perf_counter() >= next_report:
+            next_report += interval
+            stats = pipeline.stats()
+            print(f"[INFO] batch เฉลี่ย {stats['mean_batch_size']:.2f} เฟรม, {stats['batch_ms']:.1f} ms/batch")
+            for line in stream_lines(stats):
+                print(f"    {line}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="จดจำใบหน้าจากหลายกล้อง/ไฟล์วิดีโอพร้อมกัน")
+    parser.add_argument("sources", nargs="+", help="index ของกล้อง หรือพาธไฟล์วิดีโอ")
+    parser.add_argument("--max-batch", type=int, default=None,
+                        help="จำนวนเฟรมสูงสุดต่อ SSD forward pass (ค่าเริ่มต้น = จำนวน stream)")
+    parser.add_argument("--mirror", action="store_true", help="กลับภาพซ้ายขวา (เหมือนโหมดกล้องของ main_gui.py)")
+    parser.add_argument("--no-realtime", action="store_true", help="อ่านไฟล์วิดีโอเร็วที่สุดแทนความเร็วจริง")
+    parser.add_argument("--headless", action="store_true", help="ไม่แสดงภาพ พิมพ์สถิติแทน")
+    parser.add_argument("--tile-width", type=int, default=480)
+    parser.add_argument("--event-log", nargs="?", const=EVENT_DB_PATH, default=None, metavar="PATH",
+                        help=f"บันทึกการพบแต่ละคนลง SQLite (ค่าเริ่มต้น {EVENT_DB_PATH}) ค้นด้วย query_events.py")
+    parser.add_argument("--stats-interval", type=float, default=2.0, help="ช่วงเวลาพิมพ์สถิติในโหมด headless (วินาที)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging()
+    preload_models(detector_model, lbph_model, background=False)
+
+    event_log = EventLog(args.event_log).start() if args.event_log else None
+    pipeline = MultiStreamPipeline([parse_source(s) for s in args.sources], process_fn=draw_face_results,
+                                   max_batch=args.max_batch, mirror=args.mirror,
+                                   realtime_files=not args.no_realtime, event_log=event_log)
+    failed = pipeline.start()
+    for name in failed:
+        print(f"[ERROR] เปิดแหล่งภาพไม่ได้: {name}", file=sys.stderr)
+    if len(failed) == len(pipeline.streams):
+        pipeline.stop()
+        if event_log is not None:
+            event_log.close()
+        sys.exit(1)
+
+    try:
+        if args.headless:
+            run_headless(pipeline, args.stats_interval)
+        else:
+            run_display(pipeline, args.tile_width)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        if event_log is not None:
+            event_log.close()
+
+    stats = pipeline.stats()
+    print(f"[INFO] {stats['batches']} batches, เฉลี่ย {stats['mean_batch_size']:.2f} เฟรม/batch")
+    for line in stream_lines(stats):
+        print(f"    {line}")
+    if event_log is not None:
+        print(f"[INFO] บันทึก {event_log.stats()['events_written']} เหตุการณ์ลง {args.event_log}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+ค้นหาว่าใครถูกพบในช่วงเวลาใด จากฐานข้อมูลเหตุการณ์ที่ main_gui.py / multi_camera.py --event-log บันทึกไว้
+
+    python query_events.py --last 3600                                  # ใครถูกพบในชั่วโมงที่ผ่านมา
+    python query_events.py --from "2026-10-18 09:00" --to "2026-10-18 12:00"
+    python query_events.py --name Alice --last 86400 --detail           # ทุกครั้งที่ Alice ถูกพบวันนี้
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+from core.event_log import EVENT_DB_PATH, connect, query_sightings, who_was_seen
+
+
+def parse_time(value):
+    """เวลาแบบ ISO (เช่น 2026-10-18 09:00) ตามเวลาท้องถิ่น หรือ epoch วินาที"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ค้นหาว่าใครถูกพบระหว่างเวลา T1 ถึง T2")
+    parser.add_argument("--db", default=EVENT_DB_PATH)
+    parser.add_argument("--from", dest="start", type=parse_time, help="เวลาเริ่ม (ISO หรือ epoch)")
+    parser.add_argument("--to", dest="end", type=parse_time, help="เวลาสิ้นสุด (ค่าเริ่มต้น: ตอนนี้)")
+    parser.add_argument("--last", type=float, help="ย้อนหลังกี่วินาทีจาก --to (แทน --from)")
+    parser.add_argument("--name", help="เฉพาะคนนี้ (แสดงทุก sighting)")
+    parser.add_argument("--camera", help="เฉพาะกล้องนี้")
+    parser.add_argument("--detail", action="store_true", help="แสดงทุก sighting แทนสรุปต่อคน")
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.db):
+        print(f"[ERROR] ไม่พบฐานข้อมูล {args.db}", file=sys.stderr)
+        sys.exit(1)
+
+    end = args.end if args.end is not None else time.time()
+    if args.last is not None:
+        start = end - args.last
+    elif args.start is not None:
+        start = args.start
+    else:
+        print("[ERROR] ต้องระบุ --from หรือ --last", file=sys.stderr)
+        sys.exit(1)
+
+    conn = connect(args.db)
+    try:
+        if args.detail or args.name:
+            rows = query_sightings(conn, start, end, name=args.name, camera=args.camera)
+        else:
+            rows = who_was_seen(conn, start, end, camera=args.camera)
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+
+    print(f"[INFO] {format_time(start)} ถึง {format_time(end)}: {len(rows)} รายการ")
+    if args.detail or args.name:
+        print(f"    {'name':<20}{'camera':<12}{'start':<21}{'end':<21}{'best dist':>10}{'frames':>8}")
+        for row in rows:
+            print(f"    {row['name']:<20}{row['camera']:<12}{format_time(row['start_time']):<21}"
+                  f"{format_time(row['end_time']):<21}{row['best_distance']:>10.2f}{row['frames']:>8}")
+    else:
+        print(f"    {'name':<20}{'first seen':<21}{'last seen':<21}{'times':>6}{'best dist':>10}  cameras")
+        for row in rows:
+            print(f"    {row['name']:<20}{format_time(row['first_seen']):<21}{format_time(row['last_seen']):<21}"
+                  f"{row['sightings']:>6}{row['best_distance']:>10.2f}  {', '.join(row['cameras'])}")
+
+
+if __name__ == "__main__":
+    main()
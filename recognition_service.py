@@ -0,0 +1,269 @@
+"""
+บริการตรวจจับ/จดจำใบหน้าแบบ local (HTTP บน localhost หรือ Unix socket) สำหรับเรียกจาก process อื่น
+
+    python recognition_service.py --port 8765 --max-batch-size 8 --max-wait-ms 5
+    python recognition_service.py --unix /tmp/face.sock
+
+    POST /recognize   body = ไฟล์ภาพ (JPEG/PNG) -> {"faces": [{"box", "det_confidence", "name", "distance"}]}
+    GET  /metrics     ความลึกคิว, การกระจายขนาด batch, เวลารอ/ประมวลผล, hit rate ของ cache ผลจดจำ และเวลาต่อ stage
+    GET  /health
+
+คำขอที่มาถึงพร้อม ๆ กันจะถูกรวมเป็น SSD forward pass เดียวและการจดจำ LBPH ครั้งเดียว (core.microbatch)
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from core.detector import detect_faces_batch, detector_model
+from core.inference_pool import InferencePool, PoolFullError
+from core.instrumentation import instruments, configure_logging
+from core.microbatch import (MicroBatcher, QueueFullError, DEFAULT_MAX_BATCH_SIZE,
+                             DEFAULT_MAX_WAIT_MS, DEFAULT_MAX_QUEUE)
+from core.recognizer import (recognize_faces_lbph_multi, lbph_model, recognition_cache,
+                             DEFAULT_CONFIDENCE_THRESHOLD)
+from core.registry import preload_models
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# ขนาด body สูงสุดที่รับ (ภาพ 4K แบบ PNG ยังผ่าน)
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def recognize_batch(images, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD, nprobe=None):
+    """SSD หนึ่ง forward pass สำหรับทุกภาพ แล้วจดจำทุกใบหน้าของทุกภาพในครั้งเดียว"""
+    detections = detect_faces_batch(images, batch_size=max(1, len(images)))
+    boxes_list = [[box for (box, _) in faces] for faces in detections]
+    recognized = recognize_faces_lbph_multi(images, boxes_list, confidence_threshold, nprobe)
+
+    return [format_faces((box, det_conf, name, distance)
+                         for (box, det_conf), name, distance in zip(faces, names, distances))
+            for faces, (names, distances) in zip(detections, recognized)]
+
+
+def format_faces(faces):
+    """[(box, det_confidence, name, distance), ...] -> list ของ dict สำหรับตอบกลับเป็น JSON"""
+    return [{"box": [int(v) for v in box], "det_confidence": round(float(det_conf), 4),
+             "name": name, "distance": round(float(distance), 4)}
+            for box, det_conf, name, distance in faces]
+
+
+class PoolBatcher:
+    """
+    ใช้แทน MicroBatcher เมื่อ --workers > 1: คำขอถูกส่งให้ InferencePool ที่มี K worker (Net/LBPH ของตัวเอง)
+    ประมวลผลพร้อมกัน worker ที่ว่างจะรวมคำขอที่รออยู่เป็น batch เอง จึงไม่ต้องรอ max_wait_ms
+    """
+
+    def __init__(self, pool, confidence_threshold, nprobe):
+        self.pool = pool
+        self.confidence_threshold = confidence_threshold
+        self.nprobe = nprobe
+        self.max_batch_size = pool.max_batch
+
+    async def start(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.pool.start)
+
+    async def stop(self):
+        self.pool.close(wait=False)
+
+    async def submit(self, image):
+        try:
+            future = self.pool.submit(image, confidence_threshold=self.confidence_threshold, nprobe=self.nprobe,
+                                      block=False)
+        except PoolFullError as e:
+            raise QueueFullError(str(e))
+        return format_faces(await asyncio.wrap_future(future))
+
+    def metrics(self):
+        return self.pool.stats()
+
+    def cache_stats(self):
+        return self.pool.cache_stats()
+
+
+def decode_image(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecognitionService:
+    def __init__(self, batcher, cache_stats=recognition_cache.stats):
+        """cache_stats: ฟังก์ชันคืนสถิติ cache ผลจดจำที่ใช้จริง (โหมด --workers ใช้ cache ของแต่ละ worker)"""
+        self.batcher = batcher
+        self.cache_stats = cache_stats
+        self.started_at = time.time()
+
+    async def handle_connection(self, reader, writer):
+        """รองรับ HTTP/1.1 keep-alive: อ่านคำขอต่อเนื่องจนกว่า client จะปิดการเชื่อมต่อ"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except _HTTPError as e:
+            self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise _HTTPError(400, "malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise _HTTPError(400, "invalid Content-Length")
+        if length < 0:
+            raise _HTTPError(400, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise _HTTPError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, method, path, body):
+        if path == "/recognize":
+            if method != "POST":
+                return 405, {"error": "use POST with an image body"}
+            return await self._recognize(body)
+        if path == "/metrics" and method == "GET":
+            return 200, self.metrics()
+        if path == "/health" and method == "GET":
+            return 200, {"status": "ok", "uptime_s": round(time.time() - self.started_at, 1)}
+        return 404, {"error": f"unknown endpoint {path}"}
+
+    async def _recognize(self, body):
+        if not body:
+            return 400, {"error": "empty body"}
+        start = time.perf_counter()
+        # ถอดรหัสภาพนอก event loop (cv2 ปล่อย GIL) เพื่อไม่ให้บล็อกคำขออื่น
+        image = await asyncio.get_running_loop().run_in_executor(None, decode_image, body)
+        if image is None:
+            return 400, {"error": "could not decode image"}
+
+        try:
+            faces = await self.batcher.submit(image)
+        except QueueFullError as e:
+            return 503, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+        return 200, {"faces": faces, "latency_ms": round((time.perf_counter() - start) * 1000.0, 3)}
+
+    def metrics(self):
+        return {"batching": self.batcher.metrics(), "recognition_cache": self.cache_stats(),
+                "stages": instruments.snapshot()}
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+
+async def serve(args):
+    if args.workers > 1:
+        pool = InferencePool(args.workers, max_batch=args.max_batch_size, max_queue=args.max_queue)
+        batcher = PoolBatcher(pool, args.threshold, args.nprobe)
+        cache_stats = batcher.cache_stats
+    else:
+        cache_stats = recognition_cache.stats
+        batcher = MicroBatcher(
+            lambda images: recognize_batch(images, args.threshold, args.nprobe),
+            max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+    await batcher.start()
+    service = RecognitionService(batcher, cache_stats)
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = await asyncio.start_unix_server(service.handle_connection, path=args.unix)
+        where = f"unix:{args.unix}"
+    else:
+        server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+        where = f"http://{args.host}:{args.port}"
+
+    print(f"[INFO] Recognition service listening on {where} "
+          f"(workers={args.workers}, max_batch_size={batcher.max_batch_size}, max_wait_ms={args.max_wait_ms})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="บริการตรวจจับ/จดจำใบหน้าแบบ local พร้อม micro-batching")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="ฟังบน Unix socket นี้แทน TCP")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="จำนวนคำขอสูงสุดที่รวมเป็น forward pass เดียว")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="เวลารอคำขอเพิ่มก่อนเริ่ม batch (ms)")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="จำนวนคำขอที่รอได้สูงสุด (เกินนี้ตอบ 503)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--nprobe", type=int, default=None, help="ค้นหาผ่านดัชนี IVF (ถ้ามี) ด้วย nprobe กลุ่ม")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="จำนวน inference worker ที่มี Net/LBPH ของตัวเอง (1 = micro-batching thread เดียวแบบเดิม)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging()
+    # เปิดการจับเวลาต่อ stage เสมอ เพื่อให้ /metrics มีข้อมูล
+    instruments.enabled = True
+    if args.workers <= 1:
+        # โหมด pool: แต่ละ worker โหลดโมเดลของตัวเองตอน start
+        preload_models(detector_model, lbph_model, background=False)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\n[INFO] Service stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.crop_store import CROPS_FILE, RECORD_DTYPE, RECORDS_FILE, SOURCES_FILE, CropStore
+
+
+def _face(value):
+    return np.full((200, 200), value, dtype=np.uint8)
+
+
+class InterruptedAppendTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "store")
+        store = CropStore(self.path)
+        store.append([_face(10)], "alice", ["a1.png"])
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _sizes(self):
+        return {name: os.path.getsize(self._file(name)) for name in (CROPS_FILE, RECORDS_FILE, SOURCES_FILE)}
+
+    def _write_crops_and_sources(self, value, source):
+        """ครึ่งแรกของ append(): crop และ source ลงไฟล์แล้ว แต่ยังไม่มี record"""
+        with open(self._file(CROPS_FILE), "ab") as f:
+            f.write(_face(value).tobytes())
+        with open(self._file(SOURCES_FILE), "ab") as f:
+            f.write(json.dumps(source).encode("utf-8") + b"\n")
+
+    def _write_record(self, label, source):
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["label"] = label
+        record["source"] = source.encode("utf-8")
+        with open(self._file(RECORDS_FILE), "ab") as f:
+            f.write(record.tobytes())
+
+    def test_readonly_open_during_append_leaves_files_alone(self):
+        self._write_crops_and_sources(20, "a2.png")
+        before = self._sizes()
+
+        reader = CropStore(self.path, readonly=True)
+        self.assertEqual(len(reader), 1)
+        self.assertEqual(reader.sources(), ["a1.png"])
+        self.assertEqual(self._sizes(), before)
+
+        # ผู้เขียนทำ append ต่อจนจบ: ผู้อ่านที่เปิดใหม่ต้องเห็น crop/label/source ตรงกัน
+        self._write_record(0, "a2.png")
+        reader = CropStore(self.path, readonly=True)
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(int(reader.crops()[1][0, 0]), 20)
+        self.assertEqual(reader.sources(), ["a1.png", "a2.png"])
+
+    def test_writable_reopen_after_crash_truncates_and_keeps_alignment(self):
+        self._write_crops_and_sources(20, "lost.png")
+
+        store = CropStore(self.path)
+        self.assertEqual(len(store), 1)
+        store.append([_face(30)], "bob", ["b1.png"])
+
+        reader = CropStore(self.path, readonly=True)
+        self.assertEqual(len(reader), 2)
+        self.assertEqual([int(crop[0, 0]) for crop in reader.crops()], [10, 30])
+        self.assertEqual([reader.names[label] for label in reader.labels()], ["alice", "bob"])
+        self.assertEqual(reader.sources(), ["a1.png", "b1.png"])
+
+    def test_readonly_store_rejects_append(self):
+        reader = CropStore(self.path, readonly=True)
+        with self.assertRaises(ValueError):
+            reader.append([_face(40)], "carol")
+
+
+if __name__ == "__main__":
+    unittest.main()
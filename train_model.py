@@ -3,119 +3,528 @@ import os
 import numpy as np
 import pickle
 import sys
+import argparse
+import json
+import multiprocessing
+import time
 
-PROTOTXT_PATH = "models/deploy.prototxt.txt"
-MODEL_PATH = "models/res10_300x300_ssd_iter_140000.caffemodel"
-
-# ตรวจสอบและโหลดโมเดล DNN/SSD สำหรับใช้ในการตรวจจับใบหน้าในชุดข้อมูล
-try:
-    net = cv2.dnn.readNetFromCaffe(PROTOTXT_PATH, MODEL_PATH)
-    MIN_CONFIDENCE = 0.5
-except Exception as e:
-    print(f"[CRITICAL ERROR] ไม่สามารถโหลดโมเดล DNN/SSD ได้: {e}", file=sys.stderr)
-    net = None
-# --------------------------------
+from core.crop_store import CropStore
+from core.detector import PROTOTXT_PATH, MODEL_PATH, MIN_CONFIDENCE, load_net
+from core.face_cache import FaceCropCache
+from core.gallery import condense_gallery, face_histograms, holdout_split
+from core.lbph_binary import save_binary
+from core.lbph_engine import LBPHMatrixEngine
+from core.lbph_index import IVFIndex, default_index_path, evaluate_recall
+from core.recognizer import DEFAULT_CONFIDENCE_THRESHOLD
 
 # --- การจัดการพาธสำหรับการเทรนและการบันทึก ---
 DATASET_PATH = os.path.join(os.getcwd(), "dataset")
 MODEL_SAVE_PATH = os.path.join(os.getcwd(), "models", "lbph_model.yml") 
 NAMES_SAVE_PATH = os.path.join(os.getcwd(), "models", "lbph_names.pickle") 
+BINARY_SAVE_PATH = os.path.join(os.getcwd(), "models", "lbph_model.lbph")
+CACHE_PATH = os.path.join(os.getcwd(), "models", "face_cache.pickle")
+INDEX_SAVE_PATH = default_index_path(MODEL_SAVE_PATH)
+STORE_PATH = os.path.join(os.getcwd(), "dataset_store")
+# บันทึกว่าโมเดลล่าสุดเทรนจาก crop store ใดและกี่ crop (สำหรับ update แบบเพิ่ม)
+STORE_STATE_PATH = os.path.join(os.getcwd(), "models", "lbph_store_state.json")
+# จำนวนใบหน้าสูงสุดที่ใช้วัด recall ของดัชนีเทียบกับการค้นหาทั้งหมด
+INDEX_EVAL_SAMPLES = 200
+# สัดส่วนรูปต่อคนที่กันไว้วัดความแม่นยำตอนลดจำนวน sample (--max-per-identity)
+HOLDOUT_FRACTION = 0.2
+# จำนวนใบหน้า held-out สูงสุดที่ใช้จับเวลา predict ทีละใบ
+LATENCY_EVAL_SAMPLES = 50
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# จำนวนรูปที่ส่งให้ worker แต่ละครั้ง (ลด overhead ของการส่งงานข้าม process)
+WORKER_CHUNKSIZE = 8
+
 
-recognizer = cv2.face.LBPHFaceRecognizer_create()
+def load_ssd_net():
+    """โหลดโมเดล DNN/SSD สำหรับใช้ในการตรวจจับใบหน้าในชุดข้อมูล (ตัวโหลดเดียวกับ core.detector)"""
+    try:
+        return load_net()
+    except Exception as e:
+        print(f"[CRITICAL ERROR] ไม่สามารถโหลดโมเดล DNN/SSD ได้: {e}", file=sys.stderr)
+        return None
 
-def get_images_and_labels():
-    if net is None:
-        print("[ERROR] ไม่สามารถตรวจจับใบหน้าได้เนื่องจากโมเดล DNN/SSD มีปัญหา", file=sys.stderr)
-        return [], [], {}
 
+def list_dataset_images(dataset_path=DATASET_PATH):
+    """คืนรายการพาธรูปภาพทั้งหมดใน dataset เรียงตามชื่อเพื่อให้ผลลัพธ์เหมือนเดิมทุกครั้ง"""
     image_paths = []
-    # ใช้ os.walk บน DATASET_PATH ที่กำหนดไว้
-    for root, dirs, files in os.walk(DATASET_PATH): 
+    for root, dirs, files in os.walk(dataset_path):
         for file in files:
             # ตรวจสอบเฉพาะไฟล์รูปภาพ
-            if file.lower().endswith((".png", ".jpg", ".jpeg")): 
+            if file.lower().endswith(IMAGE_EXTENSIONS):
                 image_paths.append(os.path.join(root, file))
+    return sorted(image_paths)
+
+
+def build_name_map(image_paths, name_map=None):
+    """
+    สร้าง name -> label id จากชื่อโฟลเดอร์ (เช่น Thinakorn)
+    เรียงชื่อก่อนกำหนด id เพื่อให้ label เหมือนเดิมไม่ว่าจะใช้กี่ worker
+    หากส่ง name_map เดิมมา ชื่อใหม่จะได้ id ต่อท้ายโดยไม่เปลี่ยน id เดิม
+    """
+    name_map = dict(name_map or {})
+    next_id = max(name_map.values(), default=-1) + 1
+    for name in sorted({os.path.basename(os.path.dirname(p)) for p in image_paths}):
+        if name not in name_map:
+            name_map[name] = next_id
+            next_id += 1
+    return name_map
+
+
+def detector_config():
+    """ค่าที่มีผลต่อผลการ crop ใบหน้า ใช้เป็นส่วนหนึ่งของ key ของ face cache"""
+    config = {"min_confidence": MIN_CONFIDENCE, "input_size": (300, 300),
+              "mean": (104.0, 177.0, 123.0)}
+    for path in (PROTOTXT_PATH, MODEL_PATH):
+        if os.path.exists(path):
+            st = os.stat(path)
+            config[os.path.basename(path)] = (st.st_size, st.st_mtime_ns)
+    return config
+
+
+def extract_face(image_path, net):
+    """
+    อ่านรูป ตรวจจับใบหน้าที่มั่นใจที่สุด แล้ว crop เป็น grayscale
+    คืนค่า: (gray_face หรือ None, ข้อความเตือนหากไม่สำเร็จ)
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        return None, f"[Warning] ข้ามไฟล์ (อ่านไม่ได้): {os.path.basename(image_path)}"
+
+    # ตรวจจับใบหน้าในภาพ
+    (h, w) = image.shape[:2]
+    blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0,
+        (300, 300), (104.0, 177.0, 123.0))
+    net.setInput(blob)
+    detections = net.forward()
+
+    # ค้นหาใบหน้าที่มั่นใจที่สุด
+    best_face_box = None
+    best_confidence = 0.0
+    for i in range(0, detections.shape[2]):
+        confidence = detections[0, 0, i, 2]
+        if confidence > MIN_CONFIDENCE and confidence > best_confidence:
+            best_confidence = confidence
+            box = detections[0, 0, i, 3:7] * [w, h, w, h]
+            best_face_box = box.astype("int")
+
+    if best_face_box is None:
+        return None, f"[Warning] ไม่พบใบหน้าใน: {os.path.basename(image_path)}"
+
+    (startX, startY, endX, endY) = best_face_box
+
+    # Crop ใบหน้าและแปลงเป็น Grayscale
+    face_roi = image[startY:endY, startX:endX]
+    # ต้องตรวจสอบขนาดของ face_roi ก่อนเพิ่ม
+    if face_roi.size == 0:
+        return None, f"[Warning] ขนาด ROI เป็นศูนย์ใน: {os.path.basename(image_path)}"
+
+    return cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY), None
+
+
+# --- Worker process: แต่ละ process มี Caffe net ของตัวเอง โหลดครั้งเดียวตอนเริ่ม ---
+_worker_net = None
+
+
+def _init_worker():
+    global _worker_net
+    # ให้แต่ละ process ใช้ 1 thread เพื่อไม่ให้ OpenCV แย่ง core กันเอง
+    cv2.setNumThreads(1)
+    _worker_net = load_ssd_net()
+
+
+def _extract_face_worker(image_path):
+    if _worker_net is None:
+        return None, "[Warning] worker ไม่มีโมเดล DNN/SSD"
+    return extract_face(image_path, _worker_net)
+
+
+def _iter_extracted_faces(image_paths, net, workers):
+    """คืนผล extract_face() ตามลำดับของ image_paths (ใช้ process pool เมื่อ workers > 1)"""
+    if workers <= 1:
+        for image_path in image_paths:
+            yield extract_face(image_path, net)
+        return
+
+    with multiprocessing.Pool(processes=workers, initializer=_init_worker) as pool:
+        # imap คืนผลตามลำดับเดิม ทำให้ลำดับ sample และ label ไม่ขึ้นกับจำนวน worker
+        yield from pool.imap(_extract_face_worker, image_paths, chunksize=WORKER_CHUNKSIZE)
+
+
+def get_images_and_labels(workers=1, dataset_path=DATASET_PATH, image_paths=None,
+                          cache=None, name_map=None):
+    if image_paths is None:
+        image_paths = list_dataset_images(dataset_path)
+    name_map = build_name_map(image_paths, name_map)
+
+    # ใช้ผลจาก cache สำหรับไฟล์ที่เคยประมวลผลแล้ว รัน SSD เฉพาะไฟล์ใหม่หรือที่ถูกแก้ไข
+    results = {}
+    pending = []
+    for image_path in image_paths:
+        cached = cache.get(image_path) if cache is not None else None
+        if cached is None:
+            pending.append(image_path)
+        else:
+            results[image_path] = cached
+
+    print(f"[INFO] กำลังประมวลผลรูปภาพทั้งหมด {len(image_paths)} รูป "
+          f"(cache {len(results)}, ใหม่ {len(pending)}, workers={workers})...")
+
+    if pending:
+        if workers <= 1:
+            net = load_ssd_net()
+            ready = net is not None
+        else:
+            # แต่ละ worker โหลด net ของตัวเองใน _init_worker ไม่ต้องโหลดใน process หลัก แค่ตรวจว่ามีไฟล์
+            net = None
+            ready = os.path.exists(PROTOTXT_PATH) and os.path.exists(MODEL_PATH)
+        if not ready:
+            print("[ERROR] ไม่สามารถตรวจจับใบหน้าได้เนื่องจากโมเดล DNN/SSD มีปัญหา", file=sys.stderr)
+            return [], [], {}
+
+        for image_path, result in zip(pending, _iter_extracted_faces(pending, net, workers)):
+            results[image_path] = result
+            if cache is not None:
+                cache.put(image_path, result)
 
     face_samples = [] 
     labels = []       
-    name_map = {}     
-    current_id = 0
-    
-    print(f"[INFO] กำลังประมวลผลรูปภาพทั้งหมด {len(image_paths)} รูป...")
 
     for image_path in image_paths:
-        # ชื่อบุคคลคือชื่อโฟลเดอร์ที่รูปภาพอยู่ (เช่น Thinakorn)
-        person_name = os.path.basename(os.path.dirname(image_path)) 
+        gray_face, warning = results[image_path]
+        if gray_face is None:
+            print(warning)
+            continue
 
-        if person_name not in name_map:
-            name_map[person_name] = current_id
-            current_id += 1
-        
+        person_name = os.path.basename(os.path.dirname(image_path))
         label_id = name_map[person_name]
+        face_samples.append(gray_face)
+        labels.append(label_id)
+        print(f"    [Success] เพิ่มใบหน้า {person_name} (ID: {label_id}) จาก {os.path.basename(image_path)}")
 
-        image = cv2.imread(image_path)
-        if image is None:
-            print(f"[Warning] ข้ามไฟล์ (อ่านไม่ได้): {os.path.basename(image_path)}")
-            continue
+    return face_samples, labels, name_map
+
+
+def save_model(recognizer, name_map):
+    # บันทึกโมเดล
+    recognizer.save(MODEL_SAVE_PATH)
+    print(f"[INFO] บันทึกโมเดล LBPH ไปที่ {MODEL_SAVE_PATH}")
+
+    # สร้างและบันทึก Name Map
+    id_to_name_map = {v: k for k, v in name_map.items()}
+    with open(NAMES_SAVE_PATH, 'wb') as f:
+        f.write(pickle.dumps(id_to_name_map))
+    print(f"[INFO] บันทึกชื่อไปที่ {NAMES_SAVE_PATH}")
+
+    # โมเดล binary สำหรับโหลดเร็ว (yml ยังจำเป็นสำหรับ LBPH update() ครั้งถัดไป)
+    size = save_binary(BINARY_SAVE_PATH, LBPHMatrixEngine.from_recognizer(recognizer), id_to_name_map)
+    print(f"[INFO] บันทึกโมเดล binary ({size / 1e6:.1f} MB) ไปที่ {BINARY_SAVE_PATH}")
+
+
+def build_search_index(recognizer, faces, num_lists=None):
+    """สร้างและบันทึกดัชนี IVF ข้างโมเดล พร้อมรายงาน recall เทียบกับการค้นหาทั้งหมด"""
+    engine = LBPHMatrixEngine.from_recognizer(recognizer)
+    print(f"[INFO] กำลังสร้างดัชนีค้นหา IVF จาก {len(engine)} samples...")
+    index = IVFIndex.build(engine, num_lists=num_lists)
+    index.save(INDEX_SAVE_PATH)
+    print(f"[INFO] บันทึกดัชนี ({index.num_lists} กลุ่ม) ไปที่ {INDEX_SAVE_PATH}")
+
+    if not len(faces):
+        return
+    # วัด recall ด้วยภาพกลับซ้ายขวาของใบหน้าที่เทรน (ไม่ใช่ sample เดิมใน gallery)
+    step = max(1, len(faces) // INDEX_EVAL_SAMPLES)
+    queries = [cv2.equalizeHist(cv2.resize(cv2.flip(face, 1), (200, 200))) for face in faces[::step]]
+    print(f"[INFO] Recall เทียบกับการค้นหาทั้งหมด ({len(queries)} queries):")
+    for row in evaluate_recall(index, engine.compute_histograms(queries)):
+        print(f"    nprobe={row['nprobe']:>4}  recall={row['recall']:.3f}  "
+              f"label_agreement={row['label_agreement']:.3f}  speedup={row['speedup']:.1f}x")
+
+
+def refresh_search_index(faces, num_lists=None):
+    """สร้างดัชนี IVF ใหม่จากโมเดลที่บันทึกไว้แล้ว (dataset ไม่เปลี่ยน แต่ผู้ใช้ขอ --index)"""
+    if not os.path.exists(MODEL_SAVE_PATH):
+        print(f"[ERROR] ไม่พบโมเดล {MODEL_SAVE_PATH} สำหรับสร้างดัชนี", file=sys.stderr)
+        return False
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(MODEL_SAVE_PATH)
+    build_search_index(recognizer, faces, num_lists)
+    return True
 
-        # ตรวจจับใบหน้าในภาพ
-        (h, w) = image.shape[:2]
-        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0,
-            (300, 300), (104.0, 177.0, 123.0))
-        net.setInput(blob)
-        detections = net.forward()
-
-        # ค้นหาใบหน้าที่มั่นใจที่สุด
-        best_face_box = None
-        best_confidence = 0.0
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            if confidence > MIN_CONFIDENCE and confidence > best_confidence:
-                best_confidence = confidence
-                box = detections[0, 0, i, 3:7] * [w, h, w, h]
-                best_face_box = box.astype("int")
-
-        if best_face_box is not None:
-            (startX, startY, endX, endY) = best_face_box
-            
-            # Crop ใบหน้าและแปลงเป็น Grayscale
-            face_roi = image[startY:endY, startX:endX]
-            gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-            
-            # ต้องตรวจสอบขนาดของ face_roi ก่อนเพิ่ม
-            if gray_face.size > 0:
-                face_samples.append(gray_face)
-                labels.append(label_id)
-                print(f"    [Success] เพิ่มใบหน้า {person_name} (ID: {label_id}) จาก {os.path.basename(image_path)}")
-            else:
-                print(f"[Warning] ขนาด ROI เป็นศูนย์ใน: {os.path.basename(image_path)}")
+
+def _evaluate_gallery(engine, faces, histograms, labels, test_idx):
+    """คืน (accuracy, สัดส่วนที่ถูกและผ่าน threshold, เวลา predict ต่อใบหน้า ms) บนชุด held-out"""
+    predicted, distances = engine.predict_histograms(histograms[test_idx])
+    correct = predicted == labels[test_idx]
+    accepted = correct & (distances < DEFAULT_CONFIDENCE_THRESHOLD)
+
+    timed = test_idx[:LATENCY_EVAL_SAMPLES]
+    start = time.perf_counter()
+    for i in timed:
+        engine.predict_batch([faces[i]])
+    latency = (time.perf_counter() - start) * 1000.0 / max(1, len(timed))
+    return float(correct.mean()), float(accepted.mean()), latency
+
+
+def report_condensation(faces, labels, max_per_identity_values, histograms=None):
+    """
+    เปรียบเทียบ gallery เต็มกับ gallery ที่เหลือไม่เกิน K sample ต่อคน บนรูปที่กันไว้ (HOLDOUT_FRACTION ต่อคน)
+    รายงานจำนวน sample, ขนาด histogram, เวลา predict ต่อใบหน้า และความแม่นยำ
+    """
+    labels = np.asarray(labels).reshape(-1)
+    if histograms is None:
+        histograms = face_histograms(faces)
+    train_idx, test_idx = holdout_split(labels, HOLDOUT_FRACTION)
+    if len(test_idx) == 0:
+        print("[Warning] แต่ละคนมีรูปไม่พอสำหรับแบ่งชุดทดสอบ ข้ามการวัดความแม่นยำ")
+        return
+
+    rows = [("ทั้งหมด", train_idx)]
+    for k in max_per_identity_values:
+        rows.append((f"K={k}", train_idx[condense_gallery(histograms[train_idx], labels[train_idx], k)]))
+
+    print(f"[INFO] เปรียบเทียบ gallery (train {len(train_idx)} / held-out {len(test_idx)} ใบหน้า):")
+    print(f"    {'gallery':<10}{'samples':>9}{'MB':>9}{'ms/face':>10}{'accuracy':>10}{'accepted':>10}")
+    for name, idx in rows:
+        engine = LBPHMatrixEngine(histograms[idx], labels[idx])
+        accuracy, accepted, latency = _evaluate_gallery(engine, faces, histograms, labels, test_idx)
+        print(f"    {name:<10}{len(idx):>9}{engine.histograms_t.nbytes / 1e6:>9.1f}{latency:>10.2f}"
+              f"{accuracy:>10.3f}{accepted:>10.3f}")
+
+
+def condense_samples(faces, labels, max_per_identity):
+    """
+    ลด sample ของแต่ละคนเหลือไม่เกิน max_per_identity ตัวด้วย k-medoids บน LBPH histogram
+    พร้อมรายงานผลก่อน/หลังบนชุด held-out คืน (faces, labels) ที่เหลือ
+    """
+    labels = np.asarray(labels).reshape(-1)
+    start = time.perf_counter()
+    histograms = face_histograms(faces)
+    report_condensation(faces, labels, [max_per_identity], histograms)
+
+    keep = condense_gallery(histograms, labels, max_per_identity)
+    print(f"[INFO] ลด gallery จาก {len(faces)} เหลือ {len(keep)} samples "
+          f"(ไม่เกิน {max_per_identity} ต่อคน, {time.perf_counter() - start:.2f} s)")
+    return [faces[i] for i in keep], labels[keep]
+
+
+def update_model(new_paths, workers, cache, index_lists=None):
+    """เพิ่มรูปใหม่เข้าโมเดลเดิมด้วย LBPH update() แทนการเทรนใหม่ทั้งหมด"""
+    with open(NAMES_SAVE_PATH, 'rb') as f:
+        id_to_name_map = pickle.load(f)
+    old_name_map = {v: k for k, v in id_to_name_map.items()}
+
+    faces, ids, name_map = get_images_and_labels(workers=workers, image_paths=new_paths,
+                                                 cache=cache, name_map=old_name_map)
+    if len(faces) == 0:
+        print("[INFO] ไม่พบใบหน้าในรูปใหม่ โมเดลเดิมยังใช้ได้")
+        return True
+
+    print(f"[INFO] พบ {len(faces)} ใบหน้าใหม่ กำลังอัปเดตโมเดล LBPH (update)...")
+    try:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(MODEL_SAVE_PATH)
+        recognizer.update(faces, np.array(ids))
+        save_model(recognizer, name_map)
+        if index_lists is not None:
+            build_search_index(recognizer, faces, index_lists or None)
+        print("[INFO] เสร็จสิ้นการอัปเดตโมเดล!")
+        return True
+    except Exception as e:
+        print(f"[CRITICAL ERROR] การอัปเดตโมเดลล้มเหลว: {e}", file=sys.stderr)
+        return False
+
+
+def _model_stat():
+    st = os.stat(MODEL_SAVE_PATH)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _save_store_state(store, max_per_identity=None):
+    # max_per_identity: โมเดลถูกย่อเหลือ K sample ต่อคน (ครั้งถัดไป update() เฉพาะ crop ใหม่ เหมือนโหมดโฟลเดอร์)
+    state = {"store_id": store.store_id, "count": len(store), "model_stat": _model_stat(),
+             "max_per_identity": max_per_identity}
+    with open(STORE_STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def _trained_store_state(store):
+    """
+    คืน (จำนวน crop ของ store นี้ที่อยู่ในโมเดลปัจจุบันแล้ว, K ของการย่อ gallery หรือ None)
+    หรือ (None, None) หากต้องเทรนใหม่ทั้งหมด
+    """
+    if not os.path.exists(STORE_STATE_PATH) or not os.path.exists(MODEL_SAVE_PATH):
+        return None, None
+    with open(STORE_STATE_PATH, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("store_id") != store.store_id or state.get("model_stat") != _model_stat():
+        return None, None
+    if state.get("count", 0) > len(store):
+        return None, None
+    return state["count"], state.get("max_per_identity")
+
+
+def train_from_store(store_path, full=False, index_lists=None, max_per_identity=None):
+    """
+    เทรนจาก crop store แบบ packed: crop ทั้งหมดถูกอ่านผ่าน memmap โดยไม่คัดลอก ไม่ต้องเปิดไฟล์รูปหรือรัน SSD
+    ถ้าโมเดลเดิมเทรนจาก store เดียวกัน จะใช้ LBPH update() กับ crop ที่เพิ่มเข้ามาใหม่เท่านั้น
+    max_per_identity จะเทรนใหม่ทั้งหมดจาก sample ตัวแทนไม่เกิน K ตัวต่อคน
+    """
+    start = time.perf_counter()
+    try:
+        store = CropStore(store_path, readonly=True)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[ERROR] เปิด crop store ไม่ได้: {e}", file=sys.stderr)
+        return False
+
+    crops = store.crops()
+    labels = store.labels()
+    name_map = store.name_map()
+    print(f"[INFO] เปิด crop store {store_path}: {len(store)} crops, {len(store.names)} คน "
+          f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    trained, condensed = (None, None) if full or max_per_identity else _trained_store_state(store)
+    if condensed:
+        print(f"[INFO] โมเดลปัจจุบันถูกย่อเหลือไม่เกิน {condensed} sample ต่อคน "
+              "(crop ใหม่จะถูกเพิ่มด้วย update ใช้ --max-per-identity อีกครั้งเพื่อย่อใหม่ทั้งหมด)")
+    if trained is not None and trained == len(store):
+        print("[INFO] crop store ไม่มีการเปลี่ยนแปลง โมเดลเป็นปัจจุบันแล้ว")
+        if index_lists is not None:
+            return refresh_search_index(crops, index_lists or None)
+        return True
+
+    try:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        if trained is not None:
+            print(f"[INFO] พบ {len(store) - trained} crops ใหม่ กำลังอัปเดตโมเดล LBPH (update)...")
+            recognizer.read(MODEL_SAVE_PATH)
+            # แต่ละ crop เป็น view ของ memmap (ไม่คัดลอก)
+            faces = list(crops[trained:])
+            recognizer.update(faces, labels[trained:])
         else:
-            print(f"[Warning] ไม่พบใบหน้าใน: {os.path.basename(image_path)}")
+            if len(store) == 0:
+                print("[ERROR] crop store ว่าง กรุณาเพิ่มใบหน้าด้วย add_face_cv.py --store หรือ convert_dataset.py import")
+                return False
+            faces = list(crops)
+            if max_per_identity:
+                faces, labels = condense_samples(faces, labels, max_per_identity)
+            print(f"[INFO] กำลังเทรนโมเดล LBPH จาก {len(faces)} crops...")
+            recognizer.train(faces, labels)
+        save_model(recognizer, name_map)
+        # หลังย่อ gallery โมเดลไม่มีทุก crop แต่ครอบคลุม crop ทั้งหมดจนถึงตอนนี้แล้ว ครั้งถัดไปจึง update() เฉพาะ crop ใหม่
+        # (เหมือนโหมดโฟลเดอร์ที่ mark_trained หลังย่อ) แทนการเทรนใหม่ทั้งหมดซึ่งจะยกเลิกการย่อไปเงียบ ๆ
+        _save_store_state(store, max_per_identity or condensed)
+        if index_lists is not None:
+            build_search_index(recognizer, faces, index_lists or None)
+    except Exception as e:
+        print(f"[CRITICAL ERROR] การเทรนโมเดลล้มเหลว: {e}", file=sys.stderr)
+        return False
 
-    return face_samples, labels, name_map
+    print(f"[INFO] เสร็จสิ้นการเทรน! ({time.perf_counter() - start:.2f} s)")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="เทรนโมเดล LBPH จากรูปภาพใน dataset/")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="จำนวน worker process สำหรับอ่านรูปและตรวจจับใบหน้า (0 = ใช้ทุก core)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ไม่ใช้ face cache (ตรวจจับใบหน้าใหม่ทุกรูป)")
+    parser.add_argument("--full", action="store_true",
+                        help="บังคับเทรนใหม่ทั้งหมดแทนการ update โมเดลเดิม")
+    parser.add_argument("--store", nargs="?", const=STORE_PATH, default=None, metavar="PATH",
+                        help="เทรนจาก crop store แบบ packed แทนโฟลเดอร์ dataset/ (ค่าเริ่มต้น dataset_store/)")
+    parser.add_argument("--index", nargs="?", type=int, const=0, default=None, metavar="LISTS",
+                        help="สร้างดัชนีค้นหา IVF ข้างโมเดล (LISTS = จำนวนกลุ่ม, ค่าเริ่มต้น ~sqrt(samples))")
+    parser.add_argument("--max-per-identity", type=int, default=None, metavar="K",
+                        help="เก็บ sample ตัวแทนไม่เกิน K ตัวต่อคน (k-medoids บน LBPH histogram) "
+                             "พร้อมรายงานขนาด/เวลา predict/ความแม่นยำก่อนและหลัง (บังคับเทรนใหม่ทั้งหมด)")
+    parser.add_argument("--condense-report", type=int, nargs="+", default=None, metavar="K",
+                        help="รายงานผลของหลายค่า K เทียบกับ gallery เต็มโดยไม่เทรน/บันทึกโมเดล")
+    return parser.parse_args()
 
-# --- Main Logic สำหรับการเทรน ---
-print("[INFO] กำลังเตรียมข้อมูล...")
-faces, ids, name_map = get_images_and_labels()
 
-if len(faces) == 0:
-    print("[ERROR] ไม่พบใบหน้าดีๆ ใน dataset เลย! กรุณาเพิ่มรูป .jpg ที่ชัดเจนในโฟลเดอร์ dataset")
-else:
+def main():
+    args = parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    if args.condense_report:
+        if args.store is not None:
+            store = CropStore(args.store, readonly=True)
+            faces, ids = list(store.crops()), store.labels()
+        else:
+            cache = None if args.no_cache else FaceCropCache(CACHE_PATH, DATASET_PATH, detector_config())
+            faces, ids, _ = get_images_and_labels(workers=workers, cache=cache)
+            if cache is not None:
+                cache.save()
+        report_condensation(faces, ids, args.condense_report)
+        return
+
+    if args.store is not None:
+        train_from_store(args.store, full=args.full, index_lists=args.index,
+                         max_per_identity=args.max_per_identity)
+        return
+
+    # --- Main Logic สำหรับการเทรน ---
+    print("[INFO] กำลังเตรียมข้อมูล...")
+    image_paths = list_dataset_images()
+
+    cache = None
+    if not args.no_cache:
+        cache = FaceCropCache(CACHE_PATH, DATASET_PATH, detector_config())
+        evicted = cache.evict_missing(image_paths)
+        if evicted:
+            print(f"[INFO] ลบ {evicted} ไฟล์ที่ไม่มีแล้วออกจาก cache")
+
+    new_paths = None
+    if cache is not None and not args.full and not args.max_per_identity and os.path.exists(NAMES_SAVE_PATH):
+        new_paths = cache.new_since_training(image_paths, MODEL_SAVE_PATH)
+
+    if new_paths is not None:
+        # มีแค่รูปที่เพิ่มเข้ามาใหม่ -> update โมเดลเดิม
+        if not new_paths:
+            print("[INFO] dataset ไม่มีการเปลี่ยนแปลง โมเดลเป็นปัจจุบันแล้ว")
+            if args.index is not None:
+                # ใบหน้าทุกใบมาจาก cache (ไม่ต้องตรวจจับใหม่) ใช้วัด recall ของดัชนี
+                faces, _, _ = get_images_and_labels(workers=workers, image_paths=image_paths, cache=cache)
+                refresh_search_index(faces, args.index or None)
+            cache.save()
+            return
+        if update_model(new_paths, workers, cache, args.index):
+            cache.mark_trained(image_paths, MODEL_SAVE_PATH)
+        cache.save()
+        return
+
+    faces, ids, name_map = get_images_and_labels(workers=workers, image_paths=image_paths, cache=cache)
+    if cache is not None:
+        cache.save()
+
+    if len(faces) == 0:
+        print("[ERROR] ไม่พบใบหน้าดีๆ ใน dataset เลย! กรุณาเพิ่มรูป .jpg ที่ชัดเจนในโฟลเดอร์ dataset")
+        return
+
     print(f"[INFO] พบ {len(faces)} ใบหน้าสำหรับเทรน")
+    if args.max_per_identity:
+        faces, ids = condense_samples(faces, ids, args.max_per_identity)
     print("[INFO] กำลังเทรนโมเดล LBPH...")
     # ตรวจสอบให้แน่ใจว่าทั้ง faces และ ids ไม่ว่าง
     try:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
         recognizer.train(faces, np.array(ids))
-
-        # บันทึกโมเดล
-        recognizer.save(MODEL_SAVE_PATH)
-        print(f"[INFO] บันทึกโมเดล LBPH ไปที่ {MODEL_SAVE_PATH}")
-        
-        # สร้างและบันทึก Name Map
-        id_to_name_map = {v: k for k, v in name_map.items()}
-        with open(NAMES_SAVE_PATH, 'wb') as f:
-            f.write(pickle.dumps(id_to_name_map))
-        print(f"[INFO] บันทึกชื่อไปที่ {NAMES_SAVE_PATH}")
+        save_model(recognizer, name_map)
+        if args.index is not None:
+            build_search_index(recognizer, faces, args.index or None)
         print("[INFO] เสร็จสิ้นการเทรน!")
     except Exception as e:
-        print(f"[CRITICAL ERROR] การเทรนโมเดลล้มเหลว: {e}", file=sys.stderr)
\ No newline at end of file
+        print(f"[CRITICAL ERROR] การเทรนโมเดลล้มเหลว: {e}", file=sys.stderr)
+        return
+
+    if cache is not None:
+        cache.mark_trained(image_paths, MODEL_SAVE_PATH)
+        cache.save()
+
+
+if __name__ == "__main__":
+    main()
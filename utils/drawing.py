@@ -0,0 +1,39 @@
+import cv2
+
+OVERLAY_FONT = cv2.FONT_HERSHEY_SIMPLEX
+OVERLAY_SCALE = 0.45
+OVERLAY_LINE_HEIGHT = 16
+
+
+def draw_stats_overlay(frame, lines, origin=(10, 50), color=(0, 255, 255)):
+    """วาดข้อความหลายบรรทัด (เช่นสถิติเวลาต่อ stage) บนพื้นหลังสีดำที่มุมของเฟรม"""
+    if not lines:
+        return frame
+    x, y = origin
+    width = max(cv2.getTextSize(line, OVERLAY_FONT, OVERLAY_SCALE, 1)[0][0] for line in lines)
+    height = OVERLAY_LINE_HEIGHT * len(lines)
+    cv2.rectangle(frame, (x - 4, y - 4), (x + width + 4, y + height + 4), (0, 0, 0), cv2.FILLED)
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (x, y + OVERLAY_LINE_HEIGHT * (i + 1) - 4),
+                    OVERLAY_FONT, OVERLAY_SCALE, color, 1, cv2.LINE_AA)
+    return frame
+
+
+def draw_face_results(frame, boxes, names, lbph_confidences):
+    """วาดกรอบใบหน้า ชื่อ และค่า LBPH (เขียว = รู้จัก, แดง = Unknown)"""
+    for i, (x, y, w, h) in enumerate(boxes):
+        name = names[i]
+
+        text_name = name
+        text_lbph_conf = f"Match: {lbph_confidences[i]:.2f}"
+
+        color = (0, 0, 255) if name == "Unknown" else (0, 255, 0) # BGR
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+
+        # พื้นหลังข้อความ
+        y_text_bg = y - 40 if y - 40 > 0 else y + 10
+        cv2.rectangle(frame, (x, y_text_bg), (x + w, y), color, cv2.FILLED)
+
+        cv2.putText(frame, text_name, (x + 6, y - 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        cv2.putText(frame, text_lbph_conf, (x + 6, y - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    return frame